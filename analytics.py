@@ -0,0 +1,265 @@
+# analytics.py - локальная статистика обучения в колоночном виде
+import array
+import json
+import math
+import os
+import time
+from typing import Dict, Any, List, Optional
+from kivy.logger import Logger
+
+ANALYTICS_VERSION = 1
+NO_CATEGORY = -1
+DAY = 86400.0
+
+_numpy = None
+
+def get_numpy():
+    """NumPy загружается при первом расчете; без него используется расчет на чистом Python"""
+    global _numpy
+    if _numpy is None:
+        try:
+            import numpy
+            _numpy = numpy
+        except ImportError:
+            _numpy = False
+    return _numpy or None
+
+class ColumnTable:
+    """Таблица событий: каждая колонка - непрерывный массив array.array.
+
+    Колонки отдаются в NumPy без копирования через frombuffer.
+    """
+
+    def __init__(self, columns: Dict[str, str]):
+        self.typecodes = dict(columns)
+        self.columns = {name: array.array(typecode) for name, typecode in columns.items()}
+
+    def __len__(self):
+        return len(next(iter(self.columns.values())))
+
+    def append(self, **values):
+        for name, column in self.columns.items():
+            column.append(values[name])
+
+    def column(self, name: str):
+        """Колонка как массив NumPy (или array.array, если NumPy недоступен)"""
+        np = get_numpy()
+        column = self.columns[name]
+        if np is None:
+            return column
+        return np.frombuffer(column, dtype=np.dtype(column.typecode)) if len(column) else np.empty(0)
+
+    def clear(self):
+        for column in self.columns.values():
+            del column[:]
+
+    def dump(self) -> Dict[str, Any]:
+        return {name: (column.typecode, column.tobytes().hex()) for name, column in self.columns.items()}
+
+    def load(self, data: Dict[str, Any]):
+        for name, typecode in self.typecodes.items():
+            column = array.array(typecode)
+            if name in data and data[name][0] == typecode:
+                column.frombytes(bytes.fromhex(data[name][1]))
+            self.columns[name] = column
+        # Колонки должны быть одной длины - обрезаем по самой короткой
+        length = min(len(column) for column in self.columns.values())
+        for column in self.columns.values():
+            del column[length:]
+
+class LearningAnalytics:
+    """История результатов контрольных тестов и завершения глав с агрегатами.
+
+    События добавляются по одному, агрегаты считаются векторно по колонкам,
+    поэтому время отрисовки профиля почти не зависит от длины истории.
+    """
+
+    TEST_COLUMNS = {'timestamp': 'd', 'test_id': 'q', 'score': 'd', 'max_score': 'd', 'category_id': 'q'}
+    CHAPTER_COLUMNS = {'timestamp': 'd', 'chapter_id': 'q', 'course_id': 'q', 'category_id': 'q'}
+
+    def __init__(self, path: Optional[str] = None):
+        self.path = path
+        self.tests = ColumnTable(self.TEST_COLUMNS)
+        self.chapters = ColumnTable(self.CHAPTER_COLUMNS)
+        self._recorded_tests = set()
+        self._recorded_chapters = set()
+        self._catalog = None
+        self._dirty = False
+        if path:
+            self.load()
+
+    # --- Источники событий ---
+
+    def attach(self, progress_engine, catalog_cache=None):
+        """Подписка на завершение глав в ProgressEngine"""
+        self._catalog = catalog_cache
+        progress_engine.subscribe(self.on_progress_changed)
+
+    def on_progress_changed(self, event: Dict[str, Any]):
+        if event.get('kind') == 'chapter' and event.get('chapter_id') is not None:
+            self.record_chapter(event['chapter_id'], event['course_id'])
+
+    def _category_of(self, course_id: Optional[int]) -> int:
+        course = self._catalog.get_course(course_id) if self._catalog and course_id is not None else None
+        category_id = course.get('category_id') if course else None
+        return NO_CATEGORY if category_id is None else category_id
+
+    def record_chapter(self, chapter_id: int, course_id: int, timestamp: Optional[float] = None):
+        """Завершение главы (повторные завершения не учитываются)"""
+        if chapter_id in self._recorded_chapters:
+            return
+        self._recorded_chapters.add(chapter_id)
+        self.chapters.append(timestamp=timestamp or time.time(), chapter_id=chapter_id,
+                             course_id=course_id, category_id=self._category_of(course_id))
+        self._dirty = True
+
+    def record_test(self, test_id: int, score: float, max_score: Optional[float] = None,
+                    course_id: Optional[int] = None, timestamp: Optional[float] = None):
+        """Результат контрольного теста (max_score=0 - максимум неизвестен)"""
+        if test_id in self._recorded_tests:
+            return
+        self._recorded_tests.add(test_id)
+        self.tests.append(timestamp=timestamp or time.time(), test_id=test_id, score=float(score),
+                          max_score=float(max_score or 0), category_id=self._category_of(course_id))
+        self._dirty = True
+
+    def sync_tests(self, tests: List[Dict[str, Any]]):
+        """Добавляет пройденные тесты из списка контрольных тестов, которых еще нет в истории"""
+        for test in tests:
+            if test.get('is_completed') and test.get('result') is not None:
+                self.record_test(test['id'], test['result'], test.get('max_score'), test.get('course_id'))
+
+    # --- Агрегаты ---
+
+    def score_distribution(self, bins: int = 10) -> List[Dict[str, float]]:
+        """Распределение баллов за тесты: границы интервалов и количество результатов"""
+        if not len(self.tests):
+            return []
+        np = get_numpy()
+        scores = self.tests.column('score')
+        if np is not None:
+            counts, edges = np.histogram(scores, bins=bins)
+            return [{'from': float(edges[i]), 'to': float(edges[i + 1]), 'count': int(counts[i])}
+                    for i in range(len(counts))]
+        low, high = min(scores), max(scores)
+        width = (high - low) / bins or 1.0
+        counts = [0] * bins
+        for score in scores:
+            counts[min(int((score - low) / width), bins - 1)] += 1
+        return [{'from': low + i * width, 'to': low + (i + 1) * width, 'count': counts[i]} for i in range(bins)]
+
+    def completion_velocity(self, period_days: int = 7, periods: int = 12,
+                            now: Optional[float] = None) -> List[int]:
+        """Количество завершенных глав за последние periods периодов (от старых к новым)"""
+        if not len(self.chapters):
+            return [0] * periods
+        now = now or time.time()
+        period = period_days * DAY
+        np = get_numpy()
+        timestamps = self.chapters.column('timestamp')
+        if np is not None:
+            age = ((now - timestamps) // period).astype(np.int64)
+            age = age[(age >= 0) & (age < periods)]
+            return np.bincount(periods - 1 - age, minlength=periods).tolist()
+        counts = [0] * periods
+        for timestamp in timestamps:
+            age = int((now - timestamp) // period)
+            if 0 <= age < periods:
+                counts[periods - 1 - age] += 1
+        return counts
+
+    def category_averages(self) -> Dict[int, Dict[str, float]]:
+        """По категориям: средний балл за тесты, число тестов и завершенных глав"""
+        result: Dict[int, Dict[str, float]] = {}
+        np = get_numpy()
+        if np is not None:
+            if len(self.tests):
+                categories, inverse = np.unique(self.tests.column('category_id'), return_inverse=True)
+                sums = np.bincount(inverse, weights=self.tests.column('score'))
+                counts = np.bincount(inverse)
+                for category_id, total, count in zip(categories.tolist(), sums.tolist(), counts.tolist()):
+                    result[category_id] = {'average_score': total / count, 'tests': count, 'chapters': 0}
+            if len(self.chapters):
+                categories, counts = np.unique(self.chapters.column('category_id'), return_counts=True)
+                for category_id, count in zip(categories.tolist(), counts.tolist()):
+                    result.setdefault(category_id, {'average_score': math.nan, 'tests': 0, 'chapters': 0})
+                    result[category_id]['chapters'] = count
+            return result
+
+        for category_id, score in zip(self.tests.columns['category_id'], self.tests.columns['score']):
+            entry = result.setdefault(category_id, {'total': 0.0, 'tests': 0, 'chapters': 0})
+            entry['total'] += score
+            entry['tests'] += 1
+        for category_id in self.chapters.columns['category_id']:
+            result.setdefault(category_id, {'total': 0.0, 'tests': 0, 'chapters': 0})['chapters'] += 1
+        return {category_id: {'average_score': entry['total'] / entry['tests'] if entry['tests'] else math.nan,
+                              'tests': entry['tests'], 'chapters': entry['chapters']}
+                for category_id, entry in result.items()}
+
+    def summary(self, now: Optional[float] = None) -> Dict[str, Any]:
+        """Сводка для экрана статистики"""
+        started = time.perf_counter()
+        scores = self.tests.column('score')
+        tests_count = len(self.tests)
+        average = best = None
+        if tests_count:
+            if get_numpy() is not None:
+                average, best = float(scores.mean()), float(scores.max())
+            else:
+                average, best = sum(scores) / tests_count, max(scores)
+        data = {
+            'tests_completed': tests_count,
+            'chapters_completed': len(self.chapters),
+            'average_score': average,
+            'best_score': best,
+            'score_distribution': self.score_distribution(),
+            'weekly_chapters': self.completion_velocity(now=now),
+            'categories': self.category_averages(),
+        }
+        data['compute_ms'] = round((time.perf_counter() - started) * 1000, 2)
+        return data
+
+    # --- Хранение ---
+
+    def save(self):
+        """Сохраняет историю атомарной заменой файла (только если были изменения)"""
+        if not self.path or not self._dirty:
+            return
+        data = {"version": ANALYTICS_VERSION, "tests": self.tests.dump(), "chapters": self.chapters.dump()}
+        try:
+            tmp_path = f"{self.path}.tmp"
+            with open(tmp_path, 'w', encoding='utf-8') as f:
+                json.dump(data, f, separators=(',', ':'))
+            os.replace(tmp_path, self.path)
+            self._dirty = False
+        except Exception as e:
+            Logger.warning(f"Analytics: не удалось сохранить историю: {e}")
+
+    def load(self):
+        if not self.path or not os.path.exists(self.path):
+            return
+        try:
+            with open(self.path, encoding='utf-8') as f:
+                data = json.load(f)
+        except Exception as e:
+            Logger.warning(f"Analytics: история повреждена: {e}")
+            return
+        if data.get("version") != ANALYTICS_VERSION:
+            return
+        self.tests.load(data.get("tests", {}))
+        self.chapters.load(data.get("chapters", {}))
+        self._recorded_tests = set(self.tests.columns['test_id'])
+        self._recorded_chapters = set(self.chapters.columns['chapter_id'])
+
+    def clear(self):
+        """Очистка истории (при выходе пользователя)"""
+        self.tests.clear()
+        self.chapters.clear()
+        self._recorded_tests.clear()
+        self._recorded_chapters.clear()
+        self._dirty = False
+        if self.path and os.path.exists(self.path):
+            try:
+                os.remove(self.path)
+            except OSError as e:
+                Logger.warning(f"Analytics: не удалось удалить историю: {e}")
@@ -1,25 +1,66 @@
 # api_client.py
 import httpx
 import json
-from typing import Optional, Dict, Any, List
+from typing import Optional, Dict, Any, List, Callable, Tuple
 from kivy.logger import Logger
 from kivy.storage.jsonstore import JsonStore
 import asyncio
+import time
 from pathlib import Path
+from tracing import RequestTracer
+from scheduler import RequestScheduler, Lane, current_lane
+from mutations import MutationBatcher
+from rate_limit import RateLimiter
+
+class MemoryTokenStore:
+    """Хранилище токенов в памяти с интерфейсом JsonStore (для нагрузочных прогонов и тестов)"""
+    
+    def __init__(self):
+        self._data: Dict[str, Dict[str, Any]] = {}
+    
+    def exists(self, key: str) -> bool:
+        return key in self._data
+    
+    def get(self, key: str) -> Dict[str, Any]:
+        return self._data[key]
+    
+    def put(self, key: str, **values):
+        self._data[key] = values
+    
+    def delete(self, key: str):
+        del self._data[key]
 
 class APIClient:
     """HTTP клиент для взаимодействия с Django Ninja API"""
     
-    def __init__(self, base_url: str = "http://127.0.0.1:8000"):
+    def __init__(self, base_url: str = "http://127.0.0.1:8000", token_store=None,
+                 http_client: Optional[httpx.AsyncClient] = None):
         self.base_url = base_url.rstrip('/')
         self.api_base = f"{self.base_url}/api/v1"
-        self.token_store = JsonStore('tokens.json')
+        self.token_store = token_store if token_store is not None else JsonStore('tokens.json')
         self._access_token: Optional[str] = None
         self._refresh_token: Optional[str] = None
         self._load_tokens()
         
-        # Создаем HTTP клиент с настройками
-        self.client = httpx.AsyncClient(
+        # Подписчики на сетевой трафик: вызываются с True, если сервер ответил
+        self._traffic_listeners: List[Callable[[bool], None]] = []
+        self.last_response_at: Optional[float] = None
+        
+        # Трассировка запросов и гистограммы задержек по эндпоинтам
+        self.tracer: Optional[RequestTracer] = RequestTracer()
+        
+        # Приоритетные полосы: интерактивные запросы обгоняют фоновые
+        self.scheduler = RequestScheduler()
+        
+        # Лимиты частоты по группам эндпоинтов: всплески сглаживаются, 429 повторяются
+        self.rate_limiter = RateLimiter()
+        
+        # Изменения (завершение глав, подписки) отправляются пакетами
+        self.mutations = MutationBatcher(self)
+        
+        # Создаем HTTP клиент с настройками (или используем общий пул соединений)
+        self._owns_client = http_client is None
+        self.client = http_client or httpx.AsyncClient(
             timeout=30.0,
             follow_redirects=True
         )
@@ -72,8 +113,8 @@ class APIClient:
             return False
         
         try:
-            response = await self.client.post(
-                f"{self.api_base}/auth/refresh/",
+            response = await self._send(
+                'POST', f"{self.api_base}/auth/refresh/",
                 json={"refresh": self._refresh_token},
                 headers={'Content-Type': 'application/json'}
             )
@@ -92,6 +133,73 @@ class APIClient:
         
         return False
     
+    def add_traffic_listener(self, listener: Callable[[bool], None]):
+        """Подписка на результаты запросов (True - сервер ответил, False - сетевая ошибка)"""
+        if listener not in self._traffic_listeners:
+            self._traffic_listeners.append(listener)
+    
+    def remove_traffic_listener(self, listener: Callable[[bool], None]):
+        """Отписка от результатов запросов"""
+        if listener in self._traffic_listeners:
+            self._traffic_listeners.remove(listener)
+    
+    def _notify_traffic(self, reachable: bool):
+        """Оповещает подписчиков о результате запроса"""
+        if reachable:
+            self.last_response_at = time.monotonic()
+        for listener in list(self._traffic_listeners):
+            try:
+                listener(reachable)
+            except Exception as e:
+                Logger.warning(f"Ошибка обработчика трафика: {e}")
+    
+    async def _send(self, method: str, url: str, **kwargs) -> httpx.Response:
+        """Отправляет запрос в пределах лимита группы; ответ 429 повторяется после паузы"""
+        endpoint = url[len(self.api_base):] if url.startswith(self.api_base) else '/media/'
+        group = self.rate_limiter.group_for(endpoint)
+        attempt = 0
+        while True:
+            response = await self._send_once(method, url, group, **kwargs)
+            delay = self.rate_limiter.observe(group, response, attempt)
+            if delay is None or attempt >= self.rate_limiter.max_retries:
+                return response
+            attempt += 1
+            Logger.warning(f"Превышен лимит запросов ({group}), повтор через {delay:.1f} с")
+    
+    async def _send_once(self, method: str, url: str, group: str, **kwargs) -> httpx.Response:
+        """Отправляет запрос, трассирует его и сообщает подписчикам о доступности сервера"""
+        trace = None
+        if self.tracer is not None:
+            trace = self.tracer.start(method, url[len(self.api_base):])
+            kwargs['extensions'] = {**kwargs.get('extensions', {}), 'trace': trace.on_event}
+        
+        lane = current_lane()
+        try:
+            # Токен берется до слота: группа на паузе после 429 не занимает общие слоты
+            # планировщика и не задерживает запросы к другим группам
+            while True:
+                await self.rate_limiter.acquire(group, lane)
+                await self.scheduler.acquire(lane)
+                if not self.rate_limiter.is_blocked(group):
+                    break
+                # Пока запрос ждал слот, сервер потребовал паузу - токен устарел, слот отдаем
+                self.scheduler.release(lane, completed=False)
+            try:
+                response = await self.client.request(method, url, **kwargs)
+            finally:
+                self.scheduler.release(lane)
+        except Exception as e:
+            if trace is not None:
+                self.tracer.finish(trace, error=e)
+            if isinstance(e, httpx.TransportError):
+                self._notify_traffic(False)
+            raise
+        
+        if trace is not None:
+            self.tracer.finish(trace, response=response)
+        self._notify_traffic(True)
+        return response
+    
     async def _make_request(self, method: str, endpoint: str, **kwargs) -> httpx.Response:
         """Выполняет HTTP запрос с автоматическим обновлением токена"""
         url = f"{self.api_base}{endpoint}"
@@ -100,7 +208,7 @@ class APIClient:
         kwargs['headers'] = headers
         
         # Первая попытка
-        response = await self.client.request(method, url, **kwargs)
+        response = await self._send(method, url, **kwargs)
         
         # Если получили 401, пытаемся обновить токен
         if response.status_code == 401 and self._refresh_token:
@@ -108,16 +216,26 @@ class APIClient:
                 # Обновляем заголовки и повторяем запрос
                 headers.update(self._get_auth_headers())
                 kwargs['headers'] = headers
-                response = await self.client.request(method, url, **kwargs)
+                response = await self._send(method, url, **kwargs)
         
         return response
     
+    async def health_check(self, timeout: float = 5.0) -> bool:
+        """Проверка доступности сервера"""
+        try:
+            async with self.scheduler.slot(Lane.BACKGROUND):
+                response = await self.client.get(f"{self.api_base}/health/", timeout=timeout)
+            return response.status_code == 200
+        except Exception as e:
+            Logger.warning(f"Сервер недоступен: {e}")
+            return False
+    
     # Методы аутентификации
     async def login(self, username: str, password: str) -> Dict[str, Any]:
         """Авторизация пользователя"""
         try:
-            response = await self.client.post(
-                f"{self.api_base}/auth/login/",
+            response = await self._send(
+                'POST', f"{self.api_base}/auth/login/",
                 json={"username": username, "password": password},
                 headers={'Content-Type': 'application/json'}
             )
@@ -138,8 +256,8 @@ class APIClient:
                       first_name: str, last_name: str) -> Dict[str, Any]:
         """Регистрация нового пользователя"""
         try:
-            response = await self.client.post(
-                f"{self.api_base}/auth/register/",
+            response = await self._send(
+                'POST', f"{self.api_base}/auth/register/",
                 json={
                     "username": username,
                     "email": email, 
@@ -182,6 +300,23 @@ class APIClient:
             Logger.error(f"Ошибка получения пользователя: {e}")
         return None
     
+    async def verify_token(self) -> Dict[str, Any]:
+        """Проверка сохраненного токена.
+
+        valid: True - токен принят, False - сервер явно отклонил его (401),
+        None - проверить не удалось (нет сети или ошибка сервера).
+        """
+        try:
+            response = await self._make_request('GET', '/auth/me/')
+        except Exception as e:
+            Logger.warning(f"Не удалось проверить токен: {e}")
+            return {"valid": None}
+        if response.status_code == 200:
+            return {"valid": True, "user": response.json()}
+        if response.status_code == 401:
+            return {"valid": False}
+        return {"valid": None}
+
     # Методы для работы с курсами
     async def get_courses(self, category_id: Optional[int] = None) -> List[Dict[str, Any]]:
         """Получение списка курсов"""
@@ -210,8 +345,8 @@ class APIClient:
     async def subscribe_to_course(self, course_id: int) -> bool:
         """Подписка на курс"""
         try:
-            response = await self._make_request('POST', f'/courses/{course_id}/subscribe/')
-            return response.status_code == 200
+            status, _ = await self.mutations.submit('POST', f'/courses/{course_id}/subscribe/')
+            return status == 200
         except Exception as e:
             Logger.error(f"Ошибка подписки на курс: {e}")
             return False
@@ -237,11 +372,32 @@ class APIClient:
             Logger.error(f"Ошибка получения главы: {e}")
         return None
     
+    async def get_conditional(self, endpoint: str, etag: Optional[str] = None) -> Tuple[int, Any, Optional[str]]:
+        """GET с If-None-Match: (статус, данные, ETag); 304 - не изменилось, 0 - ошибка сети"""
+        headers = {'If-None-Match': etag} if etag else {}
+        try:
+            response = await self._make_request('GET', endpoint, headers=headers)
+        except Exception as e:
+            Logger.error(f"Ошибка запроса {endpoint}: {e}")
+            return 0, None, None
+        data = response.json() if response.status_code == 200 else None
+        return response.status_code, data, response.headers.get('ETag')
+
+    async def get_chapter_detail_conditional(self, chapter_id: int,
+                                             etag: Optional[str] = None) -> Tuple[int, Any, Optional[str]]:
+        """Глава, если изменилась с версии etag"""
+        return await self.get_conditional(f'/chapters/{chapter_id}/', etag)
+
+    async def get_chapter_test_conditional(self, chapter_id: int,
+                                           etag: Optional[str] = None) -> Tuple[int, Any, Optional[str]]:
+        """Тест главы, если изменился с версии etag"""
+        return await self.get_conditional(f'/tests/chapter/{chapter_id}/', etag)
+
     async def complete_chapter(self, chapter_id: int) -> bool:
         """Отметить главу как завершенную"""
         try:
-            response = await self._make_request('POST', f'/chapters/{chapter_id}/complete/')
-            return response.status_code == 200
+            status, _ = await self.mutations.submit('POST', f'/chapters/{chapter_id}/complete/')
+            return status == 200
         except Exception as e:
             Logger.error(f"Ошибка завершения главы: {e}")
             return False
@@ -321,6 +477,23 @@ class APIClient:
         return None
     
     # Методы для работы с медиафайлами
+    def get_course_image_url(self, course: Dict[str, Any]) -> Optional[str]:
+        """URL обложки курса из поля image ответа (None - у курса нет обложки)"""
+        image = course.get('image')
+        if not image:
+            return None
+        return image if image.startswith('http') else f"{self.base_url}{image}"
+    
+    async def get_media(self, url: str) -> Optional[bytes]:
+        """Загрузка медиафайла по полному URL"""
+        try:
+            response = await self._send('GET', url, headers=self._get_auth_headers())
+            if response.status_code == 200:
+                return response.content
+        except Exception as e:
+            Logger.error(f"Ошибка загрузки медиафайла: {e}")
+        return None
+    
     def get_video_url(self, content_id: int) -> str:
         """Получение URL для видео"""
         return f"{self.api_base}/media/video/{content_id}/"
@@ -330,8 +503,22 @@ class APIClient:
         return f"{self.api_base}/media/file/{content_id}/"
     
     async def close(self):
-        """Закрытие HTTP клиента"""
-        await self.client.aclose()
+        """Закрытие HTTP клиента (общий пул закрывает его владелец)"""
+        await self.mutations.flush()
+        if self._owns_client:
+            await self.client.aclose()
+
+_default_client: Optional[APIClient] = None
+
+def get_default_client() -> APIClient:
+    """Глобальный экземпляр API клиента, создается при первом обращении"""
+    global _default_client
+    if _default_client is None:
+        _default_client = APIClient()
+    return _default_client
 
-# Глобальный экземпляр API клиента
-api_client = APIClient()
+def __getattr__(name: str):
+    # Совместимость с `from api_client import api_client` без создания клиента при импорте
+    if name == 'api_client':
+        return get_default_client()
+    raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
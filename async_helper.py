@@ -4,9 +4,36 @@ from functools import wraps
 from kivy.clock import Clock
 from kivy.logger import Logger
 from kivymd.app import MDApp
-from typing import Callable, Any
+from typing import Callable, Any, Optional
+import concurrent.futures
 import threading
 
+_shared_loop: Optional[asyncio.AbstractEventLoop] = None
+_shared_loop_lock = threading.Lock()
+
+def get_shared_loop() -> asyncio.AbstractEventLoop:
+    """Возвращает общий фоновый event loop (создается при первом обращении)"""
+    global _shared_loop
+    with _shared_loop_lock:
+        if _shared_loop is None or _shared_loop.is_closed():
+            loop = asyncio.new_event_loop()
+            ready = threading.Event()
+
+            def run_loop():
+                asyncio.set_event_loop(loop)
+                loop.call_soon(ready.set)
+                loop.run_forever()
+
+            thread = threading.Thread(target=run_loop, name="shared-loop", daemon=True)
+            thread.start()
+            ready.wait()
+            _shared_loop = loop
+        return _shared_loop
+
+def submit_to_loop(coro) -> concurrent.futures.Future:
+    """Запускает корутину в общем event loop и возвращает Future"""
+    return asyncio.run_coroutine_threadsafe(coro, get_shared_loop())
+
 def async_handler(func):
     """Декоратор для обработки асинхронных функций в Kivy"""
     @wraps(func)
@@ -46,38 +73,76 @@ def run_in_thread(coro):
     return thread
 
 class AsyncTaskManager:
-    """Менеджер для управления асинхронными задачами"""
+    """Менеджер асинхронных задач с отменой и отбрасыванием устаревших результатов.
+
+    Задачи выполняются в общем event loop. cancel_all() отменяет незавершенные
+    запросы и увеличивает поколение: колбэки задач прошлого поколения не вызываются.
+    """
     def __init__(self):
-        self.tasks = []
+        self.tasks = set()
+        self.generation = 0
+        self._keyed = {}
+        self._lock = threading.Lock()
+
+    def create_task(self, coro, callback=None, key=None):
+        """Создает и отслеживает асинхронную задачу.
 
-    def create_task(self, coro, callback=None):
-        """Создает и отслеживает асинхронную задачу"""
-        def run_task():
+        Задача с тем же key отменяет предыдущую: результат получает только последний запрос.
+        """
+        generation = self.generation
+        future = submit_to_loop(coro)
+        with self._lock:
+            previous = self._keyed.pop(key, None) if key is not None else None
+            self.tasks.add(future)
+            if key is not None:
+                self._keyed[key] = future
+        if previous is not None:
+            previous.cancel()
+
+        def on_done(done_future):
+            with self._lock:
+                self.tasks.discard(done_future)
+                if key is not None and self._keyed.get(key) is done_future:
+                    del self._keyed[key]
+            if done_future.cancelled():
+                return
             try:
-                loop = asyncio.new_event_loop()
-                asyncio.set_event_loop(loop)
-                result = loop.run_until_complete(coro)
-                
-                if callback:
-                    Clock.schedule_once(lambda dt: callback(result), 0)
-                    
-                ##loop.close()()()
-                return result
+                result = done_future.result()
             except Exception as e:
                 Logger.error(f"Ошибка в задаче: {e}")
-                if callback:
-                    Clock.schedule_once(lambda dt: callback(None), 0)
-                return None
-        
-        thread = threading.Thread(target=run_task, daemon=True)
-        thread.start()
-        self.tasks.append(thread)
-        return thread
+                result = None
+            if callback:
+                Clock.schedule_once(lambda dt: self._deliver(generation, key, done_future, callback, result), 0)
+
+        future.add_done_callback(on_done)
+        return future
+
+    def _deliver(self, generation, key, future, callback, result):
+        # Результат устарел: задачи отменены или по тому же ключу запущен новый запрос
+        if generation != self.generation or future.cancelled():
+            return
+        if key is not None and self._keyed.get(key) not in (None, future):
+            return
+        callback(result)
+
+    def guard(self, callback):
+        """Оборачивает колбэк так, чтобы он не вызывался после cancel_all()"""
+        generation = self.generation
+
+        def guarded(*args, **kwargs):
+            if generation == self.generation:
+                return callback(*args, **kwargs)
+        return guarded
 
     def cancel_all(self):
         """Отменяет все активные задачи"""
-        # В этой реализации задачи автоматически завершаются
-        self.tasks.clear()
+        self.generation += 1
+        with self._lock:
+            tasks = list(self.tasks)
+            self.tasks.clear()
+            self._keyed.clear()
+        for future in tasks:
+            future.cancel()
 
 # Глобальный менеджер задач
 task_manager = AsyncTaskManager()
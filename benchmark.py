@@ -0,0 +1,225 @@
+# benchmark.py - воспроизводимые end-to-end бенчмарки APIClient на локальной заглушке API
+import os
+
+# Kivy не должен разбирать аргументы командной строки и открывать окно
+os.environ.setdefault('KIVY_NO_ARGS', '1')
+os.environ.setdefault('KIVY_NO_CONSOLELOG', '1')
+
+import argparse
+import asyncio
+import json
+import resource
+import sys
+import threading
+import time
+import tracemalloc
+from typing import Awaitable, Callable, Dict, Any, List, Optional
+
+from api_client import APIClient, MemoryTokenStore
+from stub_server import StubAPIServer, StubConfig
+from scheduler import RequestScheduler
+from tracing import LatencyHistogram, RequestTracer
+
+class ScenarioContext:
+    """Состояние одного прогона сценария"""
+
+    def __init__(self, base_url: str, courses: int = 20):
+        self.base_url = base_url
+        self.courses = courses
+        self.tracer = RequestTracer()
+
+    def new_client(self) -> APIClient:
+        """APIClient с собственными токенами в памяти и общим трассировщиком сценария"""
+        client = APIClient(self.base_url, token_store=MemoryTokenStore())
+        client.tracer = self.tracer
+        return client
+
+# Сценарии повторяют последовательности запросов, которые выполняют экраны приложения
+
+async def scenario_cold_start(ctx: ScenarioContext, iteration: int):
+    """Запуск: вход, проверка токена, затем курсы и тесты (MainScreen.on_enter)"""
+    client = ctx.new_client()
+    try:
+        await client.login(f"student{iteration}", "password")
+        await client.get_current_user()
+        await asyncio.gather(client.get_courses(), client.get_control_tests())
+    finally:
+        await client.close()
+
+async def scenario_catalog_scroll(ctx: ScenarioContext, iteration: int, client: APIClient):
+    """Просмотр каталога: список курсов и переходы к деталям"""
+    courses = await client.get_courses()
+    for course in courses[:5]:
+        await client.get_course_detail(course['id'])
+
+async def scenario_chapter_open(ctx: ScenarioContext, iteration: int, client: APIClient):
+    """Открытие главы: CourseDetailsScreen -> ChapterContentScreen"""
+    course_id = iteration % ctx.courses + 1
+    chapters = await client.get_chapters(course_id)
+    if chapters:
+        await client.get_chapter_detail(chapters[iteration % len(chapters)]['id'])
+
+async def scenario_test_submission(ctx: ScenarioContext, iteration: int, client: APIClient):
+    """Прохождение теста для самопроверки и контрольного теста"""
+    chapter_id = (iteration % ctx.courses + 1) * 1000 + 1
+    test = await client.get_chapter_test(chapter_id)
+    if test:
+        answers = {str(task['id']): [task['answers'][0]['id']] for task in test['tasks']}
+        await client.submit_chapter_test(chapter_id, answers)
+    control = await client.get_control_test(iteration % 5 + 1)
+    if control:
+        answers = {str(task['id']): [task['answers'][0]['id']] for task in control['tasks']}
+        await client.submit_control_test(control['id'], answers)
+
+SCENARIOS: Dict[str, Callable[..., Awaitable[None]]] = {
+    "cold_start": scenario_cold_start,
+    "catalog_scroll": scenario_catalog_scroll,
+    "chapter_open": scenario_chapter_open,
+    "test_submission": scenario_test_submission,
+}
+
+async def run_scenario(name: str, ctx: ScenarioContext, iterations: int, concurrency: int) -> Dict[str, Any]:
+    """Выполняет сценарий iterations раз с ограничением параллельности"""
+    scenario = SCENARIOS[name]
+    histogram = LatencyHistogram()
+    ctx.tracer.reset()
+    errors = 0
+    peak_threads = threading.active_count()
+    semaphore = asyncio.Semaphore(concurrency)
+
+    shared_client: Optional[APIClient] = None
+    if name != "cold_start":
+        shared_client = ctx.new_client()
+        await shared_client.login("bench", "password")
+        ctx.tracer.reset()
+
+    async def one(iteration: int):
+        nonlocal errors, peak_threads
+        async with semaphore:
+            started = time.perf_counter()
+            try:
+                if shared_client is None:
+                    await scenario(ctx, iteration)
+                else:
+                    await scenario(ctx, iteration, shared_client)
+            except Exception:
+                errors += 1
+            histogram.record((time.perf_counter() - started) * 1000)
+            peak_threads = max(peak_threads, threading.active_count())
+
+    tracemalloc.start()
+    started = time.perf_counter()
+    await asyncio.gather(*(one(iteration) for iteration in range(iterations)))
+    elapsed = time.perf_counter() - started
+    _, peak_memory = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+
+    result = {
+        "iterations": iterations,
+        "concurrency": concurrency,
+        "errors": errors,
+        "failed_requests": ctx.tracer.errors,
+        "elapsed_s": round(elapsed, 3),
+        "throughput_ops": round(iterations / elapsed, 2) if elapsed else None,
+        "latency_ms": histogram.to_dict(),
+        "peak_python_memory_kb": peak_memory // 1024,
+        "peak_threads": peak_threads,
+    }
+    result["endpoints"] = ctx.tracer.summary()
+    if shared_client is not None:
+        result["scheduler"] = shared_client.scheduler.metrics()
+        await shared_client.close()
+    return result
+
+def compare(results: Dict[str, Any], baseline: Dict[str, Any], threshold: float) -> List[str]:
+    """Находит сценарии, у которых p95 или пропускная способность ухудшились сильнее порога"""
+    regressions = []
+    for name, current in results["scenarios"].items():
+        previous = baseline.get("scenarios", {}).get(name)
+        if not previous:
+            continue
+        old_p95 = previous["latency_ms"]["p95"]
+        new_p95 = current["latency_ms"]["p95"]
+        if old_p95 and new_p95 and new_p95 > old_p95 * (1 + threshold):
+            regressions.append(f"{name}: p95 {old_p95:.1f} -> {new_p95:.1f} мс")
+        old_ops = previous["throughput_ops"]
+        new_ops = current["throughput_ops"]
+        if old_ops and new_ops and new_ops < old_ops * (1 - threshold):
+            regressions.append(f"{name}: throughput {old_ops:.1f} -> {new_ops:.1f} оп/с")
+    return regressions
+
+async def run_benchmarks(args) -> Dict[str, Any]:
+    config = StubConfig(latency=args.latency, jitter=args.jitter, error_rate=args.error_rate,
+                        courses=args.courses, content_size=args.content_size)
+    names = list(SCENARIOS) if args.scenario == "all" else args.scenario.split(",")
+
+    with StubAPIServer(config) as server:
+        ctx = ScenarioContext(server.base_url, args.courses)
+        results: Dict[str, Any] = {
+            "config": vars(config),
+            "python": sys.version.split()[0],
+            "scheduler_limits": scheduler_limits(),
+            "scenarios": {},
+        }
+        for name in names:
+            results["scenarios"][name] = await run_scenario(name, ctx, args.iterations, args.concurrency)
+        results["requests_served"] = server.requests_served
+        # maxrss в Linux - килобайты, в macOS - байты
+        rss = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+        results["peak_rss_kb"] = rss // 1024 if sys.platform == 'darwin' else rss
+    return results
+
+def scheduler_limits() -> Dict[str, Any]:
+    """Ограничения параллельности RequestScheduler, с которыми APIClient выполняет запросы"""
+    scheduler = RequestScheduler()
+    return {
+        "max_total": scheduler.max_total,
+        "reserved_interactive": scheduler.reserved_interactive,
+        "lanes": {lane.name.lower(): limit for lane, limit in scheduler.limits.items()},
+    }
+
+def print_report(results: Dict[str, Any]):
+    limits = results["scheduler_limits"]
+    print(f"планировщик: не более {limits['max_total']} запросов одновременно "
+          f"(резерв интерактивных: {limits['reserved_interactive']}), по полосам: "
+          + ", ".join(f"{lane}={limit}" for lane, limit in limits["lanes"].items()))
+    print(f"{'сценарий':<18}{'оп/с':>10}{'p50':>10}{'p95':>10}{'p99':>10}{'ошибки':>8}{'потоки':>8}{'пам, КБ':>10}")
+    for name, data in results["scenarios"].items():
+        latency = data["latency_ms"]
+        print(f"{name:<18}{data['throughput_ops']:>10}{latency['p50']:>10}{latency['p95']:>10}"
+              f"{latency['p99']:>10}{data['errors'] + data['failed_requests']:>8}{data['peak_threads']:>8}{data['peak_python_memory_kb']:>10}")
+    print(f"peak RSS: {results['peak_rss_kb']} КБ, запросов к заглушке: {results['requests_served']}")
+
+def main(argv: Optional[List[str]] = None) -> int:
+    parser = argparse.ArgumentParser(description="Бенчмарки APIClient на локальной заглушке API")
+    parser.add_argument('--scenario', default='all', help=f"all или список через запятую: {', '.join(SCENARIOS)}")
+    parser.add_argument('--iterations', type=int, default=50)
+    parser.add_argument('--concurrency', type=int, default=4)
+    parser.add_argument('--latency', type=float, default=0.01, help="задержка заглушки, с")
+    parser.add_argument('--jitter', type=float, default=0.0, help="разброс задержки, с")
+    parser.add_argument('--error-rate', type=float, default=0.0, help="доля ответов 500")
+    parser.add_argument('--courses', type=int, default=20)
+    parser.add_argument('--content-size', type=int, default=2000, help="размер текста главы, символов")
+    parser.add_argument('--output', help="сохранить результаты в JSON")
+    parser.add_argument('--baseline', help="JSON предыдущего прогона для поиска регрессий")
+    parser.add_argument('--threshold', type=float, default=0.2, help="допустимое ухудшение (0.2 = 20%%)")
+    args = parser.parse_args(argv)
+
+    results = asyncio.run(run_benchmarks(args))
+    print_report(results)
+
+    if args.output:
+        with open(args.output, 'w', encoding='utf-8') as f:
+            json.dump(results, f, ensure_ascii=False, indent=2)
+
+    if args.baseline:
+        with open(args.baseline, encoding='utf-8') as f:
+            regressions = compare(results, json.load(f), args.threshold)
+        for line in regressions:
+            print(f"РЕГРЕССИЯ {line}")
+        if regressions:
+            return 1
+    return 0
+
+if __name__ == '__main__':
+    sys.exit(main())
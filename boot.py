@@ -0,0 +1,107 @@
+# boot.py - параллельный запуск критического пути приложения
+import asyncio
+import concurrent.futures
+import time
+from typing import Awaitable, Callable, Dict, Any, Iterable, List, Optional
+from kivy.logger import Logger
+from async_helper import submit_to_loop
+
+class BootStep:
+    """Шаг запуска: корутина и список шагов, результаты которых ей нужны"""
+
+    def __init__(self, name: str, factory: Callable[[Dict[str, Any]], Awaitable[Any]], deps: Iterable[str] = ()):
+        self.name = name
+        self.factory = factory
+        self.deps = list(deps)
+        self.started: Optional[float] = None
+        self.finished: Optional[float] = None
+        self.error: Optional[str] = None
+        # Future результата шага, доступный из главного потока
+        self.future: concurrent.futures.Future = concurrent.futures.Future()
+
+class BootOrchestrator:
+    """Запускает независимые шаги одновременно, зависимые - по готовности зависимостей"""
+
+    def __init__(self):
+        self.steps: Dict[str, BootStep] = {}
+        self.results: Dict[str, Any] = {}
+        self._t0: Optional[float] = None
+        self._finished: Optional[float] = None
+        self._taken: set = set()
+
+    def add(self, name: str, factory: Callable[[Dict[str, Any]], Awaitable[Any]], deps: Iterable[str] = ()):
+        """Регистрирует шаг; factory получает словарь результатов зависимостей"""
+        self.steps[name] = BootStep(name, factory, deps)
+
+    def start(self) -> concurrent.futures.Future:
+        """Запускает граф в общем event loop"""
+        for step in self.steps.values():
+            missing = [dep for dep in step.deps if dep not in self.steps]
+            if missing:
+                raise ValueError(f"Шаг {step.name} зависит от неизвестных шагов: {missing}")
+        self._t0 = time.perf_counter()
+        return submit_to_loop(self._run())
+
+    async def _run(self):
+        tasks: Dict[str, asyncio.Task] = {}
+
+        async def run_step(step: BootStep):
+            if step.deps:
+                await asyncio.gather(*(tasks[dep] for dep in step.deps), return_exceptions=True)
+            step.started = time.perf_counter()
+            try:
+                result = await step.factory({dep: self.results.get(dep) for dep in step.deps})
+            except Exception as e:
+                step.error = f"{type(e).__name__}: {e}"
+                Logger.error(f"Boot: шаг {step.name} завершился с ошибкой: {e}")
+                result = None
+            step.finished = time.perf_counter()
+            self.results[step.name] = result
+            step.future.set_result(result)
+            return result
+
+        for step in self.steps.values():
+            tasks[step.name] = asyncio.ensure_future(run_step(step))
+        await asyncio.gather(*tasks.values())
+        self._finished = time.perf_counter()
+        Logger.info(f"Boot: {self.format_report()}")
+
+    def take(self, name: str) -> Optional[concurrent.futures.Future]:
+        """Однократно отдает Future результата шага (повторные загрузки идут в сеть)"""
+        if name not in self.steps or name in self._taken:
+            return None
+        self._taken.add(name)
+        return self.steps[name].future
+
+    def report(self) -> Dict[str, Any]:
+        """Тайминги шагов относительно старта и выигрыш против последовательного запуска"""
+        steps: List[Dict[str, Any]] = []
+        sequential = 0.0
+        for step in self.steps.values():
+            if step.started is None or step.finished is None:
+                steps.append({"step": step.name, "pending": True})
+                continue
+            duration = step.finished - step.started
+            sequential += duration
+            steps.append({
+                "step": step.name,
+                "deps": step.deps,
+                "start_ms": round((step.started - self._t0) * 1000, 1),
+                "end_ms": round((step.finished - self._t0) * 1000, 1),
+                "duration_ms": round(duration * 1000, 1),
+                "error": step.error,
+            })
+        wall = (self._finished - self._t0) if self._finished and self._t0 else None
+        return {
+            "steps": steps,
+            "wall_ms": round(wall * 1000, 1) if wall is not None else None,
+            "sequential_ms": round(sequential * 1000, 1),
+            "saved_ms": round((sequential - wall) * 1000, 1) if wall is not None else None,
+        }
+
+    def format_report(self) -> str:
+        data = self.report()
+        parts = [f"{step['step']}={step['start_ms']}..{step['end_ms']}мс"
+                 for step in data["steps"] if not step.get("pending")]
+        return (f"{', '.join(parts)}; всего {data['wall_ms']} мс против "
+                f"{data['sequential_ms']} мс последовательно (выигрыш {data['saved_ms']} мс)")
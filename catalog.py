@@ -0,0 +1,126 @@
+# catalog.py - локальный кэш данных каталога с оповещением об изменениях
+import threading
+import time
+from typing import Callable, Dict, Any, List, Optional
+
+# Виды изменений, передаваемые подписчикам
+COURSES = 'courses'
+COURSES_REMOVED = 'courses_removed'
+CHAPTERS = 'chapters'
+CHAPTER_DETAIL = 'chapter_detail'
+
+Listener = Callable[[str, List[Any]], None]
+
+class CatalogCache:
+    """Последние загруженные курсы, главы и содержимое глав.
+
+    Подписчики получают только реально изменившиеся записи, что позволяет
+    индексам обновляться инкрементально. Вызываются в потоке, изменившем данные.
+    """
+
+    def __init__(self):
+        self.courses: Dict[int, Dict[str, Any]] = {}
+        self.chapters: Dict[int, Dict[str, Any]] = {}
+        self.course_chapters: Dict[int, List[int]] = {}
+        self.chapters_loaded: Dict[int, float] = {}
+        self.chapter_details: Dict[int, Dict[str, Any]] = {}
+        self._listeners: List[Listener] = []
+        self._lock = threading.RLock()
+
+    def subscribe(self, listener: Listener):
+        if listener not in self._listeners:
+            self._listeners.append(listener)
+
+    def unsubscribe(self, listener: Listener):
+        if listener in self._listeners:
+            self._listeners.remove(listener)
+
+    def _emit(self, kind: str, items: List[Any]):
+        if not items:
+            return
+        for listener in list(self._listeners):
+            listener(kind, items)
+
+    def put_courses(self, courses: List[Dict[str, Any]], complete: bool = True):
+        """Сохраняет список курсов; complete=True - это полный каталог, отсутствующие удаляются"""
+        with self._lock:
+            changed = [course for course in courses if self.courses.get(course['id']) != course]
+            removed: List[int] = []
+            if complete:
+                fresh_ids = {course['id'] for course in courses}
+                removed = [course_id for course_id in self.courses if course_id not in fresh_ids]
+                for course_id in removed:
+                    del self.courses[course_id]
+            for course in changed:
+                self.courses[course['id']] = course
+        self._emit(COURSES_REMOVED, removed)
+        self._emit(COURSES, changed)
+
+    def remove_courses(self, course_ids: List[int]):
+        """Удаляет курсы (например, по событию сервера)"""
+        with self._lock:
+            removed = [course_id for course_id in course_ids if self.courses.pop(course_id, None) is not None]
+        self._emit(COURSES_REMOVED, removed)
+
+    def update_course(self, course_id: int, **fields):
+        """Частичное обновление полей курса (например, прогресса)"""
+        with self._lock:
+            course = self.courses.get(course_id)
+            if course is None or all(course.get(key) == value for key, value in fields.items()):
+                return
+            course = {**course, **fields}
+            self.courses[course_id] = course
+        self._emit(COURSES, [course])
+
+    def put_chapters(self, course_id: int, chapters: List[Dict[str, Any]]):
+        """Сохраняет главы курса"""
+        with self._lock:
+            changed = []
+            for chapter in chapters:
+                chapter = {**chapter, 'course_id': chapter.get('course_id', course_id)}
+                if self.chapters.get(chapter['id']) != chapter:
+                    self.chapters[chapter['id']] = chapter
+                    changed.append(chapter)
+            self.course_chapters[course_id] = [chapter['id'] for chapter in chapters]
+            self.chapters_loaded[course_id] = time.monotonic()
+        self._emit(CHAPTERS, changed)
+
+    def put_chapter_detail(self, detail: Dict[str, Any]):
+        """Сохраняет детальную информацию о главе (с содержимым)"""
+        with self._lock:
+            if self.chapter_details.get(detail['id']) == detail:
+                return
+            self.chapter_details[detail['id']] = detail
+        self._emit(CHAPTER_DETAIL, [detail])
+
+    def clear(self):
+        """Очистка кэша (например, при выходе пользователя)"""
+        with self._lock:
+            course_ids = set(self.courses) | set(self.course_chapters)
+            self.courses.clear()
+            self.chapters.clear()
+            self.course_chapters.clear()
+            self.chapters_loaded.clear()
+            self.chapter_details.clear()
+        self._emit(COURSES_REMOVED, sorted(course_ids))
+
+    def get_course(self, course_id: int) -> Optional[Dict[str, Any]]:
+        return self.courses.get(course_id)
+
+    def get_chapter(self, chapter_id: int) -> Optional[Dict[str, Any]]:
+        return self.chapters.get(chapter_id)
+
+    def get_chapters(self, course_id: int) -> Optional[List[Dict[str, Any]]]:
+        with self._lock:
+            chapter_ids = self.course_chapters.get(course_id)
+            if chapter_ids is None:
+                return None
+            return [self.chapters[chapter_id] for chapter_id in chapter_ids if chapter_id in self.chapters]
+
+    def chapters_age(self, course_id: int) -> Optional[float]:
+        """Сколько секунд назад загружен список глав курса (None - не загружен)"""
+        loaded = self.chapters_loaded.get(course_id)
+        return time.monotonic() - loaded if loaded is not None else None
+
+    def get_chapter_detail(self, chapter_id: int) -> Optional[Dict[str, Any]]:
+        return self.chapter_details.get(chapter_id)
@@ -0,0 +1,152 @@
+# connection_monitor.py
+import asyncio
+import time
+from typing import Callable, List, Optional
+from kivy.clock import Clock
+from kivy.logger import Logger
+from async_helper import get_shared_loop
+
+class ConnectionMonitor:
+    """Фоновый монитор доступности сервера с адаптивным интервалом проверок"""
+
+    def __init__(self, api_client, min_interval: float = 10.0, max_interval: float = 120.0,
+                 offline_interval: float = 3.0, max_offline_interval: float = 30.0,
+                 rtt_alpha: float = 0.3, probe_timeout: float = 5.0):
+        self.api_client = api_client
+        self.min_interval = min_interval
+        self.max_interval = max_interval
+        self.offline_interval = offline_interval
+        self.max_offline_interval = max_offline_interval
+        self.rtt_alpha = rtt_alpha
+        self.probe_timeout = probe_timeout
+
+        self.is_online: Optional[bool] = None
+        self.rtt: Optional[float] = None
+        self.probes_sent = 0
+        self.probes_skipped = 0
+
+        self._interval = min_interval
+        self._listeners: List[Callable[[bool], None]] = []
+        self._loop: Optional[asyncio.AbstractEventLoop] = None
+        self._task: Optional[asyncio.Task] = None
+        self._started = False
+        self._wakeup: Optional[asyncio.Event] = None
+
+    def subscribe(self, callback: Callable[[bool], None]):
+        """Подписка на смену состояния (вызывается в главном потоке)"""
+        if callback not in self._listeners:
+            self._listeners.append(callback)
+
+    def unsubscribe(self, callback: Callable[[bool], None]):
+        """Отписка от смены состояния"""
+        if callback in self._listeners:
+            self._listeners.remove(callback)
+
+    def start(self):
+        """Запуск мониторинга в общем event loop"""
+        if self._started:
+            return
+        self._started = True
+        self._loop = get_shared_loop()
+        self.api_client.add_traffic_listener(self._on_traffic)
+        self._loop.call_soon_threadsafe(self._start_task)
+
+    def stop(self):
+        """Остановка мониторинга"""
+        if not self._started:
+            return
+        self._started = False
+        self.api_client.remove_traffic_listener(self._on_traffic)
+        self._loop.call_soon_threadsafe(self._cancel_task)
+
+    def probe_now(self):
+        """Внеочередная проверка (например, после восстановления приложения)"""
+        if self._loop is not None and self._wakeup is not None:
+            self._loop.call_soon_threadsafe(self._wakeup.set)
+
+    def _start_task(self):
+        self._wakeup = asyncio.Event()
+        self._task = asyncio.ensure_future(self._run())
+
+    def _cancel_task(self):
+        if self._task is not None:
+            self._task.cancel()
+            self._task = None
+
+    async def _run(self):
+        """Основной цикл: проверяет сервер, только если трафик этого не подтвердил"""
+        try:
+            while True:
+                last_seen = self.api_client.last_response_at
+                if self.is_online and last_seen is not None:
+                    idle = time.monotonic() - last_seen
+                    if idle < self._interval:
+                        # Реальные запросы уже доказали доступность сервера
+                        self.probes_skipped += 1
+                        await self._sleep(self._interval - idle)
+                        continue
+
+                await self._probe()
+                await self._sleep(self._interval)
+        except asyncio.CancelledError:
+            pass
+
+    async def _sleep(self, delay: float):
+        """Ожидание следующей проверки с возможностью досрочного пробуждения"""
+        try:
+            await asyncio.wait_for(self._wakeup.wait(), timeout=max(delay, 0))
+        except asyncio.TimeoutError:
+            pass
+        self._wakeup.clear()
+
+    async def probe(self) -> bool:
+        """Немедленная проверка сервера (для запуска вне цикла мониторинга)"""
+        await self._probe()
+        return bool(self.is_online)
+
+    async def _probe(self):
+        """Запрос /health/ с замером RTT"""
+        self.probes_sent += 1
+        started = time.perf_counter()
+        is_connected = await self.api_client.health_check(timeout=self.probe_timeout)
+        if is_connected:
+            self._update_rtt(time.perf_counter() - started)
+        self._set_state(is_connected)
+
+    def _update_rtt(self, sample: float):
+        """Экспоненциальное скользящее среднее RTT"""
+        if self.rtt is None:
+            self.rtt = sample
+        else:
+            self.rtt = self.rtt_alpha * sample + (1 - self.rtt_alpha) * self.rtt
+
+    def _on_traffic(self, reachable: bool):
+        """Обработчик результатов реальных запросов API клиента"""
+        if reachable:
+            if not self.is_online:
+                self._set_state(True)
+        elif self.is_online is not False and self._wakeup is not None:
+            # Сетевая ошибка - перепроверяем сервер немедленно
+            self._loop.call_soon_threadsafe(self._wakeup.set)
+
+    def _set_state(self, is_online: bool):
+        """Обновляет состояние и адаптирует интервал проверок"""
+        changed = is_online != self.is_online
+        if changed:
+            self._interval = self.min_interval if is_online else self.offline_interval
+        elif is_online:
+            self._interval = min(self._interval * 1.5, self.max_interval)
+        else:
+            self._interval = min(self._interval * 2, self.max_offline_interval)
+
+        self.is_online = is_online
+        if changed:
+            Logger.info(f"ConnectionMonitor: сервер {'доступен' if is_online else 'недоступен'}")
+            Clock.schedule_once(lambda dt: self._dispatch(is_online), 0)
+
+    def _dispatch(self, is_online: bool):
+        for callback in list(self._listeners):
+            try:
+                callback(is_online)
+            except Exception as e:
+                Logger.error(f"Ошибка обработчика состояния соединения: {e}")
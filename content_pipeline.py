@@ -0,0 +1,265 @@
+# content_pipeline.py - предобработка текста глав в пуле потоков или процессов
+# Модуль не импортирует Kivy: функции предобработки выполняются в рабочих процессах
+import asyncio
+import hashlib
+import html
+import json
+import logging
+import os
+import re
+import sys
+from collections import OrderedDict
+from concurrent.futures import Executor, ProcessPoolExecutor, ThreadPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+from typing import Dict, Any, List, Optional
+
+logger = logging.getLogger(__name__)
+
+# Меняется при изменении формата результата - старый дисковый кэш игнорируется
+PIPELINE_VERSION = 1
+
+# Масштаб шрифта заголовков по уровню
+HEADING_SCALE = {1: 1.5, 2: 1.3, 3: 1.15}
+
+_HTML_BLOCK_RE = re.compile(r'</?(p|div|br|h[1-6]|li|ul|ol|pre)\b[^>]*>', re.IGNORECASE)
+_HTML_TAG_RE = re.compile(r'<[^>]+>')
+_HEADING_RE = re.compile(r'^(#{1,6})\s+(.*)$')
+_LIST_RE = re.compile(r'^(?:[-*•]|\d+[.)])\s+(.*)$')
+_BOLD_RE = re.compile(r'\*\*(.+?)\*\*|__(.+?)__')
+_ITALIC_RE = re.compile(r'(?<![*\w])\*(?!\s)(.+?)(?<!\s)\*(?!\*)')
+_CODE_RE = re.compile(r'`([^`]+)`')
+_WORD_RE = re.compile(r'\w+')
+
+def content_hash(text: str) -> str:
+    return hashlib.sha256(text.encode('utf-8')).hexdigest()
+
+def escape_markup(text: str) -> str:
+    """Экранирование служебных символов разметки Kivy"""
+    return text.replace('&', '&amp;').replace('[', '&bl;').replace(']', '&br;')
+
+def inline_markup(text: str) -> str:
+    """**жирный**, *курсив* и `код` в разметку Kivy"""
+    text = escape_markup(text)
+    text = _CODE_RE.sub(lambda m: f"[color=#37474f]{m.group(1)}[/color]", text)
+    text = _BOLD_RE.sub(lambda m: f"[b]{m.group(1) or m.group(2)}[/b]", text)
+    return _ITALIC_RE.sub(lambda m: f"[i]{m.group(1)}[/i]", text)
+
+def html_to_text(text: str) -> str:
+    """Упрощенный HTML в текст с разметкой markdown (заголовки, жирный, курсив, списки)"""
+    if '<' not in text:
+        return text
+    text = re.sub(r'<(b|strong)>(.*?)</\1>', r'**\2**', text, flags=re.IGNORECASE | re.DOTALL)
+    text = re.sub(r'<(i|em)>(.*?)</\1>', r'*\2*', text, flags=re.IGNORECASE | re.DOTALL)
+    text = re.sub(r'<h([1-6])[^>]*>(.*?)</h\1>', lambda m: f"\n\n{'#' * int(m.group(1))} {m.group(2)}\n\n",
+                  text, flags=re.IGNORECASE | re.DOTALL)
+    text = re.sub(r'<li[^>]*>', '\n- ', text, flags=re.IGNORECASE)
+    text = re.sub(r'<br\s*/?>', '\n', text, flags=re.IGNORECASE)
+    text = _HTML_BLOCK_RE.sub('\n\n', text)
+    return html.unescape(_HTML_TAG_RE.sub('', text))
+
+def preprocess_content(text: str) -> Dict[str, Any]:
+    """Текст главы в список абзацев с разметкой Kivy и подсказками для раскладки"""
+    text = html_to_text(text.replace('\r\n', '\n'))
+    paragraphs: List[Dict[str, Any]] = []
+    for block in re.split(r'\n\s*\n', text):
+        lines = [line.strip() for line in block.strip().split('\n') if line.strip()]
+        # Заголовок может идти без пустой строки перед текстом
+        while lines and _HEADING_RE.match(lines[0]):
+            heading = _HEADING_RE.match(lines.pop(0))
+            paragraphs.append({
+                'kind': 'heading',
+                'markup': f"[b]{inline_markup(heading.group(2))}[/b]",
+                'hints': {'scale': HEADING_SCALE.get(len(heading.group(1)), 1.0), 'keep_with_next': True},
+            })
+        if not lines:
+            continue
+        if all(_LIST_RE.match(line) for line in lines):
+            items = [inline_markup(_LIST_RE.match(line).group(1)) for line in lines]
+            paragraphs.append({
+                'kind': 'list',
+                'markup': '\n'.join(f"•  {item}" for item in items),
+                'hints': {'scale': 1.0, 'items': len(items)},
+            })
+        else:
+            paragraphs.append({
+                'kind': 'text',
+                'markup': inline_markup(' '.join(lines)),
+                'hints': {'scale': 1.0},
+            })
+    words = len(_WORD_RE.findall(text))
+    return {
+        'version': PIPELINE_VERSION,
+        'paragraphs': paragraphs,
+        'words': words,
+        'reading_minutes': max(1, round(words / 180)),
+    }
+
+def plain_content(text: str) -> Dict[str, Any]:
+    """Абзацы без разбора разметки - запасной вариант, если обработка не уложилась во время"""
+    blocks = [block.strip() for block in re.split(r'\n\s*\n', text.replace('\r\n', '\n')) if block.strip()]
+    return {
+        'version': PIPELINE_VERSION,
+        'paragraphs': [{'kind': 'text', 'markup': escape_markup(' '.join(block.split())), 'hints': {'scale': 1.0}}
+                       for block in blocks],
+        'words': len(text.split()),
+        'reading_minutes': max(1, round(len(text.split()) / 180)),
+    }
+
+# Пул процессов, запущенный start_process_pool до загрузки Kivy; забирает ContentPipeline
+_process_pool: Optional[ProcessPoolExecutor] = None
+
+def start_process_pool(max_workers: int = 2) -> Optional[ProcessPoolExecutor]:
+    """Запускает и прогревает пул процессов (fork) в самом начале main.py.
+
+    Пока нет окна Kivy, общего event loop и потоков httpx, fork копирует процесс
+    без чужих блокировок, а рабочие не импортируют main.py заново (как при
+    forkserver/spawn). Позже пул не создается: без него ContentPipeline работает
+    в потоках. На Android и Windows, а также при EDUAPP_CONTENT_WORKERS=thread
+    или inline пул не запускается.
+    """
+    global _process_pool
+    if _process_pool is not None:
+        return _process_pool
+    if sys.platform == 'win32' or 'ANDROID_ARGUMENT' in os.environ:
+        return None
+    if os.environ.get('EDUAPP_CONTENT_WORKERS', 'process') != 'process':
+        return None
+    import multiprocessing
+    try:
+        pool = ProcessPoolExecutor(max_workers=max_workers, mp_context=multiprocessing.get_context('fork'))
+        # С fork все рабочие создаются при первой задаче - прогрев запускает их сейчас
+        for future in [pool.submit(preprocess_content, '') for _ in range(max_workers)]:
+            future.result(timeout=10.0)
+    except Exception as e:
+        logger.warning(f"Пул процессов недоступен, используются потоки: {e}")
+        return None
+    _process_pool = pool
+    return pool
+
+def _take_process_pool() -> Optional[ProcessPoolExecutor]:
+    global _process_pool
+    pool, _process_pool = _process_pool, None
+    return pool
+
+class ContentPipeline:
+    """Предобработка содержимого глав в пуле с кэшем по хэшу текста.
+
+    mode: 'process' (по умолчанию; пул из start_process_pool, без него - потоки),
+    'thread' или 'inline'. Результаты хранятся в памяти (LRU) и на диске, поэтому
+    повторное открытие главы не запускает обработку снова. Если обработка не
+    уложилась в timeout или пул сломался, глава показывается простым текстом,
+    а дальше обработка идет в потоках - новые процессы не создаются.
+    """
+
+    def __init__(self, cache_dir: Optional[str] = None, mode: Optional[str] = None,
+                 max_workers: int = 2, memory_items: int = 64, timeout: float = 10.0):
+        self.cache_dir = cache_dir
+        self.mode = mode or os.environ.get('EDUAPP_CONTENT_WORKERS', 'process')
+        self.max_workers = max_workers
+        self.timeout = timeout
+        self.timeouts = 0
+        self.memory_items = memory_items
+        self.processed = 0
+        self._memory: 'OrderedDict[str, Dict[str, Any]]' = OrderedDict()
+        self._executor: Optional[Executor] = None
+        self._io_executor: Optional[ThreadPoolExecutor] = None
+        if cache_dir:
+            os.makedirs(cache_dir, exist_ok=True)
+
+    def _get_executor(self) -> Optional[Executor]:
+        if self._executor is None and self.mode != 'inline':
+            if self.mode == 'process':
+                self._executor = _take_process_pool()
+            if self._executor is None:
+                self.mode = 'thread'
+                self._executor = ThreadPoolExecutor(max_workers=self.max_workers,
+                                                    thread_name_prefix='content-pipeline')
+        return self._executor
+
+    def get_cached(self, text: str) -> Optional[Dict[str, Any]]:
+        """Результат из памяти без обработки (None, если текст еще не обрабатывался)"""
+        return self._memory.get(content_hash(text))
+
+    async def prepare(self, text: str) -> Dict[str, Any]:
+        """Промежуточное представление текста: память -> диск -> обработка в пуле"""
+        key = content_hash(text)
+        prepared = self._memory.get(key)
+        if prepared is not None:
+            self._memory.move_to_end(key)
+            return prepared
+
+        loop = asyncio.get_running_loop()
+        if self._io_executor is None:
+            self._io_executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix='content-cache')
+        prepared = await loop.run_in_executor(self._io_executor, self._read_disk, key)
+        if prepared is None:
+            try:
+                prepared = await self._run(loop, text)
+            except asyncio.TimeoutError:
+                # Зависший рабочий не должен оставлять экран главы пустым; результат не кэшируется
+                self.timeouts += 1
+                logger.warning(f"Обработка содержимого дольше {self.timeout} с, показываем простой текст")
+                self._reset_executor()
+                return plain_content(text)
+            self.processed += 1
+            await loop.run_in_executor(self._io_executor, self._write_disk, key, prepared)
+
+        self._memory[key] = prepared
+        while len(self._memory) > self.memory_items:
+            self._memory.popitem(last=False)
+        return prepared
+
+    async def _run(self, loop, text: str) -> Dict[str, Any]:
+        executor = self._get_executor()
+        if executor is None:
+            return preprocess_content(text)
+        try:
+            return await asyncio.wait_for(loop.run_in_executor(executor, preprocess_content, text), self.timeout)
+        except BrokenProcessPool as e:
+            # Рабочий процесс завершился аварийно - дальше работаем в потоках
+            logger.warning(f"Пул процессов сломан, переход на потоки: {e}")
+            self._reset_executor()
+            return await asyncio.wait_for(loop.run_in_executor(self._get_executor(), preprocess_content, text),
+                                          self.timeout)
+
+    def _reset_executor(self):
+        """Сброс пула: новые задачи не ждут зависшего или сломанного рабочего"""
+        if self._executor is not None:
+            self._executor.shutdown(wait=False)
+            self._executor = None
+        if self.mode == 'process':
+            self.mode = 'thread'
+
+    def _disk_path(self, key: str) -> Optional[str]:
+        return os.path.join(self.cache_dir, f"{key}.json") if self.cache_dir else None
+
+    def _read_disk(self, key: str) -> Optional[Dict[str, Any]]:
+        path = self._disk_path(key)
+        if not path or not os.path.exists(path):
+            return None
+        try:
+            with open(path, encoding='utf-8') as f:
+                prepared = json.load(f)
+        except (OSError, ValueError):
+            return None
+        return prepared if prepared.get('version') == PIPELINE_VERSION else None
+
+    def _write_disk(self, key: str, prepared: Dict[str, Any]):
+        path = self._disk_path(key)
+        if not path:
+            return
+        try:
+            tmp_path = f"{path}.tmp"
+            with open(tmp_path, 'w', encoding='utf-8') as f:
+                json.dump(prepared, f, ensure_ascii=False, separators=(',', ':'))
+            os.replace(tmp_path, path)
+        except OSError as e:
+            logger.warning(f"Не удалось сохранить обработанное содержимое: {e}")
+
+    def close(self):
+        if self._executor is not None:
+            self._executor.shutdown(wait=False)
+            self._executor = None
+        if self._io_executor is not None:
+            self._io_executor.shutdown(wait=False)
+            self._io_executor = None
@@ -0,0 +1,347 @@
+# course_pack.py - офлайн-пакет курса: один индексированный файл, чтение через mmap
+import asyncio
+import hashlib
+import json
+import mmap
+import os
+import struct
+import threading
+import time
+from typing import Callable, Dict, Any, Iterable, List, Optional, Tuple
+from kivy.logger import Logger
+from scheduler import Lane, in_lane
+
+# Формат файла:
+#   заголовок  - сигнатура, версия, число записей, id курса, время сборки
+#   таблица    - по записи на блок: вид, ключ, смещение, длина, хэш содержимого
+#   блоки      - JSON в UTF-8, выровненные по 8 байт
+PACK_MAGIC = b'EDUPACK\0'
+PACK_VERSION = 1
+_HEADER = struct.Struct('<8sHHIqd')
+_ENTRY = struct.Struct('<BxxxqQI16s')
+_ALIGN = 8
+
+# Виды блоков; ключ - id курса (COURSE, CHAPTERS) или id главы (CHAPTER, TEST)
+COURSE = 1
+CHAPTERS = 2
+CHAPTER = 3
+TEST = 4
+MANIFEST = 5
+
+def _digest(data) -> bytes:
+    return hashlib.blake2b(data, digest_size=16).digest()
+
+def _encode(value: Any) -> bytes:
+    return json.dumps(value, ensure_ascii=False, separators=(',', ':')).encode('utf-8')
+
+def write_pack(path: str, course_id: int, blobs: Iterable[Tuple[int, int, Any]]):
+    """Запись пакета атомарной заменой файла; blobs - (вид, ключ, bytes или memoryview)"""
+    blobs = list(blobs)
+    table_end = _HEADER.size + _ENTRY.size * len(blobs)
+    offset = -(-table_end // _ALIGN) * _ALIGN
+    entries = []
+    for kind, key, data in blobs:
+        entries.append(_ENTRY.pack(kind, key, offset, len(data), _digest(data)))
+        offset += -(-len(data) // _ALIGN) * _ALIGN
+
+    tmp_path = f"{path}.tmp"
+    with open(tmp_path, 'wb') as f:
+        f.write(_HEADER.pack(PACK_MAGIC, PACK_VERSION, 0, len(blobs), course_id, time.time()))
+        f.writelines(entries)
+        position = table_end
+        for _, _, data in blobs:
+            f.write(b'\0' * (-position % _ALIGN))
+            position += -position % _ALIGN
+            f.write(data)
+            position += len(data)
+    os.replace(tmp_path, path)
+
+class CoursePack:
+    """Открытый пакет курса. Блоки читаются прямо из отображенного файла без его загрузки"""
+
+    def __init__(self, path: str):
+        self.path = path
+        self._file = open(path, 'rb')
+        try:
+            self._mmap = mmap.mmap(self._file.fileno(), 0, access=mmap.ACCESS_READ)
+            magic, version, _, count, self.course_id, self.created_at = _HEADER.unpack_from(self._mmap, 0)
+            if magic != PACK_MAGIC or version != PACK_VERSION:
+                raise ValueError(f"неподдерживаемый формат пакета: {path}")
+            self.entries: Dict[Tuple[int, int], Tuple[int, int, bytes]] = {}
+            for index in range(count):
+                kind, key, offset, length, digest = _ENTRY.unpack_from(self._mmap, _HEADER.size + index * _ENTRY.size)
+                if offset + length > len(self._mmap):
+                    raise ValueError(f"пакет поврежден: {path}")
+                self.entries[(kind, key)] = (offset, length, digest)
+        except Exception:
+            self.close()
+            raise
+
+    def __contains__(self, item: Tuple[int, int]) -> bool:
+        return item in self.entries
+
+    def view(self, kind: int, key: int) -> Optional[memoryview]:
+        """Блок как memoryview над mmap (без копирования); вызывающий должен вызвать release()"""
+        entry = self.entries.get((kind, key))
+        if entry is None:
+            return None
+        offset, length, _ = entry
+        return memoryview(self._mmap)[offset:offset + length]
+
+    def digest(self, kind: int, key: int) -> Optional[bytes]:
+        entry = self.entries.get((kind, key))
+        return entry[2] if entry else None
+
+    def get(self, kind: int, key: int) -> Optional[Any]:
+        """Разобранный JSON блока (строка декодируется прямо из mmap)"""
+        view = self.view(kind, key)
+        if view is None:
+            return None
+        with view:
+            return json.loads(str(view, 'utf-8'))
+
+    def chapter_ids(self) -> List[int]:
+        return [key for kind, key in self.entries if kind == CHAPTER]
+
+    def size(self) -> int:
+        return len(self._mmap) if self._mmap else 0
+
+    def close(self):
+        mapped, self._mmap = getattr(self, '_mmap', None), None
+        if mapped is not None:
+            try:
+                mapped.close()
+            except BufferError:
+                # Блоки еще копируются в новый пакет - отображение закроется сборщиком мусора
+                Logger.warning(f"CoursePack: пакет {self.path} закрыт во время чтения")
+        self._file.close()
+
+class CoursePackStore:
+    """Офлайн-пакеты курсов в каталоге pack_dir (по файлу на курс).
+
+    Скачивание идет параллельно (не более concurrency запросов) через общий
+    API клиент. При обновлении главы и тесты запрашиваются с If-None-Match по
+    ETag из манифеста пакета; на 304 (или при совпадении хэша содержимого, если
+    сервер не отдает ETag) их блоки копируются из прежнего пакета.
+    Чтение - из главного потока, скачивание - в общем event loop.
+    Пакет, скачанный после clear() (выход пользователя), не устанавливается.
+    """
+
+    def __init__(self, api_client, pack_dir: str, concurrency: int = 4):
+        self.api_client = api_client
+        self.pack_dir = pack_dir
+        self.concurrency = concurrency
+        self._packs: Dict[int, CoursePack] = {}
+        self._chapter_course: Dict[int, int] = {}
+        self._downloads: Dict[int, asyncio.Future] = {}
+        # Увеличивается в clear(): загрузки, начатые раньше, не устанавливают пакет
+        self._generation = 0
+        # Замена пакета не должна совпасть с чтением из главного потока
+        self._lock = threading.RLock()
+        os.makedirs(pack_dir, exist_ok=True)
+        self._open_existing()
+
+    def _path(self, course_id: int) -> str:
+        return os.path.join(self.pack_dir, f"course_{course_id}.pack")
+
+    def _open_existing(self):
+        for name in os.listdir(self.pack_dir):
+            if name.startswith('course_') and name.endswith('.pack'):
+                try:
+                    self._install(CoursePack(os.path.join(self.pack_dir, name)))
+                except (OSError, ValueError, struct.error) as e:
+                    Logger.warning(f"CoursePack: пропущен пакет {name}: {e}")
+
+    def _install(self, pack: CoursePack):
+        with self._lock:
+            old = self._packs.get(pack.course_id)
+            if old is not None:
+                for chapter_id in old.chapter_ids():
+                    self._chapter_course.pop(chapter_id, None)
+            self._packs[pack.course_id] = pack
+            for chapter_id in pack.chapter_ids():
+                self._chapter_course[chapter_id] = pack.course_id
+        if old is not None:
+            old.close()
+
+    # --- Чтение ---
+
+    def has_course(self, course_id: int) -> bool:
+        return course_id in self._packs
+
+    def has_chapter(self, chapter_id: int) -> bool:
+        return chapter_id in self._chapter_course
+
+    def _get(self, course_id: Optional[int], kind: int, key: int) -> Optional[Any]:
+        with self._lock:
+            pack = self._packs.get(course_id)
+            return pack.get(kind, key) if pack else None
+
+    def course_detail(self, course_id: int) -> Optional[Dict[str, Any]]:
+        return self._get(course_id, COURSE, course_id)
+
+    def chapters(self, course_id: int) -> Optional[List[Dict[str, Any]]]:
+        return self._get(course_id, CHAPTERS, course_id)
+
+    def chapter_detail(self, chapter_id: int) -> Optional[Dict[str, Any]]:
+        return self._get(self._chapter_course.get(chapter_id), CHAPTER, chapter_id)
+
+    def chapter_test(self, chapter_id: int) -> Optional[Dict[str, Any]]:
+        return self._get(self._chapter_course.get(chapter_id), TEST, chapter_id)
+
+    # --- Скачивание ---
+
+    async def download(self, course_id: int,
+                       on_progress: Optional[Callable[[int, int], None]] = None) -> Dict[str, Any]:
+        """Скачивает или обновляет пакет курса и возвращает статистику загрузки.
+
+        Повторный вызов во время скачивания ждет ту же задачу.
+        on_progress(готово, всего) вызывается в потоке event loop.
+        """
+        task = self._downloads.get(course_id)
+        if task is None or task.done():
+            task = asyncio.ensure_future(in_lane(Lane.NORMAL, self._download(course_id, on_progress)))
+            self._downloads[course_id] = task
+        return await asyncio.shield(task)
+
+    async def _download(self, course_id: int, on_progress) -> Dict[str, Any]:
+        started = time.perf_counter()
+        generation = self._generation
+        api = self.api_client
+        course, chapters = await asyncio.gather(api.get_course_detail(course_id), api.get_chapters(course_id))
+        old = self._packs.get(course_id)
+        if not course or not chapters:
+            # Без списка глав нельзя понять, что удалено - прежний пакет остается как есть
+            raise RuntimeError(f"не удалось получить курс {course_id}")
+
+        manifest = (old.get(MANIFEST, 0) if old else None) or {}
+        semaphore = asyncio.Semaphore(self.concurrency)
+        total = len(chapters)
+        done = 0
+        stats = {"chapters": total, "fetched": 0, "not_modified": 0, "reused": 0, "changed": 0, "missing": 0}
+
+        def known_etag(kind: int, chapter_id: int) -> Optional[str]:
+            entry = manifest.get(str(chapter_id))
+            if old is None or not isinstance(entry, dict) or (kind, chapter_id) not in old:
+                return None
+            return entry.get('detail' if kind == CHAPTER else 'test')
+
+        async def fetch(chapter):
+            nonlocal done
+            chapter_id = chapter['id']
+            async with semaphore:
+                requests = [api.get_chapter_detail_conditional(chapter_id, known_etag(CHAPTER, chapter_id))]
+                if chapter.get('has_test'):
+                    requests.append(api.get_chapter_test_conditional(chapter_id, known_etag(TEST, chapter_id)))
+                result = await asyncio.gather(*requests)
+            done += 1
+            if on_progress:
+                on_progress(done, total)
+            return chapter, result
+
+        results = await asyncio.gather(*(fetch(chapter) for chapter in chapters))
+
+        blobs: List[Tuple[int, int, Any]] = [(COURSE, course_id, _encode(course)),
+                                             (CHAPTERS, course_id, _encode(chapters))]
+        views: List[memoryview] = []
+        new_manifest: Dict[str, Any] = {}
+
+        def reuse(kind: int, chapter_id: int) -> bool:
+            if old is None or (kind, chapter_id) not in old:
+                return False
+            view = old.view(kind, chapter_id)
+            views.append(view)
+            blobs.append((kind, chapter_id, view))
+            return True
+
+        def store(kind: int, chapter_id: int, response) -> Tuple[str, Optional[str]]:
+            """Блок из ответа или прежнего пакета: (исход, ETag для манифеста)"""
+            status, data, etag = response
+            if status == 304:
+                stats["not_modified"] += 1
+                return ('reused' if reuse(kind, chapter_id) else 'missing'), etag or known_etag(kind, chapter_id)
+            if status != 200 or data is None:
+                # Ошибка загрузки: оставляем прежнюю версию, если она была
+                return ('reused' if reuse(kind, chapter_id) else 'missing'), known_etag(kind, chapter_id)
+            stats["fetched"] += 1
+            encoded = _encode(data)
+            if old is not None and old.digest(kind, chapter_id) == _digest(encoded) and reuse(kind, chapter_id):
+                # Сервер без ETag прислал то же самое - блок не перекодируется
+                return 'reused', etag
+            blobs.append((kind, chapter_id, encoded))
+            return 'changed', etag
+
+        for chapter, result in results:
+            chapter_id = chapter['id']
+            outcome, detail_etag = store(CHAPTER, chapter_id, result[0])
+            stats[outcome] += 1
+            entry = {'detail': detail_etag}
+            if len(result) > 1:
+                entry['test'] = store(TEST, chapter_id, result[1])[1]
+            new_manifest[str(chapter_id)] = entry
+        blobs.append((MANIFEST, 0, _encode(new_manifest)))
+
+        path = self._path(course_id)
+        loop = asyncio.get_running_loop()
+        try:
+            # Блоки прежнего пакета копируются прямо из его mmap; он закрывается только после записи
+            await loop.run_in_executor(None, write_pack, path, course_id, blobs)
+        finally:
+            for view in views:
+                view.release()
+        with self._lock:
+            current = generation == self._generation
+            if current:
+                self._install(CoursePack(path))
+        if not current:
+            # Пользователь вышел во время загрузки - пакет ему больше не принадлежит
+            try:
+                os.remove(path)
+            except OSError:
+                pass
+            raise asyncio.CancelledError()
+
+        stats["size"] = self._packs[course_id].size()
+        stats["elapsed"] = round(time.perf_counter() - started, 3)
+        Logger.info(f"CoursePack: курс {course_id} сохранен офлайн: {stats}")
+        return stats
+
+    def remove(self, course_id: int):
+        with self._lock:
+            pack = self._packs.pop(course_id, None)
+            if pack is None:
+                return
+            for chapter_id in pack.chapter_ids():
+                self._chapter_course.pop(chapter_id, None)
+            pack.close()
+        try:
+            os.remove(self._path(course_id))
+        except OSError as e:
+            Logger.warning(f"CoursePack: не удалось удалить пакет курса {course_id}: {e}")
+
+    def clear(self):
+        """Удаление всех пакетов и отмена загрузок (при выходе пользователя)"""
+        with self._lock:
+            self._generation += 1
+        for task in list(self._downloads.values()):
+            if not task.done():
+                # Загрузки идут в общем event loop, а clear() вызывается из главного потока
+                task.get_loop().call_soon_threadsafe(task.cancel)
+        self._downloads.clear()
+        for course_id in list(self._packs):
+            self.remove(course_id)
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            "courses": len(self._packs),
+            "chapters": len(self._chapter_course),
+            "size_mb": round(sum(pack.size() for pack in self._packs.values()) / (1024 * 1024), 2),
+            "downloading": sum(1 for task in self._downloads.values() if not task.done()),
+        }
+
+    def close(self):
+        with self._lock:
+            for pack in self._packs.values():
+                pack.close()
+            self._packs.clear()
+            self._chapter_course.clear()
@@ -0,0 +1,142 @@
+# facets.py - фильтрация и сортировка каталога курсов на клиенте
+from typing import Dict, Any, Iterable, List, Optional, Set, Tuple
+import catalog
+
+# Группы прогресса: (ключ, подпись)
+PROGRESS_BUCKETS = (
+    ('not_started', 'Не начат'),
+    ('in_progress', 'В процессе'),
+    ('completed', 'Завершен'),
+)
+
+SORT_OPTIONS = (
+    ('default', 'По умолчанию'),
+    ('title', 'По названию'),
+    ('progress', 'По прогрессу'),
+)
+
+# Значение фильтра «любое»; None в category_id - это «Без категории»
+ANY: Any = object()
+
+def progress_bucket(percentage: Optional[float]) -> str:
+    percentage = percentage or 0
+    if percentage <= 0:
+        return 'not_started'
+    if percentage >= 100:
+        return 'completed'
+    return 'in_progress'
+
+def category_label(course: Dict[str, Any]) -> str:
+    """Название категории курса (если сервер его не прислал - по номеру)"""
+    name = course.get('category_name')
+    if name:
+        return name
+    category = course.get('category')
+    if isinstance(category, dict) and category.get('name'):
+        return category['name']
+    if course.get('category_id') is None:
+        return 'Без категории'
+    return f"Категория {course['category_id']}"
+
+class FacetIndex:
+    """Индексы курсов по категории, подписке и прогрессу.
+
+    Строится из полного каталога в CatalogCache и обновляется по его событиям
+    только для изменившихся курсов, поэтому фильтры не обращаются к серверу.
+    """
+
+    def __init__(self):
+        self._courses: Dict[int, Dict[str, Any]] = {}
+        self._facets: Dict[int, Tuple[Optional[int], bool, str]] = {}
+        self.by_category: Dict[Optional[int], Set[int]] = {}
+        self.by_subscription: Dict[bool, Set[int]] = {True: set(), False: set()}
+        self.by_progress: Dict[str, Set[int]] = {key: set() for key, _ in PROGRESS_BUCKETS}
+        self.category_labels: Dict[Optional[int], str] = {}
+
+    def __len__(self):
+        return len(self._courses)
+
+    def attach(self, catalog_cache: 'catalog.CatalogCache'):
+        """Подписывает индекс на изменения кэша и индексирует уже загруженные курсы"""
+        catalog_cache.subscribe(self._on_catalog_change)
+        self.update(list(catalog_cache.courses.values()))
+
+    def _on_catalog_change(self, kind: str, items: List[Any]):
+        if kind == catalog.COURSES:
+            self.update(items)
+        elif kind == catalog.COURSES_REMOVED:
+            self.remove(items)
+
+    def update(self, courses: Iterable[Dict[str, Any]]):
+        for course in courses:
+            course_id = course['id']
+            facets = (course.get('category_id'), bool(course.get('is_subscribed')),
+                      progress_bucket(course.get('progress_percentage')))
+            old = self._facets.get(course_id)
+            if old != facets:
+                if old is not None:
+                    self._discard(course_id, old)
+                self.by_category.setdefault(facets[0], set()).add(course_id)
+                self.by_subscription[facets[1]].add(course_id)
+                self.by_progress[facets[2]].add(course_id)
+                self._facets[course_id] = facets
+            self.category_labels.setdefault(facets[0], category_label(course))
+            self._courses[course_id] = course
+
+    def remove(self, course_ids: Iterable[int]):
+        for course_id in course_ids:
+            facets = self._facets.pop(course_id, None)
+            if facets is not None:
+                self._discard(course_id, facets)
+            self._courses.pop(course_id, None)
+
+    def _discard(self, course_id: int, facets: Tuple[Optional[int], bool, str]):
+        category_id, subscribed, bucket = facets
+        members = self.by_category.get(category_id)
+        if members is not None:
+            members.discard(course_id)
+            if not members:
+                del self.by_category[category_id]
+                self.category_labels.pop(category_id, None)
+        self.by_subscription[subscribed].discard(course_id)
+        self.by_progress[bucket].discard(course_id)
+
+    def match(self, category_id: Optional[int] = ANY, subscribed: bool = ANY, progress: str = ANY) -> Set[int]:
+        """Идентификаторы курсов, подходящих под все заданные фильтры (ANY - без фильтра)"""
+        selected = [members for members, wanted in (
+            (self.by_category.get(category_id, set()), category_id),
+            (self.by_subscription.get(subscribed, set()), subscribed),
+            (self.by_progress.get(progress, set()), progress),
+        ) if wanted is not ANY]
+        if not selected:
+            return set(self._courses)
+        selected.sort(key=len)
+        return set(selected[0]).intersection(*selected[1:])
+
+    def query(self, category_id: Optional[int] = ANY, subscribed: bool = ANY, progress: str = ANY,
+              sort: str = 'default') -> List[Dict[str, Any]]:
+        """Отфильтрованные и отсортированные курсы"""
+        ids = self.match(category_id, subscribed, progress)
+        # Порядок по умолчанию - порядок, в котором курсы пришли с сервера
+        courses = [course for course_id, course in self._courses.items() if course_id in ids]
+        if sort == 'title':
+            courses.sort(key=lambda course: course.get('title', '').lower())
+        elif sort == 'progress':
+            courses.sort(key=lambda course: -(course.get('progress_percentage') or 0))
+        return courses
+
+    def counts(self) -> Dict[str, Dict[Any, int]]:
+        """Количество курсов в каждом значении фасета"""
+        return {
+            'category': {category_id: len(ids) for category_id, ids in self.by_category.items()},
+            'subscribed': {value: len(ids) for value, ids in self.by_subscription.items()},
+            'progress': {bucket: len(ids) for bucket, ids in self.by_progress.items()},
+        }
+
+    def categories(self) -> List[Tuple[Optional[int], str, int]]:
+        """Категории каталога: (id, название, количество курсов)"""
+        return sorted(
+            ((category_id, self.category_labels.get(category_id, ''), len(ids))
+             for category_id, ids in self.by_category.items()),
+            key=lambda item: item[1].lower()
+        )
@@ -0,0 +1,91 @@
+# kv_cache.py - кэш разобранных и скомпилированных KV правил
+import copyreg
+import hashlib
+import io
+import marshal
+import os
+import pickle
+import sys
+import types
+from kivy import __version__ as kivy_version
+from kivy.factory import Factory
+from kivy.lang import Builder
+from kivy.lang.parser import Parser
+from kivy.logger import Logger
+from kivy.resources import resource_find
+
+CACHE_FORMAT = 1
+
+def _reduce_code(code):
+    # Объекты кода в pickle не поддерживаются - сериализуем их через marshal
+    return marshal.loads, (marshal.dumps(code),)
+
+class _KVPickler(pickle.Pickler):
+    dispatch_table = copyreg.dispatch_table.copy()
+    dispatch_table[types.CodeType] = _reduce_code
+
+def _cache_key(content: bytes) -> str:
+    """Ключ кэша: содержимое файла, версия Kivy и версия байткода Python"""
+    digest = hashlib.sha256(content)
+    digest.update(f"{CACHE_FORMAT}:{kivy_version}:{sys.version_info[:2]}".encode())
+    return digest.hexdigest()[:24]
+
+def _apply_parser(parser: Parser, filename: str):
+    """Регистрирует правила разобранного файла в Builder (аналог Builder.load_string без root)"""
+    # Директивы #:import/#:set изменяют глобальный контекст и должны выполняться при каждом запуске
+    parser.execute_directives()
+    Builder.rules.extend(parser.rules)
+    Builder._clear_matchcache()
+    for name, baseclasses in parser.dynamic_classes:
+        Factory.register(name, baseclasses=baseclasses, filename=filename, warn=True)
+    if filename not in Builder.files:
+        Builder.files.append(filename)
+
+def load_kv_file(filename: str, cache_dir: str):
+    """Загружает KV файл, используя кэш разобранных правил по хэшу содержимого.
+
+    Поддерживаются файлы только с правилами и динамическими классами; файлы с
+    корневым виджетом или шаблонами загружаются обычным Builder.load_file.
+    """
+    path = resource_find(filename) or filename
+    with open(path, 'rb') as f:
+        content = f.read()
+
+    prefix = f"{os.path.splitext(os.path.basename(path))[0]}-"
+    cache_path = os.path.join(cache_dir, f"{prefix}{_cache_key(content)}.pickle")
+    if os.path.exists(cache_path):
+        try:
+            with open(cache_path, 'rb') as f:
+                parser = pickle.load(f)
+            _apply_parser(parser, path)
+            Logger.info(f"KVCache: {filename} загружен из кэша")
+            return
+        except Exception as e:
+            Logger.warning(f"KVCache: кэш {cache_path} поврежден ({e}), разбираем заново")
+            try:
+                os.remove(cache_path)
+            except OSError:
+                pass
+
+    parser = Parser(content=content.decode('utf8'), filename=path)
+    if parser.root is not None or parser.templates:
+        Builder.load_file(path)
+        return
+
+    # Разбор выполнил директивы сам, повторный вызов в _apply_parser безопасен
+    _apply_parser(parser, path)
+    try:
+        os.makedirs(cache_dir, exist_ok=True)
+        buffer = io.BytesIO()
+        _KVPickler(buffer, protocol=pickle.HIGHEST_PROTOCOL).dump(parser)
+        tmp_path = f"{cache_path}.tmp"
+        with open(tmp_path, 'wb') as f:
+            f.write(buffer.getvalue())
+        os.replace(tmp_path, cache_path)
+        # Удаляем кэш предыдущих версий этого файла
+        for name in os.listdir(cache_dir):
+            stale = os.path.join(cache_dir, name)
+            if name.startswith(prefix) and name.endswith('.pickle') and stale != cache_path:
+                os.remove(stale)
+    except Exception as e:
+        Logger.warning(f"KVCache: не удалось сохранить кэш: {e}")
@@ -0,0 +1,176 @@
+# loadgen.py - нагрузочный генератор: виртуальные студенты на базе APIClient
+import os
+
+# Kivy не должен разбирать аргументы командной строки и открывать окно
+os.environ.setdefault('KIVY_NO_ARGS', '1')
+os.environ.setdefault('KIVY_NO_CONSOLELOG', '1')
+
+import argparse
+import asyncio
+import json
+import random
+import sys
+import time
+from typing import Dict, Any, List, Optional
+
+import httpx
+
+from api_client import APIClient, MemoryTokenStore
+from tracing import RequestTracer
+
+class VirtualStudent:
+    """Один виртуальный студент со своими токенами и сценарием обучения"""
+
+    def __init__(self, index: int, base_url: str, http_client: httpx.AsyncClient,
+                 tracer: RequestTracer, args, rnd: random.Random):
+        self.index = index
+        self.args = args
+        self.rnd = rnd
+        self.actions = 0
+        self.client = APIClient(base_url, token_store=MemoryTokenStore(), http_client=http_client)
+        self.client.tracer = tracer
+
+    async def think(self):
+        """Пауза между действиями (экспоненциальное распределение)"""
+        if self.args.think_time > 0:
+            await asyncio.sleep(self.rnd.expovariate(1.0 / self.args.think_time))
+
+    async def run(self, deadline: float):
+        """Вход и цикл обучения до окончания прогона"""
+        username = self.args.username_pattern.format(n=self.index)
+        result = await self.client.login(username, self.args.password)
+        if not result.get('success'):
+            return
+
+        await asyncio.gather(self.client.get_courses(), self.client.get_control_tests())
+        while time.monotonic() < deadline:
+            await self.think()
+            await self.study_session()
+            self.actions += 1
+
+        await self.client.logout()
+
+    async def study_session(self):
+        """Повторяет путь студента по экранам: каталог -> курс -> глава -> тест"""
+        courses = await self.client.get_courses()
+        if not courses:
+            return
+        course = self.rnd.choice(courses)
+        await self.client.get_course_detail(course['id'])
+        if not course.get('is_subscribed') and self.rnd.random() < 0.3:
+            await self.client.subscribe_to_course(course['id'])
+
+        await self.think()
+        chapters = await self.client.get_chapters(course['id'])
+        pending = [chapter for chapter in chapters if not chapter.get('is_completed')]
+        if not pending:
+            return
+        chapter = pending[0]
+        detail = await self.client.get_chapter_detail(chapter['id'])
+
+        await self.think()
+        if detail and detail.get('has_test'):
+            test = await self.client.get_chapter_test(chapter['id'])
+            if test and test.get('tasks'):
+                answers = {
+                    str(task['id']): [self.rnd.choice(task['answers'])['id']]
+                    for task in test['tasks'] if task.get('answers')
+                }
+                await self.client.submit_chapter_test(chapter['id'], answers)
+        await self.client.complete_chapter(chapter['id'])
+
+        if self.rnd.random() < 0.1:
+            await self.client.get_user_statistics()
+
+def snapshot(tracer: RequestTracer, started: float) -> Dict[str, Any]:
+    elapsed = time.monotonic() - started
+    overall = tracer.overall.to_dict()
+    return {
+        "elapsed_s": round(elapsed, 1),
+        "requests": tracer.requests,
+        "errors": tracer.errors,
+        "rps": round(tracer.requests / elapsed, 1) if elapsed else 0.0,
+        "p50_ms": overall["p50"],
+        "p95_ms": overall["p95"],
+        "p99_ms": overall["p99"],
+    }
+
+async def report_progress(tracer: RequestTracer, started: float, interval: float, active: List[int]):
+    while True:
+        await asyncio.sleep(interval)
+        data = snapshot(tracer, started)
+        print(f"[{data['elapsed_s']:>6}s] users={active[0]:<6} req={data['requests']:<8} "
+              f"rps={data['rps']:<8} err={data['errors']:<6} p50={data['p50_ms']} p95={data['p95_ms']} "
+              f"p99={data['p99_ms']}", flush=True)
+
+async def run_load(args, base_url: str) -> Dict[str, Any]:
+    tracer = RequestTracer(max_traces=1000)
+    limits = httpx.Limits(max_connections=args.connections, max_keepalive_connections=args.connections)
+    rnd = random.Random(args.seed)
+    active = [0]
+
+    async with httpx.AsyncClient(timeout=args.timeout, limits=limits, follow_redirects=True) as http_client:
+        started = time.monotonic()
+        deadline = started + args.duration
+        reporter = asyncio.ensure_future(report_progress(tracer, started, args.report_interval, active))
+
+        async def student_task(index: int):
+            student = VirtualStudent(index, base_url, http_client, tracer, args, random.Random(rnd.random()))
+            active[0] += 1
+            try:
+                await student.run(deadline)
+            except Exception as e:
+                print(f"Студент {index}: {type(e).__name__}: {e}", file=sys.stderr)
+            finally:
+                active[0] -= 1
+
+        tasks = []
+        for index in range(args.users):
+            tasks.append(asyncio.ensure_future(student_task(index)))
+            # Плавный набор пользователей со скоростью spawn_rate в секунду
+            if args.spawn_rate > 0:
+                await asyncio.sleep(1.0 / args.spawn_rate)
+            if time.monotonic() >= deadline:
+                break
+        await asyncio.gather(*tasks)
+        reporter.cancel()
+
+        result = snapshot(tracer, started)
+        result["users"] = len(tasks)
+        result["latency_ms"] = tracer.overall.to_dict()
+        result["endpoints"] = tracer.summary()
+        return result
+
+def main(argv: Optional[List[str]] = None) -> int:
+    parser = argparse.ArgumentParser(description="Нагрузочный генератор: виртуальные студенты на APIClient")
+    parser.add_argument('--base-url', default='http://127.0.0.1:8000')
+    parser.add_argument('--stub', action='store_true', help="запустить локальную заглушку API вместо сервера")
+    parser.add_argument('--users', type=int, default=100)
+    parser.add_argument('--spawn-rate', type=float, default=20.0, help="новых пользователей в секунду")
+    parser.add_argument('--duration', type=float, default=60.0, help="длительность прогона, с")
+    parser.add_argument('--think-time', type=float, default=1.0, help="средняя пауза между действиями, с")
+    parser.add_argument('--connections', type=int, default=200, help="размер общего пула соединений")
+    parser.add_argument('--timeout', type=float, default=30.0)
+    parser.add_argument('--username-pattern', default='student{n}')
+    parser.add_argument('--password', default='password')
+    parser.add_argument('--report-interval', type=float, default=5.0)
+    parser.add_argument('--seed', type=int, default=1)
+    parser.add_argument('--output', help="сохранить итоговую статистику в JSON")
+    args = parser.parse_args(argv)
+
+    if args.stub:
+        from stub_server import StubAPIServer, StubConfig
+        with StubAPIServer(StubConfig(latency=0.005)) as server:
+            result = asyncio.run(run_load(args, server.base_url))
+    else:
+        result = asyncio.run(run_load(args, args.base_url))
+
+    print(json.dumps({key: value for key, value in result.items() if key != "endpoints"},
+                     ensure_ascii=False, indent=2))
+    if args.output:
+        with open(args.output, 'w', encoding='utf-8') as f:
+            json.dump(result, f, ensure_ascii=False, indent=2)
+    return 0
+
+if __name__ == '__main__':
+    sys.exit(main())
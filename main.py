@@ -1,18 +1,41 @@
 # main.py
+import startup
+# Замер импортов должен начаться до загрузки Kivy (EDUAPP_STARTUP_PROFILE=1)
+startup.begin()
+
+if __name__ == '__main__':
+    # Рабочие процессы предобработки глав создаются fork до загрузки Kivy и старта потоков
+    import content_pipeline
+    content_pipeline.start_process_pool()
+
 from kivymd.app import MDApp
-from kivy.lang import Builder
 from kivy.uix.screenmanager import ScreenManager
 from kivy.core.window import Window
-from kivymd.uix.snackbar import Snackbar
 from kivy.clock import Clock
-from screens import *
 import os
+import gc
+import importlib
 import json
+import time
 from pathlib import Path
 from api_client import APIClient
+from async_helper import submit_to_loop
+from connection_monitor import ConnectionMonitor
+from kv_cache import load_kv_file
+from snapshot import UISnapshotStore
+from boot import BootOrchestrator
+from catalog import CatalogCache
+from search_index import SearchIndex
+from facets import FacetIndex
+from progress import ProgressEngine
+from analytics import LearningAnalytics
+from text_cache import TextTextureCache
+from content_pipeline import ContentPipeline
+from notifications import NotificationCenter
+from push_channel import PushChannel
+from resume_index import ResumeIndex
+from scheduler import Lane, in_lane
 import logging
-import threading
-import asyncio
 
 # Настройка логирования
 logging.basicConfig(level=logging.INFO)
@@ -21,21 +44,149 @@ logger = logging.getLogger(__name__)
 # Настройка размера окна для мобильных устройств
 Window.size = (360, 640)
 
+def get_rss_mb():
+    """Текущий размер резидентной памяти процесса в МБ (None, если недоступно)"""
+    try:
+        with open('/proc/self/statm') as f:
+            resident_pages = int(f.read().split()[1])
+        return resident_pages * os.sysconf('SC_PAGE_SIZE') / (1024 * 1024)
+    except (OSError, ValueError, IndexError, AttributeError):
+        return None
+
 class EduScreenManager(ScreenManager):
-    """Расширенный менеджер экранов с поддержкой API"""
+    """Расширенный менеджер экранов с поддержкой API, ленивым созданием и выгрузкой экранов"""
     current_user = None
     current_course = None
     current_chapter = None
     current_test = None
     api_client = None
 
+    def __init__(self, memory_budget_mb=None, max_inactive_heavy=1, eviction_cooldown=30.0, **kwargs):
+        super().__init__(**kwargs)
+        # Бюджет RSS, при превышении которого выгружаются неактивные тяжелые экраны
+        self.memory_budget_mb = memory_budget_mb
+        # Сколько неактивных тяжелых экранов держать в памяти независимо от бюджета
+        self.max_inactive_heavy = max_inactive_heavy
+        # Пауза между выгрузками по бюджету: освобожденная память редко возвращается ОС,
+        # и RSS остается выше бюджета, даже когда выгружать уже нечего
+        self.eviction_cooldown = eviction_cooldown
+        self._last_budget_eviction = None
+        self._screen_registry = {}
+        self._screen_state = {}
+        self._last_left = {}
+
+    def register_screen(self, name, screen_cls, heavy=False):
+        """Регистрирует экран; он будет создан при первом переходе на него.
+
+        screen_cls - класс или строка "модуль:Класс", импортируемая при первом создании.
+        """
+        self._screen_registry[name] = (screen_cls, heavy)
+
+    def has_screen(self, name):
+        return name in self._screen_registry or super().has_screen(name)
+
+    def get_built_screen(self, name):
+        """Возвращает экран, только если он уже создан"""
+        for screen in self.screens:
+            if screen.name == name:
+                return screen
+        return None
+
+    def get_screen(self, name):
+        """Возвращает экран, создавая его из реестра при первом обращении"""
+        if name in self._screen_registry and not super().has_screen(name):
+            self._build_screen(name)
+        return super().get_screen(name)
+
+    def _build_screen(self, name):
+        screen_cls, heavy = self._screen_registry[name]
+        started = time.perf_counter()
+        if isinstance(screen_cls, str):
+            module_name, class_name = screen_cls.split(':')
+            screen_cls = getattr(importlib.import_module(module_name), class_name)
+            self._screen_registry[name] = (screen_cls, heavy)
+        screen = screen_cls(name=name)
+        screen.bind(on_leave=self._on_screen_leave)
+        self.add_widget(screen)
+
+        # Восстанавливаем данные выгруженного экрана без повторной загрузки
+        state = self._screen_state.pop(name, None)
+        if state is not None and hasattr(screen, 'restore_state'):
+            screen.restore_state(state)
+        logger.info(f"Экран {name} создан за {(time.perf_counter() - started) * 1000:.1f} мс")
+
+    def _on_screen_leave(self, screen):
+        self._last_left[screen.name] = time.monotonic()
+        Clock.schedule_once(lambda dt: self.evict_inactive_screens(), 0)
+
+    def evict_inactive_screens(self):
+        """Выгружает неактивные тяжелые экраны, начиная с давно покинутых"""
+        if self.transition.is_active:
+            return
+        candidates = sorted(
+            (screen for screen in self.screens
+             if screen is not self.current_screen
+             and self._screen_registry.get(screen.name, (None, False))[1]),
+            key=lambda screen: self._last_left.get(screen.name, 0)
+        )
+
+        rss = get_rss_mb()
+        while len(candidates) > self.max_inactive_heavy:
+            self._evict_screen(candidates.pop(0), rss)
+
+        # По бюджету - не больше одного экрана за проход и не чаще раза в eviction_cooldown секунд
+        over_budget = self.memory_budget_mb is not None and rss is not None and rss > self.memory_budget_mb
+        now = time.monotonic()
+        if candidates and over_budget and (self._last_budget_eviction is None
+                                           or now - self._last_budget_eviction >= self.eviction_cooldown):
+            self._last_budget_eviction = now
+            self._evict_screen(candidates.pop(0), rss)
+
+    def _evict_screen(self, screen, rss):
+        if hasattr(screen, 'export_state'):
+            self._screen_state[screen.name] = screen.export_state()
+        screen.unbind(on_leave=self._on_screen_leave)
+        self.remove_widget(screen)
+        # Виджеты связаны циклическими ссылками - освобождаем память сразу
+        gc.collect()
+        logger.info(f"Экран {screen.name} выгружен из памяти (RSS до выгрузки: {rss and round(rss)} МБ)")
+
 class EduApp(MDApp):
     """Главное приложение с интеграцией API"""
 
+    # Бюджет памяти для экранов в МБ (переопределяется EDUAPP_SCREEN_MEMORY_MB)
+    screen_memory_budget_mb = float(os.environ.get('EDUAPP_SCREEN_MEMORY_MB', 200))
+
     def __init__(self, **kwargs):
         super().__init__(**kwargs)
         self._current_user = None
         self.api_client = None
+        self.connection_monitor = None
+        self.push_channel = None
+        self._was_offline = False
+        # Токен не удалось проверить при запуске (нет сети) - проверяется при восстановлении связи
+        self._token_unverified = False
+        self.profiler = None
+        self.ui_snapshot = None
+        self.boot = None
+        self.user_statistics = None
+        # Загруженные данные каталога и локальные индексы поиска и фильтров по ним
+        self.catalog = CatalogCache()
+        self.search_index = SearchIndex()
+        self.search_index.attach(self.catalog)
+        self.facets = FacetIndex()
+        self.facets.attach(self.catalog)
+        # Прогресс по курсам пересчитывается локально при завершении глав
+        self.progress = ProgressEngine(self.catalog)
+        self.analytics = None
+        self.resume_index = None
+        self.thumbnails = None
+        self.course_packs = None
+        # Растеризованные абзацы глав переиспользуются между открытиями
+        self.text_textures = TextTextureCache()
+        self.content_pipeline = None
+        # Очередь уведомлений: повторы и всплески ошибок не создают новых виджетов
+        self.notifications = NotificationCenter()
         self.token_storage_path = Path("user_token.json")
 
     def build(self):
@@ -43,57 +194,76 @@ class EduApp(MDApp):
         self.theme_cls.primary_palette = "Blue"
         self.theme_cls.theme_style = "Light"
 
+        # Снимок главного экрана для мгновенной отрисовки при запуске
+        self.ui_snapshot = UISnapshotStore(os.path.join(self.user_data_dir, 'ui_snapshot.json'))
+        # Локальная история тестов и завершения глав для экрана статистики
+        self.analytics = LearningAnalytics(os.path.join(self.user_data_dir, 'analytics.json'))
+        self.analytics.attach(self.progress, self.catalog)
+        # Следующая незавершенная глава и последняя позиция по курсам для «Продолжить»
+        self.resume_index = ResumeIndex(os.path.join(self.user_data_dir, 'resume.json'))
+        self.resume_index.attach(self.progress, self.catalog)
+        # Предобработка текста глав в пуле процессов с кэшем по хэшу содержимого
+        self.content_pipeline = ContentPipeline(os.path.join(self.user_data_dir, 'content_cache'))
+
         # Инициализируем API клиент
         self.init_api_client()
 
-        # Загружаем KV файл
+        # Обложки курсов: LRU текстур в памяти и дисковый кэш уменьшенных изображений
+        if self.api_client:
+            from thumbnails import ThumbnailCache
+            self.thumbnails = ThumbnailCache(self.api_client, os.path.join(self.user_data_dir, 'thumbnails'))
+            # Скачанные курсы: по одному индексированному файлу на курс
+            from course_pack import CoursePackStore
+            self.course_packs = CoursePackStore(self.api_client, os.path.join(self.user_data_dir, 'course_packs'))
+
+        # Критический путь запуска стартует до построения экранов
+        self.start_boot()
+
+        # Загружаем KV файл (разобранные правила кэшируются по хэшу файла)
         try:
-            Builder.load_file('app.kv')
+            load_kv_file('app.kv', os.path.join(self.user_data_dir, 'kv_cache'))
+            startup.mark("kv_loaded")
         except FileNotFoundError:
             logger.error("Файл app.kv не найден!")
             self.show_notification("Ошибка: файл интерфейса не найден")
             return None
 
         # Создаем менеджер экранов
-        sm = EduScreenManager()
+        sm = EduScreenManager(memory_budget_mb=self.screen_memory_budget_mb)
         sm.api_client = self.api_client
 
-        # Добавляем все экраны
-        sm.add_widget(LoginScreen(name='login'))
-        sm.add_widget(MainScreen(name='main_screen'))
-        sm.add_widget(CourseDetailsScreen(name='course_details'))
-        sm.add_widget(ChapterContentScreen(name='course_content'))
-        sm.add_widget(SelfCheckTestScreen(name='selfcheck_test'))
-        sm.add_widget(ControlTestScreen(name='control_test_screen'))
+        # Регистрируем экраны: каждый создается при первом переходе на него,
+        # тяжелые экраны выгружаются, когда неактивны и память на исходе
+        sm.register_screen('login', 'screens:LoginScreen')
+        sm.register_screen('main_screen', 'screens:MainScreen')
+        sm.register_screen('course_details', 'screens:CourseDetailsScreen')
+        sm.register_screen('course_content', 'screens:ChapterContentScreen', heavy=True)
+        sm.register_screen('selfcheck_test', 'screens:SelfCheckTestScreen', heavy=True)
+        sm.register_screen('control_test_screen', 'screens:ControlTestScreen', heavy=True)
+        sm.register_screen('statistics', 'screens:StatisticsScreen')
+        # С сохраненной сессией сразу открываем главный экран со снимком данных,
+        # токен проверяется в фоне и при ошибке возвращает на экран входа
+        sm.current = 'main_screen' if self._current_user else 'login'
+        startup.mark("build_done")
 
         return sm
 
     def run_async_task(self, coro, callback=None):
-        """Безопасный запуск асинхронной задачи"""
-        def run_in_thread():
+        """Безопасный запуск асинхронной задачи в общем event loop"""
+        def on_done(future):
             try:
-                # Создаем новый event loop для каждой задачи
-                loop = asyncio.new_event_loop()
-                asyncio.set_event_loop(loop)
-                
-                # Выполняем корутину
-                result = loop.run_until_complete(coro)
-                
-                # Планируем callback в главном потоке
-                if callback:
-                    Clock.schedule_once(lambda dt: callback(result), 0)
-                
-                # Закрываем loop
-                #loop.close()()
-                
+                result = future.result()
             except Exception as e:
                 logger.error(f"Ошибка в асинхронной задаче: {e}")
-                if callback:
-                    Clock.schedule_once(lambda dt: callback(None), 0)
+                result = None
+
+            # Планируем callback в главном потоке
+            if callback:
+                Clock.schedule_once(lambda dt: callback(result), 0)
 
-        # Запускаем в отдельном потоке
-        thread = threading.Thread(target=run_in_thread, daemon=True)
-        thread.start()
+        future = submit_to_loop(coro)
+        future.add_done_callback(on_done)
+        return future
 
     def init_api_client(self):
         """Инициализация API клиента"""
@@ -101,6 +271,10 @@ class EduApp(MDApp):
             # Базовый URL вашего Django сервера
             base_url = "http://127.0.0.1:8000"  # Замените на ваш URL
             self.api_client = APIClient(base_url)
+            self.connection_monitor = ConnectionMonitor(self.api_client)
+            self.connection_monitor.subscribe(self.on_connection_changed)
+            # События сервера обновляют кэши и списки вместо перезагрузки при входе на экран
+            self.push_channel = PushChannel(self.api_client, self.catalog, self.progress)
 
             # Пытаемся загрузить сохраненный токен
             self.load_saved_token()
@@ -123,32 +297,70 @@ class EduApp(MDApp):
                     self.api_client._refresh_token = token_data.get('refresh_token')
                     self._current_user = token_data['user_info']
 
-                    # Проверяем валидность токена
-                    Clock.schedule_once(self.validate_stored_token, 0.5)
-
         except Exception as e:
             logger.error(f"Ошибка загрузки токена: {e}")
             self.clear_saved_token()
 
-    def validate_stored_token(self, dt):
-        """Проверка валидности сохраненного токена"""
-        async def check_token():
-            try:
-                user_data = await self.api_client.get_current_user()
-                return user_data
-            except Exception as e:
-                logger.error(f"Ошибка проверки токена: {e}")
-                return None
-
-        def handle_result(result):
-            if result:
-                logger.info("Токен валиден, автоматический вход")
+    def start_boot(self):
+        """Одновременный запуск проверки токена, соединения и загрузки данных главного экрана"""
+        if not self.api_client:
+            return
+        api = self.api_client
+        self.boot = BootOrchestrator()
+        if self.connection_monitor:
+            self.boot.add('health', lambda deps: self.connection_monitor.probe())
+
+        if self._current_user:
+            # Данные запрашиваются с сохраненным токеном, не дожидаясь его проверки;
+            # если токен недействителен, пользователь вернется на экран входа
+            self.boot.add('token', lambda deps: in_lane(Lane.INTERACTIVE, api.verify_token()))
+            self.boot.add('courses', lambda deps: in_lane(Lane.INTERACTIVE, api.get_courses()))
+            self.boot.add('control_tests', lambda deps: in_lane(Lane.INTERACTIVE, api.get_control_tests()))
+            self.boot.add('statistics', lambda deps: in_lane(Lane.BACKGROUND, api.get_user_statistics()))
+            self.boot.add('interactive', self._boot_interactive, deps=['token', 'courses', 'control_tests'])
+
+            self.run_prefetched('token', None, self.handle_token_result)
+            self.run_prefetched('statistics', None, self._set_user_statistics)
+
+        self.boot.start()
+
+    async def _boot_interactive(self, deps):
+        """Контрольная точка: данные главного экрана получены и токен проверен"""
+        return bool(deps['token'] and deps['token']['valid'])
+
+    def run_prefetched(self, step, coro_factory, callback, runner=None):
+        """Берет результат шага запуска, если он еще не использован, иначе выполняет запрос.
+
+        runner(coro, callback) позволяет запустить запрос в задачах экрана.
+        """
+        future = self.boot.take(step) if self.boot else None
+        if future is not None:
+            future.add_done_callback(lambda f: Clock.schedule_once(lambda dt: callback(f.result()), 0))
+        elif coro_factory is not None:
+            (runner or self.run_async_task)(coro_factory(), callback)
+
+    def _set_user_statistics(self, statistics):
+        self.user_statistics = statistics
+
+    def handle_token_result(self, result):
+        """Результат проверки сохраненного токена"""
+        valid = result['valid'] if result else None
+        self._token_unverified = valid is None
+        if valid is None:
+            # Без сети сессия и снимок главного экрана сохраняются до ответа сервера
+            logger.info("Токен не проверен: сервер недоступен, работаем с сохраненной сессией")
+            if self._current_user and self.root.current != "main_screen":
                 self.root.current = "main_screen"
-            else:
-                logger.info("Токен недействителен")
-                self.clear_saved_token()
-
-        self.run_async_task(check_token(), handle_result)
+        elif valid:
+            logger.info("Токен валиден, автоматический вход")
+            if self.root.current != "main_screen":
+                self.root.current = "main_screen"
+        else:
+            logger.info("Токен недействителен")
+            self.clear_saved_token()
+            self.ui_snapshot.clear()
+            if self.root.current != "login":
+                self.root.current = "login"
 
     def save_user_token(self, access_token, refresh_token, user_info):
         """Сохранение токена пользователя"""
@@ -177,6 +389,9 @@ class EduApp(MDApp):
                 self.api_client._refresh_token = None
 
             self._current_user = None
+            if self.push_channel:
+                self.push_channel.stop()
+                self.push_channel.reset()
             logger.info("Токен очищен")
         except Exception as e:
             logger.error(f"Ошибка очистки токена: {e}")
@@ -190,6 +405,12 @@ class EduApp(MDApp):
         self._current_user = user
         if hasattr(self.root, 'current_user'):
             self.root.current_user = user
+        if self.push_channel:
+            if user:
+                self.push_channel.start()
+            else:
+                self.push_channel.stop()
+                self.push_channel.reset()
 
     def login_user(self, username, password):
         """Вход пользователя"""
@@ -250,6 +471,15 @@ class EduApp(MDApp):
         
         self.clear_saved_token()
         self.set_current_user(None)
+        self.ui_snapshot.clear()
+        self.catalog.clear()
+        self.analytics.clear()
+        self.resume_index.clear()
+        if self.course_packs:
+            self.course_packs.clear()
+        main_screen = self.root.get_built_screen('main_screen')
+        if main_screen:
+            main_screen.reset_data()
 
         # Очищаем данные в менеджере экранов
         if hasattr(self.root, 'current_course'):
@@ -264,50 +494,106 @@ class EduApp(MDApp):
 
     def show_notification(self, message):
         """Показать уведомление"""
-        try:
-            Snackbar(text=message, duration=3).open()
-        except Exception as e:
-            logger.error(f"Ошибка показа уведомления: {e}")
+        self.notifications.notify(message)
 
     def on_start(self):
         """Выполняется при запуске приложения"""
         logger.info("Приложение запущено")
-        # Проверяем доступность сервера
-        Clock.schedule_once(self.check_server_connection, 1.0)
-
-    def check_server_connection(self, dt):
-        """Проверка подключения к серверу"""
-        async def check_connection():
-            try:
-                response = await self.api_client.client.get(f"{self.api_client.api_base}/health/")
-                return response.status_code == 200
-            except Exception as e:
-                logger.error(f"Ошибка проверки соединения: {e}")
-                return False
-
-        def handle_connection_result(is_connected):
-            if is_connected:
-                logger.info("Соединение с сервером установлено")
-                self.show_notification("Подключение к серверу OK")
-            else:
-                logger.warning("Нет соединения с сервером")
-                self.show_notification("Проблемы с подключением к серверу")
-
-        self.run_async_task(check_connection(), handle_connection_result)
+        # Запускаем фоновый мониторинг доступности сервера
+        if self.connection_monitor:
+            self.connection_monitor.start()
+        if self.push_channel and self._current_user:
+            self.push_channel.start()
+
+        # Профилирование UI включается переменной окружения EDUAPP_PROFILE
+        if os.environ.get('EDUAPP_PROFILE'):
+            from profiler import UIProfiler
+            import screens
+            self.profiler = UIProfiler()
+            self.profiler.install(self, [
+                screens.LoginScreen, screens.MainScreen, screens.CourseDetailsScreen,
+                screens.ChapterContentScreen, screens.SelfCheckTestScreen, screens.ControlTestScreen
+            ])
+
+        if startup.is_enabled():
+            startup.mark("on_start")
+            Clock.schedule_once(self._on_first_frame, 0)
+
+    def _on_first_frame(self, dt):
+        """Первый кадр отрисован - фиксируем время запуска"""
+        startup.mark("first_frame")
+        startup.finish()
+        path = startup.save_report()
+        logger.info(f"Время до первого кадра: {startup.report()['marks_ms'].get('first_frame')} мс, отчет: {path}")
+
+    def on_connection_changed(self, is_online):
+        """Смена состояния подключения к серверу"""
+        if is_online:
+            logger.info("Соединение с сервером установлено")
+            # При первом успешном подключении не беспокоим пользователя
+            if self._was_offline:
+                self.show_notification("Подключение к серверу восстановлено")
+                if self.thumbnails:
+                    self.thumbnails.on_connection_changed(True)
+            if self._token_unverified and self._current_user and self.api_client:
+                self._token_unverified = False
+                self.run_async_task(in_lane(Lane.INTERACTIVE, self.api_client.verify_token()),
+                                    self.handle_token_result)
+        else:
+            logger.warning("Нет соединения с сервером")
+            self.show_notification("Проблемы с подключением к серверу")
+        self._was_offline = not is_online
+
+    def save_ui_snapshot(self):
+        """Сохранение последних данных главного экрана"""
+        main_screen = self.root.get_built_screen('main_screen') if self.root else None
+        if main_screen and self._current_user:
+            courses, tests = main_screen.export_snapshot()
+            self.ui_snapshot.save(self._current_user, courses, tests)
 
     def on_pause(self):
         """Приложение свернуто"""
         logger.info("Приложение свернуто")
+        self.save_ui_snapshot()
+        self.analytics.save()
+        self.resume_index.save()
+        if self.connection_monitor:
+            self.connection_monitor.stop()
+        if self.push_channel:
+            self.push_channel.stop()
         return True
 
     def on_resume(self):
         """Приложение восстановлено"""
         logger.info("Приложение восстановлено")
-        # Проверяем соединение при восстановлении
-        Clock.schedule_once(self.check_server_connection, 0.5)
+        # Возобновляем мониторинг - без свежего трафика проверка выполнится сразу
+        if self.connection_monitor:
+            self.connection_monitor.start()
+        # Пропущенные за время паузы события сервер дошлет по Last-Event-ID
+        if self.push_channel and self._current_user:
+            self.push_channel.start()
 
     def on_stop(self):
         """Выполняется при закрытии приложения"""
+        self.save_ui_snapshot()
+        if self.analytics:
+            self.analytics.save()
+        if self.resume_index:
+            self.resume_index.save()
+        if self.connection_monitor:
+            self.connection_monitor.stop()
+        if self.push_channel:
+            self.push_channel.stop()
+        self.search_index.close()
+        if self.content_pipeline:
+            self.content_pipeline.close()
+        if self.thumbnails:
+            self.thumbnails.close()
+        if self.course_packs:
+            self.course_packs.close()
+        if self.profiler:
+            self.profiler.save(os.environ.get('EDUAPP_PROFILE_OUTPUT', 'ui_profile'))
+            self.profiler.uninstall()
         logger.info("Приложение закрыто")
 
 # Функция запуска приложения с обработкой ошибок
@@ -0,0 +1,135 @@
+# mutations.py - объединение изменяющих запросов (завершение глав, подписки) в пакеты
+import asyncio
+import json
+from typing import Dict, Any, List, Optional, Tuple
+from kivy.logger import Logger
+
+# Ответ отдельного изменения: HTTP статус и тело (None, если тела нет)
+MutationResult = Tuple[int, Any]
+
+class _Mutation:
+    __slots__ = ('key', 'method', 'endpoint', 'body', 'future')
+
+    def __init__(self, key: tuple, method: str, endpoint: str, body: Any, future: asyncio.Future):
+        self.key = key
+        self.method = method
+        self.endpoint = endpoint
+        self.body = body
+        self.future = future
+
+class MutationBatcher:
+    """Копит изменения в течение window секунд и отправляет их одним POST /batch/.
+
+    Каждый вызов submit получает свой результат. Одинаковые изменения, ожидающие
+    отправки, объединяются. Если сервер не поддерживает /batch/, изменения
+    отправляются параллельно по общему пулу соединений.
+    """
+
+    def __init__(self, api_client, window: float = 0.15, max_batch: int = 25, path: str = '/batch/'):
+        self.api_client = api_client
+        self.window = window
+        self.max_batch = max_batch
+        self.path = path
+        self.batch_supported = True
+
+        self.mutations = 0
+        self.coalesced = 0
+        self.requests_sent = 0
+
+        self._queue: List[_Mutation] = []
+        self._pending: Dict[tuple, _Mutation] = {}
+        self._timer: Optional[asyncio.TimerHandle] = None
+
+    async def submit(self, method: str, endpoint: str, body: Any = None) -> MutationResult:
+        """Ставит изменение в очередь и ждет его результат"""
+        self.mutations += 1
+        key = (method, endpoint, json.dumps(body, sort_keys=True))
+        mutation = self._pending.get(key)
+        if mutation is not None:
+            self.coalesced += 1
+        else:
+            loop = asyncio.get_running_loop()
+            mutation = _Mutation(key, method, endpoint, body, loop.create_future())
+            self._pending[key] = mutation
+            self._queue.append(mutation)
+            if len(self._queue) >= self.max_batch:
+                self._flush()
+            elif self._timer is None:
+                self._timer = loop.call_later(self.window, self._flush)
+        return await asyncio.shield(mutation.future)
+
+    async def flush(self):
+        """Немедленная отправка накопленных изменений (например, перед выходом)"""
+        futures = [mutation.future for mutation in self._queue]
+        self._flush()
+        if futures:
+            await asyncio.wait(futures)
+
+    def _flush(self):
+        if self._timer is not None:
+            self._timer.cancel()
+            self._timer = None
+        batch, self._queue = self._queue, []
+        for mutation in batch:
+            self._pending.pop(mutation.key, None)
+        if batch:
+            asyncio.ensure_future(self._send(batch))
+
+    async def _send(self, batch: List[_Mutation]):
+        try:
+            if len(batch) > 1 and self.batch_supported:
+                if await self._send_batch(batch):
+                    return
+            await self._send_pipelined(batch)
+        except Exception as e:
+            for mutation in batch:
+                if not mutation.future.done():
+                    mutation.future.set_exception(e)
+
+    async def _send_batch(self, batch: List[_Mutation]) -> bool:
+        """Один запрос на весь пакет; False - сервер не поддерживает /batch/"""
+        payload = {"requests": [{"id": index, "method": mutation.method, "path": mutation.endpoint,
+                                 "body": mutation.body} for index, mutation in enumerate(batch)]}
+        self.requests_sent += 1
+        response = await self.api_client._make_request('POST', self.path, json=payload)
+        if response.status_code in (404, 405, 501):
+            Logger.info("MutationBatcher: сервер не поддерживает пакетные запросы, отправка по одному")
+            self.batch_supported = False
+            return False
+        if response.status_code != 200:
+            for mutation in batch:
+                mutation.future.set_result((response.status_code, None))
+            return True
+        results = {item.get('id'): item for item in response.json().get('responses', [])}
+        for index, mutation in enumerate(batch):
+            item = results.get(index)
+            # Изменение без ответа считается неудачным, как ответ сервера с ошибкой
+            mutation.future.set_result((item.get('status', 500), item.get('body')) if item else (500, None))
+        return True
+
+    async def _send_pipelined(self, batch: List[_Mutation]):
+        """Отправка параллельно по уже открытым соединениям пула"""
+        async def send(mutation: _Mutation):
+            self.requests_sent += 1
+            kwargs = {'json': mutation.body} if mutation.body is not None else {}
+            try:
+                response = await self.api_client._make_request(mutation.method, mutation.endpoint, **kwargs)
+            except Exception as e:
+                mutation.future.set_exception(e)
+                return
+            try:
+                body = response.json() if response.content else None
+            except ValueError:
+                body = None
+            mutation.future.set_result((response.status_code, body))
+
+        await asyncio.gather(*(send(mutation) for mutation in batch))
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            "mutations": self.mutations,
+            "coalesced": self.coalesced,
+            "requests": self.requests_sent,
+            "queued": len(self._queue),
+            "batch_supported": self.batch_supported,
+        }
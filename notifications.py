@@ -0,0 +1,162 @@
+# notifications.py - переиспользуемые диалоги и снекбары с очередью уведомлений
+import time
+from collections import deque
+from typing import Dict, Any, Optional
+from kivy.clock import Clock
+
+class NotificationCenter:
+    """Очередь уведомлений с одним переиспользуемым снекбаром и пулом диалогов.
+
+    Одинаковые сообщения в пределах dedupe_window показываются один раз, между
+    снекбарами выдерживается min_interval, а очередь ограничена max_queue -
+    при всплеске ошибок лишние сообщения отбрасываются без создания виджетов.
+    Диалоги создаются по одному на вид (ошибка, успех) и открываются повторно.
+    """
+
+    def __init__(self, min_interval: float = 0.8, max_queue: int = 5, dedupe_window: float = 10.0,
+                 max_pending_dialogs: int = 3):
+        self.min_interval = min_interval
+        self.max_queue = max_queue
+        self.dedupe_window = dedupe_window
+        self.max_pending_dialogs = max_pending_dialogs
+
+        self._queue: deque = deque()
+        self._recent: Dict[str, float] = {}
+        self._snackbar = None
+        self._showing: Optional[str] = None
+        self._shown_seq = 0
+        self._last_shown = 0.0
+        self._pump_event = None
+
+        self._dialogs: Dict[str, Any] = {}
+        self._open_dialog: Optional[str] = None
+        self._pending_dialogs: deque = deque()
+
+        self.stats = {"shown": 0, "duplicates": 0, "dropped": 0, "dialogs": 0, "dialogs_created": 0}
+
+    # --- Снекбары ---
+
+    def notify(self, text: str, duration: float = 3):
+        """Ставит сообщение в очередь (можно вызывать из любого потока)"""
+        Clock.schedule_once(lambda dt: self._enqueue(text, duration), 0)
+
+    def _enqueue(self, text: str, duration: float):
+        now = time.monotonic()
+        recent = self._recent.get(text)
+        if (text == self._showing or any(item[0] == text for item in self._queue)
+                or (recent is not None and now - recent < self.dedupe_window)):
+            self.stats["duplicates"] += 1
+            return
+        if len(self._queue) >= self.max_queue:
+            # Старые сообщения теряют актуальность первыми
+            self._queue.popleft()
+            self.stats["dropped"] += 1
+        self._queue.append((text, duration))
+        self._schedule_pump()
+
+    def _schedule_pump(self, delay: float = 0):
+        if self._pump_event is None:
+            self._pump_event = Clock.schedule_once(self._pump, delay)
+
+    def _pump(self, dt):
+        self._pump_event = None
+        if self._showing is not None or not self._queue:
+            return
+        wait = self._last_shown + self.min_interval - time.monotonic()
+        if wait > 0:
+            self._schedule_pump(wait)
+            return
+
+        snackbar = self._get_snackbar()
+        if snackbar.parent is not None:
+            # Предыдущий снекбар еще не убран из окна - повторный open() сломает виджет
+            self._schedule_pump(0.25)
+            return
+        text, duration = self._queue.popleft()
+        snackbar.text = text
+        snackbar.duration = duration
+        self._showing = text
+        self._shown_seq += 1
+        seq = self._shown_seq
+        self._last_shown = time.monotonic()
+        self._recent[text] = self._last_shown
+        self._prune_recent()
+        self.stats["shown"] += 1
+        snackbar.open()
+        # Страховка на случай, если событие закрытия не придет
+        Clock.schedule_once(lambda dt: self._on_snackbar_timeout(seq), duration + 1)
+
+    def _get_snackbar(self):
+        if self._snackbar is None:
+            from kivymd.uix.snackbar import Snackbar
+            self._snackbar = Snackbar(text="", duration=3)
+            self._snackbar.bind(on_dismiss=lambda *args: self._on_snackbar_dismiss(self._shown_seq))
+        return self._snackbar
+
+    def _on_snackbar_timeout(self, seq: int):
+        if seq != self._shown_seq or self._showing is None:
+            return
+        snackbar = self._snackbar
+        if snackbar is not None and snackbar.parent is not None:
+            # Закрытие затянулось: просим закрыть и проверяем снова, не освобождая очередь
+            snackbar.dismiss()
+            Clock.schedule_once(lambda dt: self._on_snackbar_timeout(seq), 0.5)
+            return
+        self._on_snackbar_dismiss(seq)
+
+    def _on_snackbar_dismiss(self, seq: int):
+        if self._showing is None or seq != self._shown_seq:
+            return
+        self._showing = None
+        self._schedule_pump()
+
+    def _prune_recent(self):
+        now = time.monotonic()
+        for text in [text for text, shown in self._recent.items() if now - shown >= self.dedupe_window]:
+            del self._recent[text]
+
+    # --- Диалоги ---
+
+    def show_dialog(self, kind: str, title: str, text: str):
+        """Открывает диалог вида kind; пока он открыт, новые сообщения ждут в очереди"""
+        Clock.schedule_once(lambda dt: self._enqueue_dialog(kind, title, text), 0)
+
+    def _enqueue_dialog(self, kind: str, title: str, text: str):
+        message = (kind, title, text)
+        if self._open_dialog is not None:
+            current = self._dialogs[self._open_dialog]
+            if (current.title, current.text) == (title, text) or message in self._pending_dialogs:
+                self.stats["duplicates"] += 1
+                return
+            if len(self._pending_dialogs) >= self.max_pending_dialogs:
+                self.stats["dropped"] += 1
+                return
+            self._pending_dialogs.append(message)
+            return
+        self._open(*message)
+
+    def _open(self, kind: str, title: str, text: str):
+        dialog = self._dialogs.get(kind)
+        if dialog is None:
+            from kivymd.uix.button import MDFlatButton
+            from kivymd.uix.dialog import MDDialog
+            dialog = MDDialog(
+                title=title,
+                text=text,
+                buttons=[MDFlatButton(text="OK", on_release=lambda x: dialog.dismiss())]
+            )
+            dialog.bind(on_dismiss=lambda *args: self._on_dialog_dismiss())
+            self._dialogs[kind] = dialog
+            self.stats["dialogs_created"] += 1
+        else:
+            dialog.title = title
+            dialog.text = text
+        self._open_dialog = kind
+        self.stats["dialogs"] += 1
+        dialog.open()
+
+    def _on_dialog_dismiss(self):
+        self._open_dialog = None
+        if self._pending_dialogs:
+            message = self._pending_dialogs.popleft()
+            Clock.schedule_once(lambda dt: self._open(*message), 0)
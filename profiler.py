@@ -0,0 +1,201 @@
+# profiler.py
+import json
+import time
+from collections import defaultdict
+from functools import wraps
+from typing import Optional, Dict, Any, List, Iterable
+from kivy.clock import Clock
+from kivy.logger import Logger
+
+# Модули приложения, чьи Clock-колбэки оборачиваются профилировщиком.
+# Колбэки KivyMD/Kivy не трогаем, чтобы не ломать Clock.unschedule для них.
+APP_MODULES = {'main', 'screens', '__main__'}
+
+# Методы экранов, которые замеряются по умолчанию
+SCREEN_METHOD_PREFIXES = ('_update_', 'load_', 'on_pre_enter', 'on_enter', 'on_leave', 'on_pre_leave')
+
+class UIProfiler:
+    """Профилировщик длительности колбэков главного потока и кадров сверх бюджета"""
+
+    def __init__(self, frame_budget: float = 1 / 60.0, max_stalls: int = 1000):
+        self.frame_budget = frame_budget
+        self.max_stalls = max_stalls
+        self.installed = False
+
+        self.frames = 0
+        self.stalls: List[Dict[str, Any]] = []
+        self.transitions: List[Dict[str, Any]] = []
+        self.callback_stats: Dict[str, Dict[str, float]] = defaultdict(
+            lambda: {"calls": 0, "total_ms": 0.0, "max_ms": 0.0})
+        self.folded: Dict[str, float] = defaultdict(float)
+
+        self._stack: List[List[Any]] = []
+        self._frame_spans: List[Dict[str, Any]] = []
+        self._last_frame: Optional[float] = None
+        self._frame_event = None
+        self._original_schedule_once = None
+        self._patched: List[tuple] = []
+        self._manager = None
+        self._transition_started: Optional[float] = None
+        self._transition_target: Optional[str] = None
+
+    # Установка и снятие хуков
+    def install(self, app, screen_classes: Iterable[type] = ()):
+        """Подключает профилировщик к Clock, экранам и менеджеру экранов"""
+        if self.installed:
+            return
+        self.installed = True
+
+        self._original_schedule_once = Clock.schedule_once
+        Clock.schedule_once = self._schedule_once
+
+        for cls in screen_classes:
+            self.instrument(cls)
+
+        self._manager = app.root
+        if self._manager is not None:
+            self._manager.bind(current=self._on_screen_change)
+            self._manager.transition.bind(on_complete=self._on_transition_complete)
+
+        self._last_frame = time.perf_counter()
+        self._frame_event = Clock.schedule_interval(self._on_frame, 0)
+        Logger.info("UIProfiler: профилирование включено")
+
+    def uninstall(self):
+        """Снимает все хуки"""
+        if not self.installed:
+            return
+        self.installed = False
+        Clock.schedule_once = self._original_schedule_once
+        for cls, name, original in self._patched:
+            setattr(cls, name, original)
+        self._patched.clear()
+        if self._frame_event is not None:
+            self._frame_event.cancel()
+        if self._manager is not None:
+            self._manager.unbind(current=self._on_screen_change)
+            self._manager.transition.unbind(on_complete=self._on_transition_complete)
+
+    def instrument(self, cls: type, method_names: Optional[Iterable[str]] = None):
+        """Оборачивает методы класса экрана для замера длительности"""
+        if method_names is None:
+            method_names = [name for name in vars(cls)
+                            if name.startswith(SCREEN_METHOD_PREFIXES) and callable(vars(cls)[name])]
+        for name in method_names:
+            original = vars(cls).get(name)
+            if original is None:
+                continue
+            setattr(cls, name, self._wrap(original, f"{cls.__name__}.{name}"))
+            self._patched.append((cls, name, original))
+
+    # Замеры
+    def _wrap(self, func, label: str):
+        profiler = self
+
+        @wraps(func)
+        def wrapper(*args, **kwargs):
+            profiler._enter(label)
+            try:
+                return func(*args, **kwargs)
+            finally:
+                profiler._exit()
+        return wrapper
+
+    def _schedule_once(self, callback, timeout=0):
+        if getattr(callback, '__module__', None) in APP_MODULES:
+            callback = self._wrap(callback, f"Clock:{callback.__qualname__}")
+        return self._original_schedule_once(callback, timeout)
+
+    def _enter(self, label: str):
+        # [метка, время начала, время дочерних вызовов]
+        self._stack.append([label, time.perf_counter(), 0.0])
+
+    def _exit(self):
+        label, started, children = self._stack.pop()
+        duration = time.perf_counter() - started
+        path = ";".join([self._screen_name()] + [frame[0] for frame in self._stack] + [label])
+        self.folded[path] += max(duration - children, 0) * 1e6
+
+        duration_ms = duration * 1000
+        stats = self.callback_stats[label]
+        stats["calls"] += 1
+        stats["total_ms"] += duration_ms
+        stats["max_ms"] = max(stats["max_ms"], duration_ms)
+
+        if self._stack:
+            self._stack[-1][2] += duration
+        else:
+            self._frame_spans.append({"label": label, "ms": round(duration_ms, 3)})
+
+    def _screen_name(self) -> str:
+        if self._manager is not None and self._manager.current:
+            return self._manager.current
+        return "<none>"
+
+    def _on_frame(self, dt):
+        now = time.perf_counter()
+        frame_time = now - self._last_frame
+        self._last_frame = now
+        self.frames += 1
+
+        if frame_time > self.frame_budget and len(self.stalls) < self.max_stalls:
+            culprit = max(self._frame_spans, key=lambda span: span["ms"], default=None)
+            self.stalls.append({
+                "frame": self.frames,
+                "frame_ms": round(frame_time * 1000, 3),
+                "over_budget_ms": round((frame_time - self.frame_budget) * 1000, 3),
+                "screen": self._screen_name(),
+                "culprit": culprit["label"] if culprit else None,
+                "spans": self._frame_spans,
+            })
+        self._frame_spans = []
+
+    def _on_screen_change(self, manager, name):
+        self._transition_started = time.perf_counter()
+        self._transition_target = name
+
+    def _on_transition_complete(self, transition):
+        if self._transition_started is None:
+            return
+        self.transitions.append({
+            "screen": self._transition_target,
+            "ms": round((time.perf_counter() - self._transition_started) * 1000, 3),
+        })
+        self._transition_started = None
+
+    # Отчеты
+    def report(self) -> Dict[str, Any]:
+        """Сводный отчет, пригодный для сравнения между сборками"""
+        stalls_by_culprit: Dict[str, int] = defaultdict(int)
+        for stall in self.stalls:
+            stalls_by_culprit[stall["culprit"] or "<unattributed>"] += 1
+
+        return {
+            "frame_budget_ms": round(self.frame_budget * 1000, 3),
+            "frames": self.frames,
+            "stalled_frames": len(self.stalls),
+            "stalls_by_culprit": dict(sorted(stalls_by_culprit.items(), key=lambda item: -item[1])),
+            "callbacks": {
+                label: {
+                    "calls": stats["calls"],
+                    "total_ms": round(stats["total_ms"], 3),
+                    "mean_ms": round(stats["total_ms"] / stats["calls"], 3),
+                    "max_ms": round(stats["max_ms"], 3),
+                }
+                for label, stats in sorted(self.callback_stats.items(), key=lambda item: -item[1]["total_ms"])
+            },
+            "transitions": self.transitions,
+            "stalls": self.stalls,
+        }
+
+    def folded_stacks(self) -> str:
+        """Стеки в формате folded (flamegraph.pl, speedscope), вес в микросекундах"""
+        return "\n".join(f"{path} {int(weight)}" for path, weight in sorted(self.folded.items()) if weight >= 1)
+
+    def save(self, prefix: str = "ui_profile"):
+        """Сохраняет отчет в <prefix>.json и стеки в <prefix>.folded"""
+        with open(f"{prefix}.json", 'w', encoding='utf-8') as f:
+            json.dump(self.report(), f, ensure_ascii=False, indent=2)
+        with open(f"{prefix}.folded", 'w', encoding='utf-8') as f:
+            f.write(self.folded_stacks())
+        Logger.info(f"UIProfiler: отчет сохранен в {prefix}.json / {prefix}.folded")
@@ -0,0 +1,142 @@
+# progress.py - локальный подсчет прогресса по курсам без повторной загрузки с сервера
+import weakref
+from typing import Callable, Dict, Any, Iterable, List, Optional, Set
+import catalog
+
+class CourseProgress:
+    """Счетчики прогресса одного курса (аналог CourseSubscription + ChapterProgress/TaskProgress)"""
+    __slots__ = ('course_id', 'total_chapters', 'completed_chapters', 'server_percentage')
+
+    def __init__(self, course_id: int):
+        self.course_id = course_id
+        self.total_chapters = 0
+        self.completed_chapters: Set[int] = set()
+        # Процент с сервера используется, пока главы курса не загружены
+        self.server_percentage: Optional[float] = None
+
+    @property
+    def percentage(self) -> float:
+        if not self.total_chapters:
+            return self.server_percentage or 0.0
+        return 100.0 * len(self.completed_chapters) / self.total_chapters
+
+    def to_dict(self) -> Dict[str, Any]:
+        return {
+            'course_id': self.course_id,
+            'percentage': self.percentage,
+            'completed_chapters': len(self.completed_chapters),
+            'total_chapters': self.total_chapters,
+        }
+
+class ProgressEngine:
+    """Счетчики прогресса по курсам, обновляемые за O(1) при завершении главы или задания.
+
+    Начальные значения берутся из CatalogCache (прогресс курсов и статусы глав).
+    Подписчики вызываются в главном потоке; методы экранов хранятся по слабым
+    ссылкам, чтобы выгруженные экраны не удерживались в памяти.
+    """
+
+    def __init__(self, catalog_cache: Optional['catalog.CatalogCache'] = None):
+        self.courses: Dict[int, CourseProgress] = {}
+        self.chapter_course: Dict[int, int] = {}
+        self._listeners: List[Any] = []
+        self._catalog = None
+        if catalog_cache is not None:
+            self.attach(catalog_cache)
+
+    def attach(self, catalog_cache: 'catalog.CatalogCache'):
+        self._catalog = catalog_cache
+        catalog_cache.subscribe(self._on_catalog_change)
+        self.seed_courses(catalog_cache.courses.values())
+        for course_id in list(catalog_cache.course_chapters):
+            self.load_chapters(course_id, catalog_cache.get_chapters(course_id) or [])
+
+    def subscribe(self, listener: Callable[[Dict[str, Any]], None]):
+        """listener(event): event содержит kind ('chapter' или 'course'), course_id, chapter_id и счетчики курса"""
+        ref = weakref.WeakMethod(listener) if hasattr(listener, '__self__') else (lambda: listener)
+        self._listeners.append(ref)
+
+    def unsubscribe(self, listener: Callable[[Dict[str, Any]], None]):
+        self._listeners = [ref for ref in self._listeners if ref() not in (None, listener)]
+
+    def _emit(self, progress: CourseProgress, kind: str, chapter_id: Optional[int] = None):
+        # Сначала обновляем кэш каталога, чтобы индексы фильтров увидели новый прогресс
+        if self._catalog is not None:
+            self._catalog.update_course(progress.course_id, progress_percentage=progress.percentage)
+        event = {**progress.to_dict(), 'kind': kind, 'chapter_id': chapter_id}
+        alive = []
+        for ref in self._listeners:
+            listener = ref()
+            if listener is None:
+                continue
+            alive.append(ref)
+            listener(event)
+        self._listeners = alive
+
+    def _on_catalog_change(self, kind: str, items: List[Any]):
+        if kind == catalog.COURSES:
+            self.seed_courses(items)
+        elif kind == catalog.COURSES_REMOVED:
+            removed = set(items)
+            for course_id in removed:
+                self.courses.pop(course_id, None)
+            self.chapter_course = {chapter_id: course_id for chapter_id, course_id in self.chapter_course.items()
+                                   if course_id not in removed}
+        elif kind == catalog.CHAPTERS and self._catalog is not None:
+            for course_id in {chapter['course_id'] for chapter in items}:
+                self.load_chapters(course_id, self._catalog.get_chapters(course_id) or [])
+
+    def _course(self, course_id: int) -> CourseProgress:
+        progress = self.courses.get(course_id)
+        if progress is None:
+            progress = self.courses[course_id] = CourseProgress(course_id)
+        return progress
+
+    def seed_courses(self, courses: Iterable[Dict[str, Any]]):
+        """Прогресс курсов из списка каталога"""
+        for course in courses:
+            if course.get('progress_percentage') is not None:
+                self._course(course['id']).server_percentage = course['progress_percentage']
+
+    def update_server_progress(self, course_id: int, percentage: float):
+        """Процент курса, присланный сервером (учитывается, пока главы курса не загружены)"""
+        progress = self._course(course_id)
+        if progress.server_percentage == percentage:
+            return
+        progress.server_percentage = percentage
+        if not progress.total_chapters:
+            self._emit(progress, 'course')
+
+    def load_chapters(self, course_id: int, chapters: List[Dict[str, Any]]):
+        """Счетчики курса по полному списку его глав"""
+        progress = self._course(course_id)
+        progress.total_chapters = len(chapters)
+        progress.completed_chapters = {chapter['id'] for chapter in chapters if chapter.get('is_completed')}
+        for chapter in chapters:
+            self.chapter_course[chapter['id']] = course_id
+
+    def complete_chapter(self, chapter_id: int, course_id: Optional[int] = None) -> Optional[Dict[str, Any]]:
+        """Отмечает главу завершенной и оповещает подписчиков"""
+        course_id = self.chapter_course.get(chapter_id, course_id)
+        if course_id is None:
+            return None
+        self.chapter_course[chapter_id] = course_id
+        progress = self._course(course_id)
+        if chapter_id in progress.completed_chapters:
+            return progress.to_dict()
+        # Пока главы курса не загружены, процент остается серверным
+        progress.completed_chapters.add(chapter_id)
+        self._emit(progress, 'chapter', chapter_id)
+        return progress.to_dict()
+
+    def is_chapter_completed(self, chapter_id: int) -> bool:
+        progress = self.courses.get(self.chapter_course.get(chapter_id))
+        return progress is not None and chapter_id in progress.completed_chapters
+
+    def percentage(self, course_id: int) -> Optional[float]:
+        progress = self.courses.get(course_id)
+        return progress.percentage if progress else None
+
+    def clear(self):
+        self.courses.clear()
+        self.chapter_course.clear()
@@ -0,0 +1,196 @@
+# push_channel.py - события сервера (SSE): изменения курсов, прогресса и контрольных тестов
+import asyncio
+import json
+import random
+import weakref
+from typing import Callable, Dict, Any, List, Optional
+import httpx
+from kivy.clock import Clock
+from kivy.logger import Logger
+from async_helper import get_shared_loop
+
+class PushChannel:
+    """Подписка на поток событий сервера (Server-Sent Events) в общем event loop.
+
+    При обрыве соединение восстанавливается с экспоненциальной задержкой и
+    заголовком Last-Event-ID, чтобы сервер дослал пропущенные события. События
+    применяются к CatalogCache и ProgressEngine в главном потоке, после чего
+    передаются подписчикам экранов. Событие reset означает, что пропущенные
+    события досылать нечем и данные нужно загрузить заново.
+    """
+
+    def __init__(self, api_client, catalog_cache=None, progress_engine=None, path: str = '/events/',
+                 min_backoff: float = 1.0, max_backoff: float = 60.0, idle_timeout: float = 60.0):
+        self.api_client = api_client
+        self.catalog = catalog_cache
+        self.progress = progress_engine
+        self.path = path
+        self.min_backoff = min_backoff
+        self.max_backoff = max_backoff
+        self.idle_timeout = idle_timeout
+
+        self.connected = False
+        self.last_event_id: Optional[str] = None
+        self.events_received = 0
+        self.reconnects = 0
+
+        self._backoff = min_backoff
+        self._server_retry: Optional[float] = None
+        self._listeners: List[Any] = []
+        self._loop: Optional[asyncio.AbstractEventLoop] = None
+        self._task: Optional[asyncio.Task] = None
+        self._started = False
+
+    def subscribe(self, listener: Callable[[str, Any], None]):
+        """listener(event, data) вызывается в главном потоке после применения события к кэшам"""
+        ref = weakref.WeakMethod(listener) if hasattr(listener, '__self__') else (lambda: listener)
+        self._listeners.append(ref)
+
+    def unsubscribe(self, listener: Callable[[str, Any], None]):
+        self._listeners = [ref for ref in self._listeners if ref() not in (None, listener)]
+
+    def start(self):
+        """Подключение к потоку событий (повторный вызов ничего не делает)"""
+        if self._started:
+            return
+        self._started = True
+        self._loop = get_shared_loop()
+        self._loop.call_soon_threadsafe(self._start_task)
+
+    def stop(self):
+        """Отключение от потока событий"""
+        if not self._started:
+            return
+        self._started = False
+        self.connected = False
+        self._loop.call_soon_threadsafe(self._cancel_task)
+
+    def reset(self):
+        """Забыть позицию в потоке (при смене пользователя)"""
+        self.last_event_id = None
+
+    def _start_task(self):
+        self._task = asyncio.ensure_future(self._run())
+
+    def _cancel_task(self):
+        if self._task is not None:
+            self._task.cancel()
+            self._task = None
+
+    # --- Поток событий ---
+
+    async def _run(self):
+        """Переподключение с экспоненциальной задержкой и случайным разбросом"""
+        try:
+            while True:
+                try:
+                    await self._listen()
+                    Logger.info("PushChannel: сервер закрыл поток событий")
+                except httpx.HTTPError as e:
+                    Logger.warning(f"PushChannel: соединение потеряно: {e}")
+                except Exception as e:
+                    Logger.warning(f"PushChannel: ошибка потока событий: {e}")
+                self.connected = False
+                # Разброс не дает всем клиентам переподключиться одновременно после сбоя сервера
+                delay = max(self._server_retry or 0.0, self._backoff * random.uniform(0.5, 1.0))
+                self._backoff = min(self._backoff * 2, self.max_backoff)
+                self.reconnects += 1
+                await asyncio.sleep(delay)
+        except asyncio.CancelledError:
+            self.connected = False
+            raise
+
+    async def _listen(self):
+        api = self.api_client
+        headers = {**api._get_auth_headers(), 'Accept': 'text/event-stream', 'Cache-Control': 'no-cache'}
+        if self.last_event_id is not None:
+            headers['Last-Event-ID'] = self.last_event_id
+        # Поток долгоживущий, поэтому он не занимает слот планировщика запросов
+        timeout = httpx.Timeout(10.0, read=self.idle_timeout)
+        async with api.client.stream('GET', f"{api.api_base}{self.path}", headers=headers,
+                                     timeout=timeout) as response:
+            if response.status_code == 401:
+                await api._refresh_access_token()
+                raise RuntimeError("токен недействителен")
+            if response.status_code != 200:
+                raise RuntimeError(f"HTTP {response.status_code}")
+
+            self.connected = True
+            self._backoff = self.min_backoff
+            api._notify_traffic(True)
+            event, data, event_id = 'message', [], None
+            async for line in response.aiter_lines():
+                if not line:
+                    if data:
+                        self._dispatch(event, '\n'.join(data), event_id)
+                    event, data, event_id = 'message', [], None
+                    continue
+                if line.startswith(':'):
+                    # Комментарий-пинг: соединение живо
+                    api._notify_traffic(True)
+                    continue
+                field, _, value = line.partition(':')
+                value = value[1:] if value.startswith(' ') else value
+                if field == 'event':
+                    event = value
+                elif field == 'data':
+                    data.append(value)
+                elif field == 'id':
+                    event_id = value
+                elif field == 'retry' and value.isdigit():
+                    self._server_retry = int(value) / 1000
+
+    def _dispatch(self, event: str, raw: str, event_id: Optional[str]):
+        if event_id is not None:
+            self.last_event_id = event_id
+        self.events_received += 1
+        self.api_client._notify_traffic(True)
+        try:
+            data = json.loads(raw)
+        except ValueError:
+            Logger.warning(f"PushChannel: некорректные данные события {event}")
+            return
+        Clock.schedule_once(lambda dt: self._apply(event, data), 0)
+
+    # --- Главный поток ---
+
+    def _apply(self, event: str, data: Any):
+        """Обновление локальных кэшей по событию сервера"""
+        catalog, progress = self.catalog, self.progress
+        # Колбэк Clock: исключение из-за некорректного события остановило бы главный цикл
+        try:
+            if event == 'course' and catalog is not None:
+                if 'id' not in data:
+                    raise KeyError('id')
+                catalog.put_courses([data], complete=False)
+            elif event == 'course_removed' and catalog is not None:
+                catalog.remove_courses([data['id']])
+            elif event == 'chapters' and catalog is not None:
+                catalog.put_chapters(data['course_id'], list(data['chapters']))
+            elif event == 'progress' and progress is not None:
+                progress.update_server_progress(data['course_id'], float(data['progress_percentage']))
+            elif event == 'chapter_completed' and progress is not None:
+                progress.complete_chapter(data['chapter_id'], data.get('course_id'))
+        except (KeyError, TypeError, ValueError, AttributeError) as e:
+            Logger.warning(f"PushChannel: пропущено некорректное событие {event}: {e!r}")
+            return
+
+        alive = []
+        for ref in self._listeners:
+            listener = ref()
+            if listener is None:
+                continue
+            alive.append(ref)
+            try:
+                listener(event, data)
+            except Exception as e:
+                Logger.warning(f"PushChannel: ошибка обработчика события {event}: {e}")
+        self._listeners = alive
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            "connected": self.connected,
+            "last_event_id": self.last_event_id,
+            "events": self.events_received,
+            "reconnects": self.reconnects,
+        }
@@ -0,0 +1,215 @@
+# rate_limit.py - ограничение частоты запросов по группам эндпоинтов (token bucket)
+import asyncio
+import heapq
+import itertools
+import time
+from email.utils import parsedate_to_datetime
+from typing import Dict, Any, List, Optional, Tuple
+from scheduler import Lane
+
+# Группы эндпоинтов по первому сегменту пути; остальные пути идут в default
+GROUPS = ('auth', 'courses', 'chapters', 'tests', 'progress', 'media', 'batch', 'default')
+
+# (запросов в секунду, размер всплеска) после 429 без заголовков квоты
+FALLBACK_LIMIT: Tuple[float, int] = (10.0, 20)
+
+# Ниже этой частоты подстройка под заголовки сервера не опускается
+MIN_RATE = 0.2
+
+def parse_retry_after(value: Optional[str]) -> Optional[float]:
+    """Retry-After в секундах: число или HTTP дата"""
+    if not value:
+        return None
+    try:
+        return max(float(value), 0.0)
+    except ValueError:
+        pass
+    try:
+        return max(parsedate_to_datetime(value).timestamp() - time.time(), 0.0)
+    except (TypeError, ValueError):
+        return None
+
+def parse_reset(value: Optional[str]) -> Optional[float]:
+    """X-RateLimit-Reset: секунды до сброса или unix время сброса"""
+    try:
+        reset = float(value)
+    except (TypeError, ValueError):
+        return None
+    return max(reset - time.time(), 0.0) if reset > 1e9 else max(reset, 0.0)
+
+class TokenBucket:
+    """Токены пополняются со скоростью rate до capacity; запрос забирает один токен.
+
+    Ожидающие запросы не отбрасываются, а стоят в очереди по приоритету полосы,
+    поэтому при исчерпании токенов интерактивные запросы получают их первыми.
+    """
+
+    def __init__(self, rate: float, capacity: int):
+        self.configured_rate = rate
+        self.rate = rate
+        self.capacity = capacity
+        self.tokens = float(capacity)
+        self.blocked_until = 0.0
+        self.throttled = 0
+        self.waited = 0.0
+        self._updated = time.monotonic()
+        self._queue: List[tuple] = []
+        self._counter = itertools.count()
+        self._timer: Optional[asyncio.TimerHandle] = None
+
+    def _take(self) -> bool:
+        now = time.monotonic()
+        self.tokens = min(self.capacity, self.tokens + (now - self._updated) * self.rate)
+        self._updated = now
+        if now < self.blocked_until or self.tokens < 1:
+            return False
+        self.tokens -= 1
+        return True
+
+    async def acquire(self, lane: Lane = Lane.NORMAL) -> float:
+        """Ожидание токена; возвращает время ожидания в секундах"""
+        if not self._queue and self._take():
+            return 0.0
+        started = time.monotonic()
+        self.throttled += 1
+        future = asyncio.get_running_loop().create_future()
+        heapq.heappush(self._queue, (int(lane), next(self._counter), future))
+        self._dispatch()
+        try:
+            await future
+        except asyncio.CancelledError:
+            if future.done() and not future.cancelled():
+                # Токен уже выдан, но запрос отменен - возвращаем его
+                self.tokens = min(self.capacity, self.tokens + 1)
+            raise
+        waited = time.monotonic() - started
+        self.waited += waited
+        return waited
+
+    def _dispatch(self):
+        if self._timer is not None:
+            self._timer.cancel()
+            self._timer = None
+        while self._queue:
+            future = self._queue[0][2]
+            if future.done():
+                heapq.heappop(self._queue)
+                continue
+            if not self._take():
+                break
+            heapq.heappop(self._queue)
+            future.set_result(None)
+        if self._queue:
+            delay = max(self.blocked_until - time.monotonic(), (1 - self.tokens) / self.rate, 0.001)
+            self._timer = asyncio.get_running_loop().call_later(delay, self._dispatch)
+
+    def is_blocked(self) -> bool:
+        return time.monotonic() < self.blocked_until
+
+    def block(self, seconds: float):
+        """Пауза по требованию сервера (Retry-After или исчерпанная квота)"""
+        self.blocked_until = max(self.blocked_until, time.monotonic() + seconds)
+        self.tokens = 0.0
+        if self._queue:
+            self._dispatch()
+
+    def apply_quota(self, remaining: int, reset: Optional[float]):
+        """Не тратить больше, чем осталось в окне сервера, и растянуть остаток до сброса"""
+        self.tokens = min(self.tokens, float(remaining))
+        if remaining <= 0 and reset:
+            # После сброса окна квота восстанавливается полностью
+            self.rate = self.configured_rate
+            self.block(reset)
+        elif reset:
+            self.rate = min(self.configured_rate, max(remaining / reset, MIN_RATE))
+        else:
+            self.rate = self.configured_rate
+
+    def queue_depth(self) -> int:
+        return sum(1 for _, _, future in self._queue if not future.done())
+
+class RateLimiter:
+    """Token bucket на группу эндпоинтов по заголовкам квоты и ответам 429.
+
+    Пока сервер не сообщил квоту (X-RateLimit-*) и не ответил 429, группа не
+    ограничивается: bucket создается по первому такому ответу. limits задает
+    собственные ограничения клиента для групп - они действуют с первого запроса.
+    """
+
+    def __init__(self, limits: Optional[Dict[str, Tuple[float, int]]] = None, max_retries: int = 3,
+                 retry_delay: float = 1.0, max_retry_after: float = 60.0):
+        self.limits = dict(limits or {})
+        self.max_retries = max_retries
+        self.retry_delay = retry_delay
+        self.max_retry_after = max_retry_after
+        self.responses_429 = 0
+        self._buckets: Dict[str, TokenBucket] = {}
+
+    def group_for(self, endpoint: str) -> str:
+        """Группа по первому сегменту пути (/courses/1/ -> courses)"""
+        segment = endpoint.lstrip('/').split('/', 1)[0]
+        return segment if segment in GROUPS or segment in self.limits else 'default'
+
+    def bucket(self, group: str) -> TokenBucket:
+        bucket = self._buckets.get(group)
+        if bucket is None:
+            bucket = self._buckets[group] = TokenBucket(*self.limits.get(group, FALLBACK_LIMIT))
+        return bucket
+
+    def _quota_bucket(self, group: str, limit: Optional[str], remaining: int,
+                      reset: Optional[float]) -> TokenBucket:
+        """Bucket по первой квоте сервера: всплеск - X-RateLimit-Limit, скорость - лимит за окно"""
+        bucket = self._buckets.get(group)
+        if bucket is None:
+            capacity = max(int(limit) if limit and limit.isdigit() else remaining, 1)
+            rate = max(capacity / reset if reset else float(capacity), MIN_RATE)
+            bucket = self._buckets[group] = TokenBucket(rate, capacity)
+        return bucket
+
+    async def acquire(self, group: str, lane: Lane = Lane.NORMAL) -> float:
+        """Ожидание токена группы; без квоты и своих ограничений запрос идет сразу"""
+        bucket = self._buckets.get(group)
+        if bucket is None:
+            if group not in self.limits:
+                return 0.0
+            bucket = self.bucket(group)
+        return await bucket.acquire(lane)
+
+    def is_blocked(self, group: str) -> bool:
+        """Группа на паузе по требованию сервера (Retry-After или исчерпанная квота)"""
+        bucket = self._buckets.get(group)
+        return bucket is not None and bucket.is_blocked()
+
+    def observe(self, group: str, response, attempt: int = 0) -> Optional[float]:
+        """Учитывает заголовки ответа; для 429 возвращает задержку перед повтором"""
+        headers = response.headers
+        reset = parse_reset(headers.get('X-RateLimit-Reset'))
+        remaining = headers.get('X-RateLimit-Remaining')
+        if remaining is not None and remaining.isdigit():
+            bucket = self._quota_bucket(group, headers.get('X-RateLimit-Limit'), int(remaining), reset)
+            bucket.apply_quota(int(remaining), reset)
+
+        if response.status_code != 429:
+            return None
+        self.responses_429 += 1
+        delay = parse_retry_after(headers.get('Retry-After'))
+        if delay is None:
+            delay = reset if reset else self.retry_delay * 2 ** attempt
+        delay = min(delay, self.max_retry_after)
+        self.bucket(group).block(delay)
+        return delay
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            "responses_429": self.responses_429,
+            "groups": {
+                group: {
+                    "rate": round(bucket.rate, 2),
+                    "tokens": round(bucket.tokens, 2),
+                    "queued": bucket.queue_depth(),
+                    "throttled": bucket.throttled,
+                    "waited_s": round(bucket.waited, 3),
+                }
+                for group, bucket in self._buckets.items()
+            },
+        }
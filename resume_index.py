@@ -0,0 +1,214 @@
+# resume_index.py - следующая незавершенная глава и последняя позиция по каждому курсу
+import json
+import os
+import time
+from typing import Dict, Any, List, Optional, Tuple
+from kivy.logger import Logger
+import catalog
+
+RESUME_VERSION = 1
+
+class _CourseEntry:
+    """Порядок глав курса, завершенные главы и курсор на первую незавершенную"""
+    __slots__ = ('course_id', 'order', 'chapters', 'completed', 'cursor', 'last_chapter', 'scroll', 'touched')
+
+    def __init__(self, course_id: int):
+        self.course_id = course_id
+        self.order: List[int] = []
+        self.chapters: Dict[int, Dict[str, Any]] = {}
+        self.completed = set()
+        self.cursor = 0
+        self.last_chapter: Optional[int] = None
+        self.scroll = 1.0
+        self.touched = 0.0
+
+    def advance(self):
+        # Главы обычно завершаются по порядку, поэтому курсор сдвигается на шаг
+        while self.cursor < len(self.order) and self.order[self.cursor] in self.completed:
+            self.cursor += 1
+
+    def next_chapter_id(self) -> Optional[int]:
+        return self.order[self.cursor] if self.cursor < len(self.order) else None
+
+    def dump(self) -> Dict[str, Any]:
+        return {'order': self.order, 'chapters': list(self.chapters.values()), 'completed': sorted(self.completed),
+                'last_chapter': self.last_chapter, 'scroll': self.scroll, 'touched': self.touched}
+
+    def load(self, data: Dict[str, Any]):
+        self.order = list(data.get('order', []))
+        self.chapters = {chapter['id']: chapter for chapter in data.get('chapters', [])}
+        self.completed = set(data.get('completed', []))
+        self.last_chapter = data.get('last_chapter')
+        self.scroll = data.get('scroll', 1.0)
+        self.touched = data.get('touched', 0.0)
+        self.cursor = 0
+        self.advance()
+
+class ResumeIndex:
+    """Индекс «продолжить обучение»: ответ за O(1) без загрузки списка глав.
+
+    Порядок глав приходит из CatalogCache, завершения - из ProgressEngine.
+    Последняя открытая глава и позиция прокрутки сохраняются в файл, а
+    заранее загруженное содержимое следующей главы хранится до первого открытия.
+    """
+
+    def __init__(self, path: Optional[str] = None):
+        self.path = path
+        self.courses: Dict[int, _CourseEntry] = {}
+        self._last_course: Optional[int] = None
+        self._prefetched: Dict[int, Tuple[Dict[str, Any], Optional[Dict[str, Any]]]] = {}
+        self._catalog = None
+        self._dirty = False
+        if path:
+            self.load()
+
+    # --- Источники событий ---
+
+    def attach(self, progress_engine, catalog_cache):
+        self._catalog = catalog_cache
+        catalog_cache.subscribe(self._on_catalog_change)
+        progress_engine.subscribe(self.on_progress_changed)
+        for course_id in list(catalog_cache.course_chapters):
+            self.load_chapters(course_id, catalog_cache.get_chapters(course_id) or [])
+
+    def _on_catalog_change(self, kind: str, items: List[Any]):
+        if kind == catalog.CHAPTERS:
+            for course_id in {chapter['course_id'] for chapter in items}:
+                self.load_chapters(course_id, self._catalog.get_chapters(course_id) or [])
+
+    def on_progress_changed(self, event: Dict[str, Any]):
+        if event.get('kind') == 'chapter' and event.get('chapter_id') is not None:
+            self.complete_chapter(event['course_id'], event['chapter_id'])
+
+    def _entry(self, course_id: int) -> _CourseEntry:
+        entry = self.courses.get(course_id)
+        if entry is None:
+            entry = self.courses[course_id] = _CourseEntry(course_id)
+        return entry
+
+    def _touch(self, entry: _CourseEntry):
+        entry.touched = time.time()
+        self._last_course = entry.course_id
+        self._dirty = True
+
+    def load_chapters(self, course_id: int, chapters: List[Dict[str, Any]]):
+        """Порядок глав курса и их статусы (курсор пересчитывается один раз на список)"""
+        entry = self._entry(course_id)
+        entry.order = [chapter['id'] for chapter in chapters]
+        entry.chapters = {chapter['id']: {'id': chapter['id'], 'title': chapter.get('title', ''),
+                                          'has_test': chapter.get('has_test', False)} for chapter in chapters}
+        entry.completed = {chapter['id'] for chapter in chapters if chapter.get('is_completed')} | \
+            (entry.completed & set(entry.order))
+        entry.cursor = 0
+        entry.advance()
+        self._dirty = True
+
+    def complete_chapter(self, course_id: int, chapter_id: int):
+        entry = self._entry(course_id)
+        entry.completed.add(chapter_id)
+        entry.advance()
+        self._touch(entry)
+
+    def record_position(self, course_id: int, chapter_id: int, scroll: float = 1.0):
+        """Последняя открытая глава курса и позиция прокрутки (1.0 - начало)"""
+        entry = self._entry(course_id)
+        entry.last_chapter = chapter_id
+        entry.scroll = scroll
+        self._touch(entry)
+
+    # --- Запросы ---
+
+    def next_chapter(self, course_id: int) -> Optional[Dict[str, Any]]:
+        """Первая незавершенная глава курса"""
+        entry = self.courses.get(course_id)
+        chapter_id = entry.next_chapter_id() if entry else None
+        return self._chapter(entry, chapter_id) if chapter_id is not None else None
+
+    def position(self, course_id: int, chapter_id: int) -> Optional[float]:
+        """Сохраненная прокрутка главы, если это последняя открытая незавершенная глава курса"""
+        entry = self.courses.get(course_id)
+        if entry and entry.last_chapter == chapter_id and chapter_id not in entry.completed:
+            return entry.scroll
+        return None
+
+    def resume_target(self) -> Optional[Dict[str, Any]]:
+        """Куда вернуться: course_id, глава и позиция прокрутки (последний курс с незавершенной главой)"""
+        entry = self.courses.get(self._last_course)
+        if entry is None or self._resume_chapter_id(entry) is None:
+            # Последний курс пройден - берем следующий по давности незавершенный
+            candidates = [item for item in self.courses.values()
+                          if item.touched and self._resume_chapter_id(item) is not None]
+            if not candidates:
+                return None
+            entry = max(candidates, key=lambda item: item.touched)
+            self._last_course = entry.course_id
+        chapter_id = self._resume_chapter_id(entry)
+        return {
+            'course_id': entry.course_id,
+            'chapter': self._chapter(entry, chapter_id),
+            'scroll': entry.scroll if chapter_id == entry.last_chapter else 1.0,
+        }
+
+    def _resume_chapter_id(self, entry: _CourseEntry) -> Optional[int]:
+        if entry.last_chapter is not None and entry.last_chapter not in entry.completed:
+            return entry.last_chapter
+        return entry.next_chapter_id()
+
+    def _chapter(self, entry: _CourseEntry, chapter_id: int) -> Dict[str, Any]:
+        chapter = entry.chapters.get(chapter_id) or {'id': chapter_id, 'title': '', 'has_test': False}
+        return {**chapter, 'course_id': entry.course_id, 'is_completed': chapter_id in entry.completed}
+
+    # --- Заранее загруженные главы ---
+
+    def store_prefetched(self, chapter_id: int, detail: Dict[str, Any], prepared: Optional[Dict[str, Any]] = None):
+        self._prefetched = {chapter_id: (detail, prepared)}
+
+    def is_prefetched(self, chapter_id: int) -> bool:
+        return chapter_id in self._prefetched
+
+    def take_prefetched(self, chapter_id: int) -> Optional[Tuple[Dict[str, Any], Optional[Dict[str, Any]]]]:
+        """Содержимое главы, загруженное заранее (отдается один раз)"""
+        return self._prefetched.pop(chapter_id, None)
+
+    # --- Хранение ---
+
+    def save(self):
+        if not self.path or not self._dirty:
+            return
+        data = {"version": RESUME_VERSION, "last_course": self._last_course,
+                "courses": {str(course_id): entry.dump() for course_id, entry in self.courses.items()}}
+        try:
+            tmp_path = f"{self.path}.tmp"
+            with open(tmp_path, 'w', encoding='utf-8') as f:
+                json.dump(data, f, ensure_ascii=False, separators=(',', ':'))
+            os.replace(tmp_path, self.path)
+            self._dirty = False
+        except Exception as e:
+            Logger.warning(f"ResumeIndex: не удалось сохранить позиции: {e}")
+
+    def load(self):
+        if not self.path or not os.path.exists(self.path):
+            return
+        try:
+            with open(self.path, encoding='utf-8') as f:
+                data = json.load(f)
+        except Exception as e:
+            Logger.warning(f"ResumeIndex: файл позиций поврежден: {e}")
+            return
+        if data.get("version") != RESUME_VERSION:
+            return
+        for course_id, entry_data in data.get("courses", {}).items():
+            self._entry(int(course_id)).load(entry_data)
+        self._last_course = data.get("last_course")
+
+    def clear(self):
+        """Очистка (при выходе пользователя)"""
+        self.courses.clear()
+        self._prefetched.clear()
+        self._last_course = None
+        self._dirty = False
+        if self.path and os.path.exists(self.path):
+            try:
+                os.remove(self.path)
+            except OSError as e:
+                Logger.warning(f"ResumeIndex: не удалось удалить файл позиций: {e}")
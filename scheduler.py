@@ -0,0 +1,149 @@
+# scheduler.py - приоритетные полосы запросов с ограничением параллельности
+import asyncio
+import heapq
+import itertools
+import time
+from contextlib import asynccontextmanager
+from contextvars import ContextVar
+from enum import IntEnum
+from typing import Awaitable, Dict, Any, List, Optional, TypeVar
+from tracing import LatencyHistogram
+
+T = TypeVar('T')
+
+class Lane(IntEnum):
+    """Приоритет запроса: меньше значение - выше приоритет"""
+    INTERACTIVE = 0  # пользователь ждет результат на экране
+    NORMAL = 1       # обычные загрузки экранов
+    BACKGROUND = 2   # проверки соединения, обновления, предзагрузка
+
+_current_lane: ContextVar = ContextVar('request_lane', default=Lane.NORMAL)
+
+def current_lane() -> Lane:
+    """Полоса, заданная для текущей задачи"""
+    return _current_lane.get()
+
+async def in_lane(lane: Lane, coro: Awaitable[T]) -> T:
+    """Выполняет корутину так, что все ее запросы идут по указанной полосе"""
+    token = _current_lane.set(lane)
+    try:
+        return await coro
+    finally:
+        _current_lane.reset(token)
+
+class _Waiter:
+    __slots__ = ('lane', 'future', 'enqueued')
+
+    def __init__(self, lane: Lane, future: asyncio.Future):
+        self.lane = lane
+        self.future = future
+        self.enqueued = time.perf_counter()
+
+class RequestScheduler:
+    """Планировщик запросов: общий лимит, лимиты полос и очередь по приоритету.
+
+    Освободившийся слот всегда получает самый приоритетный ожидающий запрос,
+    поэтому интерактивные запросы обгоняют стоящую в очереди фоновую работу.
+    Последние reserved_interactive слотов фоновые и обычные запросы не занимают.
+    """
+
+    DEFAULT_LIMITS = {Lane.INTERACTIVE: 6, Lane.NORMAL: 4, Lane.BACKGROUND: 2}
+
+    def __init__(self, max_total: int = 6, limits: Optional[Dict[Lane, int]] = None,
+                 reserved_interactive: int = 1):
+        self.max_total = max_total
+        self.limits = {**self.DEFAULT_LIMITS, **(limits or {})}
+        self.reserved_interactive = reserved_interactive
+
+        self.in_flight: Dict[Lane, int] = {lane: 0 for lane in Lane}
+        self.completed: Dict[Lane, int] = {lane: 0 for lane in Lane}
+        self.max_queue_depth: Dict[Lane, int] = {lane: 0 for lane in Lane}
+        self.wait_times: Dict[Lane, LatencyHistogram] = {lane: LatencyHistogram() for lane in Lane}
+        self._queue: List[tuple] = []
+        self._counter = itertools.count()
+
+    def _total_in_flight(self) -> int:
+        return sum(self.in_flight.values())
+
+    def _can_start(self, lane: Lane) -> bool:
+        total = self._total_in_flight()
+        if total >= self.max_total or self.in_flight[lane] >= self.limits[lane]:
+            return False
+        if lane != Lane.INTERACTIVE and total >= self.max_total - self.reserved_interactive:
+            return False
+        return True
+
+    def queue_depth(self, lane: Optional[Lane] = None) -> int:
+        """Количество ожидающих запросов (по полосе или всего)"""
+        return sum(1 for _, _, waiter in self._queue
+                   if not waiter.future.done() and (lane is None or waiter.lane == lane))
+
+    async def acquire(self, lane: Lane):
+        """Ожидание слота для запроса указанной полосы"""
+        if not self._queue and self._can_start(lane):
+            self.in_flight[lane] += 1
+            self.wait_times[lane].record(0.0)
+            return
+
+        waiter = _Waiter(lane, asyncio.get_running_loop().create_future())
+        heapq.heappush(self._queue, (int(lane), next(self._counter), waiter))
+        self.max_queue_depth[lane] = max(self.max_queue_depth[lane], self.queue_depth(lane))
+        # Свободный слот мог остаться, если очередь упиралась в лимиты других полос
+        self._dispatch()
+        try:
+            await waiter.future
+        except asyncio.CancelledError:
+            if waiter.future.done() and not waiter.future.cancelled():
+                # Слот уже выдан, но задача отменена - возвращаем его
+                self.release(lane)
+            raise
+        self.wait_times[lane].record((time.perf_counter() - waiter.enqueued) * 1000)
+
+    def release(self, lane: Lane, completed: bool = True):
+        """Освобождение слота и запуск следующих по приоритету ожидающих"""
+        self.in_flight[lane] -= 1
+        if completed:
+            self.completed[lane] += 1
+        self._dispatch()
+
+    def _dispatch(self):
+        deferred = []
+        while self._queue:
+            item = heapq.heappop(self._queue)
+            waiter = item[2]
+            if waiter.future.done():
+                continue
+            if self._can_start(waiter.lane):
+                self.in_flight[waiter.lane] += 1
+                waiter.future.set_result(None)
+            else:
+                # Полоса упирается в свой лимит - пропускаем, но не теряем место в очереди
+                deferred.append(item)
+                if self._total_in_flight() >= self.max_total:
+                    break
+        for item in deferred:
+            heapq.heappush(self._queue, item)
+
+    @asynccontextmanager
+    async def slot(self, lane: Optional[Lane] = None):
+        """Контекст выполнения запроса в полосе (по умолчанию - текущей)"""
+        lane = current_lane() if lane is None else lane
+        await self.acquire(lane)
+        try:
+            yield
+        finally:
+            self.release(lane)
+
+    def metrics(self) -> Dict[str, Any]:
+        """Глубина очередей, время ожидания и загрузка по полосам"""
+        return {
+            lane.name.lower(): {
+                "in_flight": self.in_flight[lane],
+                "queued": self.queue_depth(lane),
+                "max_queued": self.max_queue_depth[lane],
+                "completed": self.completed[lane],
+                "limit": self.limits[lane],
+                "wait_ms": self.wait_times[lane].to_dict(),
+            }
+            for lane in Lane
+        }
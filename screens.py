@@ -1,46 +1,57 @@
 # screens.py
 from kivy.uix.screenmanager import Screen
-from kivymd.uix.button import MDRaisedButton, MDFlatButton
-from kivymd.uix.dialog import MDDialog
+from kivymd.uix.button import MDRaisedButton
 from kivymd.uix.boxlayout import MDBoxLayout
 from kivymd.uix.list import OneLineListItem, TwoLineListItem
 from kivymd.uix.label import MDLabel
 from kivymd.uix.card import MDCard
-from kivymd.uix.textfield import MDTextField
+from kivy.uix.image import Image
 from kivymd.app import MDApp
-from kivymd.uix.snackbar import Snackbar
 from kivy.properties import ObjectProperty, StringProperty
-from kivy.metrics import dp
+from kivy.metrics import dp, sp
+from kivy.core.window import Window
 from kivy.clock import Clock
+from kivy.logger import Logger
+from snapshot import compact_items, COURSE_FIELDS, TEST_FIELDS
+from async_helper import AsyncTaskManager
+from scheduler import Lane, in_lane
+from facets import PROGRESS_BUCKETS, SORT_OPTIONS
+from text_cache import font_spec
+from content_pipeline import preprocess_content
+import time
+
+# Диалоги, поля ввода и снекбары нужны не на каждом запуске, поэтому
+# их модули импортируются при первом показе, а не при загрузке экранов
 
 class DialogMixin:
+    # Диалоги и снекбары переиспользуются и проходят через общую очередь уведомлений
+
     def show_error_dialog(self, text):
         """Показать диалог ошибки"""
-        def _show_dialog(dt):
-            dialog = MDDialog(
-                title="Ошибка",
-                text=text,
-                buttons=[MDFlatButton(text="OK", on_release=lambda x: dialog.dismiss())]
-            )
-            dialog.open()
-        Clock.schedule_once(_show_dialog, 0)
+        MDApp.get_running_app().notifications.show_dialog('error', "Ошибка", text)
 
     def show_success_dialog(self, text):
         """Показать диалог успеха"""
-        def _show_dialog(dt):
-            dialog = MDDialog(
-                title="Успех",
-                text=text,
-                buttons=[MDFlatButton(text="OK", on_release=lambda x: dialog.dismiss())]
-            )
-            dialog.open()
-        Clock.schedule_once(_show_dialog, 0)
+        MDApp.get_running_app().notifications.show_dialog('success', "Успех", text)
 
     def show_notification_snackbar(self, text):
         """Показать уведомление"""
-        def _show_snackbar(dt):
-            Snackbar(text=text, duration=3).open()
-        Clock.schedule_once(_show_snackbar, 0)
+        MDApp.get_running_app().notifications.notify(text)
+
+class ScreenTasksMixin:
+    """Задачи, привязанные к экрану: отменяются при уходе, их поздние результаты отбрасываются"""
+    _screen_tasks = None
+
+    @property
+    def screen_tasks(self):
+        if self._screen_tasks is None:
+            self._screen_tasks = AsyncTaskManager()
+            self.bind(on_leave=lambda *args: self._screen_tasks.cancel_all())
+        return self._screen_tasks
+
+    def run_screen_task(self, coro, callback=None, key=None):
+        """Запуск загрузки экрана; повторный запуск с тем же key отменяет предыдущий"""
+        return self.screen_tasks.create_task(coro, callback, key=key)
 
 class LoginScreen(Screen, DialogMixin):
     def on_pre_enter(self):
@@ -61,6 +72,10 @@ class LoginScreen(Screen, DialogMixin):
 
     def show_register_dialog(self):
         """Диалог регистрации"""
+        from kivymd.uix.button import MDFlatButton
+        from kivymd.uix.dialog import MDDialog
+        from kivymd.uix.textfield import MDTextField
+
         content = MDBoxLayout(orientation="vertical", spacing=dp(12), size_hint_y=None, height=dp(300))
         
         username_field = MDTextField(hint_text="Логин")
@@ -106,11 +121,101 @@ class LoginScreen(Screen, DialogMixin):
         app = MDApp.get_running_app()
         app.register_user(username, email, password, first_name, last_name)
 
-class MainScreen(Screen, DialogMixin):
+class MainScreen(Screen, DialogMixin, ScreenTasksMixin):
+    _courses = None
+    _tests = None
+    _snapshot_checked = False
+    _courses_from_snapshot = False
+    _tests_from_snapshot = False
+    _search_query = ''
+    _search_trigger = None
+    _facet_filter = None
+    _sort = 'default'
+    _menu = None
+
+    def __init__(self, **kwargs):
+        super().__init__(**kwargs)
+        # Метки прогресса на карточках курсов обновляются без перезагрузки списка
+        self._progress_labels = {}
+        app = MDApp.get_running_app()
+        app.progress.subscribe(self.on_progress_changed)
+        if app.push_channel:
+            app.push_channel.subscribe(self.on_push_event)
+
+    def on_pre_enter(self):
+        # При первом входе сразу рисуем сохраненный снимок, свежие данные придут в on_enter
+        if not self._snapshot_checked:
+            self._snapshot_checked = True
+            self.show_snapshot()
+
     def on_enter(self):
+        self._update_continue_button()
+        self._prefetch_resume_chapter()
+        # Пока подключен поток событий сервера, загруженные списки обновляются по событиям
+        push_channel = MDApp.get_running_app().push_channel
+        if (push_channel and push_channel.connected and self._courses is not None and self._tests is not None
+                and not self._courses_from_snapshot and not self._tests_from_snapshot):
+            return
         self.load_courses()
         self.load_tests()
 
+    def on_push_event(self, event, data):
+        """Изменения курсов и контрольных тестов от сервера без перезагрузки списков"""
+        if event == 'reset':
+            self.load_courses()
+            self.load_tests()
+        elif event in ('course', 'course_removed') and self._courses is not None:
+            courses = [data if course['id'] == data['id'] else course for course in self._courses
+                       if event == 'course' or course['id'] != data['id']]
+            if event == 'course' and not any(course['id'] == data['id'] for course in self._courses):
+                courses.append(data)
+            self._update_courses_ui(courses)
+        elif event == 'control_test' and self._tests is not None:
+            MDApp.get_running_app().analytics.sync_tests([data])
+            tests = [data if test['id'] == data['id'] else test for test in self._tests]
+            if not any(test['id'] == data['id'] for test in self._tests):
+                tests.append(data)
+            self._update_tests_ui(tests)
+
+    def show_snapshot(self):
+        """Отрисовка последних сохраненных курсов и тестов"""
+        app = MDApp.get_running_app()
+        started = time.perf_counter()
+        snapshot = app.ui_snapshot.load(app.get_current_user())
+        if not snapshot:
+            return
+        self._update_courses_ui(snapshot['courses'])
+        self._update_tests_ui(snapshot['tests'])
+        if snapshot['courses']:
+            app.catalog.put_courses(snapshot['courses'])
+        self._courses_from_snapshot = bool(snapshot['courses'])
+        self._tests_from_snapshot = bool(snapshot['tests'])
+        Logger.info(f"MainScreen: снимок отрисован за {(time.perf_counter() - started) * 1000:.1f} мс")
+
+    def reset_data(self):
+        """Очистка списков при выходе пользователя"""
+        self._courses = None
+        self._tests = None
+        self._courses_from_snapshot = False
+        self._tests_from_snapshot = False
+        self._search_query = ''
+        if hasattr(self.ids, 'search_field'):
+            self.ids.search_field.text = ''
+        self._facet_filter = None
+        self._sort = 'default'
+        self._update_facet_buttons()
+        if hasattr(self.ids, 'courses_list'):
+            self.ids.courses_list.clear_widgets()
+        if hasattr(self.ids, 'tests_list'):
+            self.ids.tests_list.clear_widgets()
+
+    def export_snapshot(self):
+        """Данные для сохранения снимка экрана"""
+        return self._courses, self._tests
+
+    def _is_unchanged(self, current, fresh, fields):
+        return current is not None and compact_items(current, fields) == compact_items(fresh, fields)
+
     def load_courses(self):
         """Загрузка курсов"""
         app = MDApp.get_running_app()
@@ -123,16 +228,36 @@ class MainScreen(Screen, DialogMixin):
                 return []
 
         def handle_courses_result(courses):
-            self._update_courses_ui(courses or [])
-
-        app.run_async_task(async_load_courses(), handle_courses_result)
+            courses = courses or []
+            # Пустой ответ (в том числе при ошибке сети) не затирает данные снимка
+            if not courses and self._courses_from_snapshot:
+                return
+            self._courses_from_snapshot = False
+            if courses:
+                app.catalog.put_courses(courses)
+            if self._is_unchanged(self._courses, courses, COURSE_FIELDS):
+                self._courses = courses
+                return
+            self._update_courses_ui(courses)
+
+        # При запуске курсы уже запрашиваются параллельно с проверкой токена
+        app.run_prefetched('courses', async_load_courses, handle_courses_result,
+                           runner=lambda coro, callback: self.run_screen_task(coro, callback, key='courses'))
 
     def _update_courses_ui(self, courses):
         """Обновление UI со списком курсов"""
         if not hasattr(self.ids, 'courses_list'):
             return
+        self._courses = courses
+        # Во время поиска в списке показываются результаты поиска
+        if self._search_query:
+            return
+        app = MDApp.get_running_app()
+        if self._facet_filter or self._sort != 'default':
+            courses = app.facets.query(sort=self._sort, **(self._facet_filter or {}))
             
         self.ids.courses_list.clear_widgets()
+        self._progress_labels = {}
         
         for course in courses:
             card = MDCard(
@@ -143,6 +268,15 @@ class MainScreen(Screen, DialogMixin):
                 spacing=dp(8),
                 on_release=lambda x, c=course: self.go_to_course(c)
             )
+
+            # Обложка приходит из кэша текстур сразу или подставляется после загрузки
+            if app.thumbnails:
+                cover = Image(size_hint_x=None, width=dp(96), allow_stretch=True, keep_ratio=True)
+                image_url = app.api_client.get_course_image_url(course)
+                # Без обложки в ответе карточка остается с заглушкой, запроса нет
+                if image_url:
+                    app.thumbnails.bind_image(cover, image_url)
+                card.add_widget(cover)
             
             card_content = MDBoxLayout(orientation="vertical")
             
@@ -159,13 +293,12 @@ class MainScreen(Screen, DialogMixin):
                 height=dp(40)
             )
             
-            status_text = "Подписан" if course.get('is_subscribed') else "Доступен"
-            progress_text = f"Прогресс: {course.get('progress_percentage', 0):.1f}%"
             status_label = MDLabel(
-                text=f"{status_text} • {progress_text}",
+                text=self._course_status_text(course, course.get('progress_percentage', 0)),
                 size_hint_y=None, 
                 height=dp(20)
             )
+            self._progress_labels[course['id']] = (status_label, course)
             
             card_content.add_widget(title_label)
             card_content.add_widget(desc_label)
@@ -174,6 +307,184 @@ class MainScreen(Screen, DialogMixin):
             
             self.ids.courses_list.add_widget(card)
 
+    def _course_status_text(self, course, percentage):
+        status_text = "Подписан" if course.get('is_subscribed') else "Доступен"
+        return f"{status_text} • Прогресс: {percentage or 0:.1f}%"
+
+    def on_progress_changed(self, event):
+        """Обновление прогресса курса на его карточке"""
+        entry = self._progress_labels.get(event['course_id'])
+        if entry:
+            label, course = entry
+            course['progress_percentage'] = event['percentage']
+            label.text = self._course_status_text(course, event['percentage'])
+        if event.get('kind') == 'chapter':
+            self._update_continue_button()
+
+    def _update_continue_button(self):
+        """Кнопка «Продолжить» ведет к последней незавершенной главе"""
+        if not hasattr(self.ids, 'continue_button'):
+            return
+        app = MDApp.get_running_app()
+        target = app.resume_index.resume_target()
+        button = self.ids.continue_button
+        button.opacity = 1 if target else 0
+        button.disabled = not target
+        button.height = dp(48) if target else 0
+        if target:
+            course = app.catalog.get_course(target['course_id']) or {}
+            title = target['chapter']['title'] or "следующая глава"
+            button.text = f"Продолжить: {course.get('title', 'курс')} — {title}"
+
+    def _prefetch_resume_chapter(self):
+        """Заранее загружает главу для «Продолжить», чтобы она открылась без ожидания"""
+        app = MDApp.get_running_app()
+        target = app.resume_index.resume_target()
+        if not target or not app.api_client:
+            return
+        chapter_id = target['chapter']['id']
+        if app.resume_index.is_prefetched(chapter_id) or (app.course_packs and app.course_packs.has_chapter(chapter_id)):
+            return
+
+        async def async_prefetch():
+            try:
+                detail = await app.api_client.get_chapter_detail(chapter_id)
+                text = ((detail or {}).get('content') or {}).get('text')
+                prepared = await app.content_pipeline.prepare(text) if text else None
+                return detail, prepared
+            except Exception as e:
+                Logger.debug(f"MainScreen: не удалось заранее загрузить главу {chapter_id}: {e}")
+                return None
+
+        def handle_prefetch_result(result):
+            if result and result[0]:
+                app.resume_index.store_prefetched(chapter_id, *result)
+
+        # Загрузка продолжается после ухода с экрана - ради этого она и запускается
+        app.run_async_task(in_lane(Lane.BACKGROUND, async_prefetch()), handle_prefetch_result)
+
+    def continue_learning(self):
+        """Переход сразу к содержанию главы, минуя список курсов и глав"""
+        app = MDApp.get_running_app()
+        target = app.resume_index.resume_target()
+        if not target:
+            return
+        course_id = target['course_id']
+        self.manager.current_course = app.catalog.get_course(course_id) or \
+            {'id': course_id, 'title': "Курс", 'description': ""}
+        self.manager.current_chapter = target['chapter']
+        self.manager.current = "course_content"
+
+    def open_filter_menu(self, caller):
+        """Меню фильтров каталога: категории, подписка и прогресс"""
+        app = MDApp.get_running_app()
+        counts = app.facets.counts()
+        options = [("Все курсы", None)]
+        options.append((f"Мои подписки ({counts['subscribed'][True]})", {'subscribed': True}))
+        options.extend((f"{label} ({counts['progress'][bucket]})", {'progress': bucket})
+                       for bucket, label in PROGRESS_BUCKETS)
+        options.extend((f"{label} ({count})", {'category_id': category_id})
+                       for category_id, label, count in app.facets.categories())
+        self._open_menu(caller, [(text, lambda f=facet_filter: self.set_facet_filter(f))
+                                 for text, facet_filter in options])
+
+    def open_sort_menu(self, caller):
+        """Меню сортировки каталога"""
+        self._open_menu(caller, [(label, lambda key=key: self.set_sort(key)) for key, label in SORT_OPTIONS])
+
+    def _open_menu(self, caller, options):
+        from kivymd.uix.menu import MDDropdownMenu
+
+        def select(action):
+            self._menu.dismiss()
+            action()
+
+        if self._menu:
+            self._menu.dismiss()
+        self._menu = MDDropdownMenu(
+            caller=caller,
+            items=[{"viewclass": "OneLineListItem", "text": text,
+                    "on_release": lambda a=action: select(a)} for text, action in options],
+            width_mult=4,
+        )
+        self._menu.open()
+
+    def set_facet_filter(self, facet_filter):
+        """Фильтрация каталога по локальному индексу без запроса к серверу"""
+        self._facet_filter = facet_filter
+        self._update_facet_buttons()
+        self._update_courses_ui(self._courses or [])
+
+    def set_sort(self, sort):
+        self._sort = sort
+        self._update_facet_buttons()
+        self._update_courses_ui(self._courses or [])
+
+    def _update_facet_buttons(self):
+        if hasattr(self.ids, 'filter_button'):
+            self.ids.filter_button.text = "Фильтр: выбран" if self._facet_filter else "Фильтр: все"
+        if hasattr(self.ids, 'sort_button'):
+            self.ids.sort_button.text = dict(SORT_OPTIONS)[self._sort]
+
+    def on_search_text(self, text):
+        """Изменение строки поиска (поиск запускается после паузы в наборе)"""
+        self._search_query = text.strip()
+        if self._search_trigger is None:
+            self._search_trigger = Clock.create_trigger(self._run_search, 0.15)
+        self._search_trigger()
+
+    def _run_search(self, dt):
+        if not self._search_query:
+            self._update_courses_ui(self._courses or [])
+            return
+        app = MDApp.get_running_app()
+        started = time.perf_counter()
+        results = app.search_index.search(self._search_query, limit=30)
+        Logger.debug(f"MainScreen: поиск '{self._search_query}' за {(time.perf_counter() - started) * 1000:.1f} мс")
+        self._update_search_ui(results)
+
+    def _update_search_ui(self, results):
+        """Отображение результатов поиска вместо списка курсов"""
+        if not hasattr(self.ids, 'courses_list'):
+            return
+        app = MDApp.get_running_app()
+        self.ids.courses_list.clear_widgets()
+
+        if not results:
+            self.ids.courses_list.add_widget(OneLineListItem(text="Ничего не найдено"))
+            return
+
+        for result in results:
+            course = app.catalog.get_course(result.get('course_id'))
+            if result['kind'] == 'course':
+                item = TwoLineListItem(
+                    text=result['title'],
+                    secondary_text="Курс",
+                    on_release=lambda x, r=result: self.go_to_search_result(r)
+                )
+            else:
+                item = TwoLineListItem(
+                    text=result['title'],
+                    secondary_text=f"Глава курса «{course['title']}»" if course else "Глава",
+                    on_release=lambda x, r=result: self.go_to_search_result(r)
+                )
+            self.ids.courses_list.add_widget(item)
+
+    def go_to_search_result(self, result):
+        """Переход к найденному курсу или главе"""
+        app = MDApp.get_running_app()
+        course = app.catalog.get_course(result.get('course_id'))
+        if result['kind'] == 'course':
+            if course:
+                self.go_to_course(course)
+            return
+        chapter = app.catalog.get_chapter(result['id']) or {
+            'id': result['id'], 'title': result['title'], 'course_id': result.get('course_id')
+        }
+        self.manager.current_course = course
+        self.manager.current_chapter = chapter
+        self.manager.current = "course_content"
+
     def load_tests(self):
         """Загрузка тестов"""
         app = MDApp.get_running_app()
@@ -186,14 +497,24 @@ class MainScreen(Screen, DialogMixin):
                 return []
 
         def handle_tests_result(tests):
-            self._update_tests_ui(tests or [])
-
-        app.run_async_task(async_load_tests(), handle_tests_result)
+            tests = tests or []
+            if not tests and self._tests_from_snapshot:
+                return
+            self._tests_from_snapshot = False
+            app.analytics.sync_tests(tests)
+            if self._is_unchanged(self._tests, tests, TEST_FIELDS):
+                self._tests = tests
+                return
+            self._update_tests_ui(tests)
+
+        app.run_prefetched('control_tests', async_load_tests, handle_tests_result,
+                           runner=lambda coro, callback: self.run_screen_task(coro, callback, key='tests'))
 
     def _update_tests_ui(self, tests):
         """Обновление UI со списком тестов"""
         if not hasattr(self.ids, 'tests_list'):
             return
+        self._tests = tests
             
         self.ids.tests_list.clear_widgets()
         
@@ -223,12 +544,24 @@ class MainScreen(Screen, DialogMixin):
         app = MDApp.get_running_app()
         app.logout()
 
-class CourseDetailsScreen(Screen, DialogMixin):
+class CourseDetailsScreen(Screen, DialogMixin, ScreenTasksMixin):
+    # Сколько секунд список глав из кэша считается свежим без потока событий сервера
+    chapters_max_age = 300
+
+    def __init__(self, **kwargs):
+        super().__init__(**kwargs)
+        self._chapter_items = {}
+        app = MDApp.get_running_app()
+        app.progress.subscribe(self.on_progress_changed)
+        if app.push_channel:
+            app.push_channel.subscribe(self.on_push_event)
+
     def on_pre_enter(self):
         course = self.manager.current_course
         if course:
             self.ids.course_title_label.text = course['title']
             self.ids.course_description_label.text = course['description']
+            self._update_download_button()
             self.load_chapters()
 
     def load_chapters(self):
@@ -238,6 +571,19 @@ class CourseDetailsScreen(Screen, DialogMixin):
             return
         
         app = MDApp.get_running_app()
+        # Главы из кэша каталога (с локальным прогрессом) показываются без запроса, пока свежие:
+        # при подключенном потоке событий кэш обновляется сервером сам
+        cached = app.catalog.get_chapters(course['id'])
+        if cached is not None:
+            self._update_chapters_ui(self._with_progress(cached))
+            age = app.catalog.chapters_age(course['id'])
+            push_channel = app.push_channel
+            if (push_channel and push_channel.connected) or (age is not None and age < self.chapters_max_age):
+                return
+        # Скачанный курс показываем сразу, список с сервера заменит его после загрузки
+        offline = cached or (app.course_packs.chapters(course['id']) if app.course_packs else None)
+        if offline and cached is None:
+            self._update_chapters_ui(self._with_progress(offline))
         
         async def async_load_chapters():
             try:
@@ -247,9 +593,19 @@ class CourseDetailsScreen(Screen, DialogMixin):
                 return []
 
         def handle_chapters_result(chapters):
-            self._update_chapters_ui(chapters or [])
+            if chapters:
+                app.catalog.put_chapters(course['id'], chapters)
+            elif offline:
+                return
+            self._update_chapters_ui(self._with_progress(chapters or []))
+
+        self.run_screen_task(in_lane(Lane.INTERACTIVE, async_load_chapters()), handle_chapters_result, key='chapters')
 
-        app.run_async_task(async_load_chapters(), handle_chapters_result)
+    def _with_progress(self, chapters):
+        """Копии глав с отметками, завершенными локально после загрузки списка"""
+        progress = MDApp.get_running_app().progress
+        return [{**chapter, 'is_completed': chapter.get('is_completed') or progress.is_chapter_completed(chapter['id'])}
+                for chapter in chapters]
 
     def _update_chapters_ui(self, chapters):
         """Обновление UI со списком глав"""
@@ -257,30 +613,110 @@ class CourseDetailsScreen(Screen, DialogMixin):
             return
             
         self.ids.chapters_list.clear_widgets()
+        self._chapter_items = {}
         
         for chapter in chapters:
-            status = "✓" if chapter.get('is_completed') else "○"
-            test_indicator = " 📝" if chapter.get('has_test') else ""
-            
-            item = TwoLineListItem(
-                text=f"{status} {chapter['title']}{test_indicator}",
-                secondary_text="Завершено" if chapter.get('is_completed') else "Не пройдено",
-                on_release=lambda x, ch=chapter: self.go_to_chapter(ch)
-            )
+            item = TwoLineListItem(on_release=lambda x, ch=chapter: self.go_to_chapter(ch))
+            self._set_chapter_item_text(item, chapter)
+            self._chapter_items[chapter['id']] = (item, chapter)
             self.ids.chapters_list.add_widget(item)
 
+    def _set_chapter_item_text(self, item, chapter):
+        status = "✓" if chapter.get('is_completed') else "○"
+        test_indicator = " 📝" if chapter.get('has_test') else ""
+        item.text = f"{status} {chapter['title']}{test_indicator}"
+        item.secondary_text = "Завершено" if chapter.get('is_completed') else "Не пройдено"
+
+    def on_progress_changed(self, event):
+        """Отметка завершенной главы в списке без его перезагрузки"""
+        entry = self._chapter_items.get(event.get('chapter_id'))
+        if entry:
+            item, chapter = entry
+            chapter['is_completed'] = True
+            self._set_chapter_item_text(item, chapter)
+
+    def on_push_event(self, event, data):
+        """Новый список глав открытого курса от сервера"""
+        course = self.manager.current_course if self.manager else None
+        if event == 'chapters' and course and data['course_id'] == course['id']:
+            self._update_chapters_ui(data['chapters'])
+
     def go_to_chapter(self, chapter):
         """Переход к главе"""
         self.manager.current_chapter = chapter
         self.manager.current = "course_content"
 
-class ChapterContentScreen(Screen, DialogMixin):
+    def _update_download_button(self):
+        course = self.manager.current_course
+        app = MDApp.get_running_app()
+        if not hasattr(self.ids, 'download_button') or not course:
+            return
+        button = self.ids.download_button
+        button.opacity = 1 if app.course_packs else 0
+        button.disabled = not app.course_packs
+        button.text = "Обновить офлайн-копию" if app.course_packs and app.course_packs.has_course(course['id']) \
+            else "Скачать для офлайн"
+
+    def download_course(self):
+        """Скачивание курса целиком в офлайн-пакет"""
+        course = self.manager.current_course
+        app = MDApp.get_running_app()
+        if not course or not app.course_packs:
+            return
+        button = self.ids.download_button
+        button.disabled = True
+
+        def on_progress(done, total):
+            Clock.schedule_once(lambda dt: setattr(button, 'text', f"Загрузка... {done}/{total}"), 0)
+
+        async def async_download():
+            try:
+                return await app.course_packs.download(course['id'], on_progress)
+            except Exception as e:
+                Logger.warning(f"CourseDetailsScreen: не удалось скачать курс {course['id']}: {e}")
+                return None
+
+        def handle_download_result(stats):
+            if app.get_current_user() is None:
+                # Пользователь вышел, загрузка отменена
+                return
+            self._update_download_button()
+            if stats:
+                self.show_notification_snackbar(f"Курс доступен офлайн: {stats['chapters']} глав")
+            else:
+                self.show_error_dialog("Не удалось скачать курс")
+
+        # Скачивание продолжается и после ухода с экрана
+        app.run_async_task(async_download(), handle_download_result)
+
+class ChapterContentScreen(Screen, DialogMixin, ScreenTasksMixin):
+    _chapter_detail = None
+    _prepared = None
+    _rendered_chapter_id = None
+    _complete_button = None
+    _paragraphs = ()
+    _paragraph_width = None
+    _layout_trigger = None
+
     def on_pre_enter(self):
         chapter = self.manager.current_chapter
         if chapter:
             self.ids.chapter_title.title = chapter['title']
+            # Экран пересоздан после выгрузки - сразу показываем сохраненные данные
+            detail = self._chapter_detail
+            if detail and detail.get('id') == chapter['id'] and self._rendered_chapter_id is None:
+                self._update_content_ui(detail, self._prepared)
             self.load_content()
 
+    def export_state(self):
+        """Данные для восстановления экрана после выгрузки из памяти"""
+        return {'chapter_detail': self._chapter_detail, 'prepared': self._prepared}
+
+    def restore_state(self, state):
+        """Восстановление данных после повторного создания экрана"""
+        self._chapter_detail = state.get('chapter_detail')
+        self._prepared = state.get('prepared')
+
     def load_content(self):
         """Загрузка содержания главы"""
         chapter = self.manager.current_chapter
@@ -288,24 +724,47 @@ class ChapterContentScreen(Screen, DialogMixin):
             return
         
         app = MDApp.get_running_app()
+        # Глава, заранее загруженная для «Продолжить», показывается без запроса
+        prefetched = app.resume_index.take_prefetched(chapter['id'])
+        if prefetched:
+            detail, prepared = prefetched
+            app.catalog.put_chapter_detail({'course_id': chapter.get('course_id'), **detail})
+            self._update_content_ui(detail, prepared)
+            return
+        # Скачанная глава читается из пакета курса без обращения к серверу
+        offline = app.course_packs.chapter_detail(chapter['id']) if app.course_packs else None
+        if offline:
+            offline['is_completed'] = (offline.get('is_completed') or chapter.get('is_completed')
+                                       or app.progress.is_chapter_completed(chapter['id']))
         
         async def async_load_content():
             try:
-                chapter_detail = await app.api_client.get_chapter_detail(chapter['id'])
-                return chapter_detail
+                chapter_detail = offline or await app.api_client.get_chapter_detail(chapter['id'])
+                # Разбор текста на абзацы и разметку идет в пуле процессов, а не в UI потоке
+                text = ((chapter_detail or {}).get('content') or {}).get('text')
+                prepared = await app.content_pipeline.prepare(text) if text else None
+                return chapter_detail, prepared
             except Exception as e:
                 return None
 
-        def handle_content_result(chapter_detail):
+        def handle_content_result(result):
+            chapter_detail, prepared = result or (None, None)
+            # Глава могла смениться, пока шла загрузка
+            current = self.manager.current_chapter if self.manager else None
             if chapter_detail:
-                self._update_content_ui(chapter_detail)
+                app.catalog.put_chapter_detail({'course_id': chapter.get('course_id'), **chapter_detail})
+            if chapter_detail and current and current['id'] == chapter['id']:
+                self._update_content_ui(chapter_detail, prepared)
 
-        app.run_async_task(async_load_content(), handle_content_result)
+        self.run_screen_task(in_lane(Lane.INTERACTIVE, async_load_content()), handle_content_result, key='content')
 
-    def _update_content_ui(self, chapter_detail):
+    def _update_content_ui(self, chapter_detail, prepared=None):
         """Обновление UI с содержанием главы"""
         if not hasattr(self.ids, 'content_container'):
             return
+        self._chapter_detail = chapter_detail
+        self._prepared = prepared
+        self._rendered_chapter_id = chapter_detail.get('id')
             
         content_container = self.ids.content_container
         content_container.clear_widgets()
@@ -314,14 +773,11 @@ class ChapterContentScreen(Screen, DialogMixin):
         if content:
             # Текстовое содержание
             if content.get('text'):
-                text_label = MDLabel(
-                    text=content['text'],
-                    text_size=(None, None),
-                    halign="left",
-                    size_hint_y=None
-                )
-                text_label.bind(texture_size=text_label.setter('size'))
-                content_container.add_widget(text_label)
+                if prepared is None:
+                    app = MDApp.get_running_app()
+                    prepared = app.content_pipeline.get_cached(content['text']) or preprocess_content(content['text'])
+                    self._prepared = prepared
+                self._add_paragraphs(content_container, prepared['paragraphs'])
             
             # Видео
             if content.get('video'):
@@ -362,7 +818,67 @@ class ChapterContentScreen(Screen, DialogMixin):
             disabled=chapter_detail.get('is_completed', False),
             on_release=lambda x: self.complete_chapter()
         )
+        self._complete_button = complete_button
         content_container.add_widget(complete_button)
+        self._restore_position(chapter_detail['id'])
+
+    def _course_id(self):
+        chapter = self.manager.current_chapter or {}
+        course = self.manager.current_course or {}
+        return chapter.get('course_id') or course.get('id')
+
+    def _restore_position(self, chapter_id):
+        """Возврат к месту, где чтение главы было прервано"""
+        scroll = MDApp.get_running_app().resume_index.position(self._course_id(), chapter_id)
+        if scroll is not None and scroll < 1 and hasattr(self.ids, 'content_scroll'):
+            # Высота содержимого известна только после раскладки
+            Clock.schedule_once(lambda dt: setattr(self.ids.content_scroll, 'scroll_y', scroll), 0)
+
+    def on_pre_leave(self):
+        """Запоминает главу и позицию прокрутки для «Продолжить»"""
+        detail = self._chapter_detail
+        course_id = self._course_id()
+        if detail and course_id is not None and hasattr(self.ids, 'content_scroll'):
+            MDApp.get_running_app().resume_index.record_position(course_id, detail['id'],
+                                                                 self.ids.content_scroll.scroll_y)
+
+    def _text_font(self, scale=1.0):
+        return font_spec('Roboto', sp(16) * scale, MDApp.get_running_app().theme_cls.text_color, markup=True)
+
+    def _text_width(self):
+        container = self.ids.content_container
+        # До первой раскладки ширина контейнера еще не известна - берем ширину окна
+        width = container.width if container.width > 100 else Window.width
+        return int(width - container.padding[0] - container.padding[2])
+
+    def _add_paragraphs(self, container, paragraphs):
+        """Абзацы из ContentPipeline; их текстуры берутся из кэша"""
+        self._paragraph_width = self._text_width()
+        self._paragraphs = []
+        for paragraph in paragraphs:
+            scale = paragraph['hints'].get('scale', 1.0)
+            widget = Image(size_hint=(None, None))
+            self._set_paragraph_texture(widget, paragraph['markup'], self._paragraph_width, self._text_font(scale))
+            self._paragraphs.append((widget, paragraph['markup'], scale))
+            container.add_widget(widget)
+
+        if self._layout_trigger is None:
+            self._layout_trigger = Clock.create_trigger(self._relayout_paragraphs, 0.1)
+            container.bind(width=lambda *args: self._layout_trigger())
+
+    def _set_paragraph_texture(self, widget, paragraph, width, font):
+        texture = MDApp.get_running_app().text_textures.get(paragraph, width, font)
+        widget.texture = texture
+        widget.size = texture.size if texture else (0, 0)
+
+    def _relayout_paragraphs(self, dt):
+        """Смена ширины (например, поворот экрана): прежние ширины берутся из кэша"""
+        width = self._text_width()
+        if width == self._paragraph_width:
+            return
+        self._paragraph_width = width
+        for widget, markup, scale in self._paragraphs:
+            self._set_paragraph_texture(widget, markup, width, self._text_font(scale))
 
     def open_video(self, video_path):
         """Открытие видео"""
@@ -385,6 +901,9 @@ class ChapterContentScreen(Screen, DialogMixin):
             return
         
         app = MDApp.get_running_app()
+        course = self.manager.current_course
+        # Сам запрос не отменяется при уходе с экрана, отменяется только обновление кнопки
+        mark_completed = self.screen_tasks.guard(self._mark_completed)
         
         async def async_complete_chapter():
             try:
@@ -398,13 +917,24 @@ class ChapterContentScreen(Screen, DialogMixin):
                 self.show_success_dialog("Глава завершена!")
                 # Обновляем статус главы
                 chapter['is_completed'] = True
-                # Перезагружаем содержание
-                Clock.schedule_once(lambda dt: self.load_content(), 0.5)
+                # Прогресс курса и списки пересчитываются локально, без повторной загрузки
+                app.progress.complete_chapter(chapter['id'], chapter.get('course_id') or (course and course['id']))
+                mark_completed(chapter['id'])
             else:
                 self.show_error_dialog("Не удалось завершить главу")
 
         app.run_async_task(async_complete_chapter(), handle_completion_result)
 
+    def _mark_completed(self, chapter_id):
+        """Перевод кнопки завершения в состояние «завершено»"""
+        detail = self._chapter_detail
+        if not detail or detail.get('id') != chapter_id:
+            return
+        self._chapter_detail = {**detail, 'is_completed': True}
+        if self._complete_button is not None:
+            self._complete_button.text = "✓ Глава завершена"
+            self._complete_button.disabled = True
+
     def take_self_check_test(self):
         """Переход к тесту для самопроверки"""
         self.manager.current = "selfcheck_test"
@@ -421,6 +951,56 @@ class SelfCheckTestScreen(Screen, DialogMixin):
         """Отправка ответов теста"""
         self.show_notification_snackbar("Функция в разработке")
 
+class StatisticsScreen(Screen):
+    def on_pre_enter(self):
+        self.show_statistics()
+
+    def show_statistics(self):
+        """Отрисовка статистики из локальной истории и данных сервера"""
+        if not hasattr(self.ids, 'stats_container'):
+            return
+        app = MDApp.get_running_app()
+        summary = app.analytics.summary()
+        container = self.ids.stats_container
+        # Заголовок из KV остается, пересоздаются только строки статистики
+        for widget in [w for w in container.children if getattr(w, 'stats_row', False)]:
+            container.remove_widget(widget)
+
+        rows = []
+        server = app.user_statistics or {}
+        if server.get('completed_chapters') is not None:
+            rows.append(f"Завершено глав (по данным сервера): {server['completed_chapters']}")
+        rows.append(f"Завершено глав: {summary['chapters_completed']}")
+        rows.append(f"Пройдено тестов: {summary['tests_completed']}")
+        if summary['average_score'] is not None:
+            rows.append(f"Средний балл: {summary['average_score']:.1f} (лучший: {summary['best_score']:.1f})")
+
+        weekly = summary['weekly_chapters']
+        if any(weekly):
+            rows.append("Глав по неделям (последние 12):")
+            rows.append(" ".join(str(count) for count in weekly))
+
+        distribution = [bucket for bucket in summary['score_distribution'] if bucket['count']]
+        if distribution:
+            rows.append("Распределение баллов:")
+            peak = max(bucket['count'] for bucket in distribution)
+            rows.extend(f"{bucket['from']:.1f}–{bucket['to']:.1f}: {'█' * max(1, round(10 * bucket['count'] / peak))} "
+                        f"{bucket['count']}" for bucket in distribution)
+
+        categories = summary['categories']
+        if categories:
+            rows.append("По категориям:")
+            for category_id, entry in sorted(categories.items()):
+                label = app.facets.category_labels.get(category_id, "Без категории")
+                score = f"средний балл {entry['average_score']:.1f}, " if entry['tests'] else ""
+                rows.append(f"{label}: {score}глав {entry['chapters']}")
+
+        for text in rows:
+            label = MDLabel(text=text, size_hint_y=None, height=dp(28))
+            label.stats_row = True
+            container.add_widget(label)
+        Logger.debug(f"StatisticsScreen: агрегаты посчитаны за {summary['compute_ms']} мс")
+
 class ControlTestScreen(Screen, DialogMixin):
     def on_pre_enter(self):
         self.load_test()
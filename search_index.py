@@ -0,0 +1,238 @@
+# search_index.py - локальный полнотекстовый поиск по курсам, главам и содержимому глав
+import bisect
+import functools
+import heapq
+import math
+import re
+import threading
+from concurrent.futures import Future, ThreadPoolExecutor
+from typing import Dict, Any, Iterable, List, Optional, Tuple
+import catalog
+
+_WORD_RE = re.compile(r'[0-9a-zа-я]+')
+
+STOP_WORDS = frozenset((
+    'и', 'в', 'во', 'не', 'что', 'он', 'на', 'я', 'с', 'со', 'как', 'а', 'то', 'все', 'она',
+    'так', 'его', 'но', 'да', 'ты', 'к', 'у', 'же', 'вы', 'за', 'бы', 'по', 'ее', 'мне',
+    'было', 'вот', 'от', 'меня', 'еще', 'нет', 'о', 'из', 'ему', 'для', 'при', 'это', 'или',
+    'the', 'a', 'an', 'and', 'or', 'of', 'to', 'in', 'on', 'for', 'is',
+))
+
+# Окончания русских слов, отбрасываемые при нормализации (сначала самые длинные)
+_SUFFIXES = frozenset((
+    'ями', 'ами', 'ого', 'его', 'ому', 'ему', 'ыми', 'ими', 'иях', 'ией', 'ием', 'ать', 'ять',
+    'ить', 'ешь', 'ишь', 'ете', 'ите', 'ние', 'ния', 'нию',
+    'ая', 'яя', 'ое', 'ее', 'ые', 'ие', 'ой', 'ей', 'ий', 'ый', 'ом', 'ем', 'ам', 'ям', 'ах',
+    'ях', 'ов', 'ев', 'ую', 'юю', 'ия', 'ью',
+    'а', 'я', 'о', 'е', 'ы', 'и', 'у', 'ю', 'ь', 'й',
+))
+_SUFFIX_LENGTHS = sorted({len(suffix) for suffix in _SUFFIXES}, reverse=True)
+_MIN_STEM = 3
+
+# Вес полей документа при ранжировании
+FIELD_WEIGHTS = {'title': 3.0, 'description': 1.0, 'content': 0.5}
+
+# Сколько терминов разворачивает один префикс запроса
+MAX_PREFIX_TERMS = 200
+
+DocKey = Tuple[str, int]
+
+def normalize(text: str) -> str:
+    return text.lower().replace('ё', 'е')
+
+@functools.lru_cache(maxsize=65536)
+def stem(word: str) -> str:
+    """Отбрасывает окончание русского слова, оставляя основу не короче _MIN_STEM"""
+    if word.isascii():
+        return word
+    for length in _SUFFIX_LENGTHS:
+        if len(word) - length >= _MIN_STEM and word[-length:] in _SUFFIXES:
+            return word[:-length]
+    return word
+
+def tokenize(text: Optional[str]) -> List[str]:
+    """Разбивает текст на нормализованные основы слов без стоп-слов"""
+    if not text:
+        return []
+    return [stem(word) for word in _WORD_RE.findall(normalize(text)) if word not in STOP_WORDS]
+
+def _term_weights(fields: Dict[str, Optional[str]]) -> Dict[str, float]:
+    weights: Dict[str, float] = {}
+    for field, text in fields.items():
+        counts: Dict[str, int] = {}
+        for term in tokenize(text):
+            counts[term] = counts.get(term, 0) + 1
+        field_weight = FIELD_WEIGHTS.get(field, 1.0)
+        for term, count in counts.items():
+            weights[term] = weights.get(term, 0.0) + field_weight * (1 + math.log(count))
+    return weights
+
+class SearchIndex:
+    """Инкрементальный инвертированный индекс с поиском по префиксу.
+
+    Документы - курсы (название, описание) и главы (название, текст содержимого).
+    Обновления из CatalogCache выполняются в отдельном потоке, поиск вызывается
+    из главного потока и держит блокировку только на время подсчета результатов.
+    """
+
+    def __init__(self):
+        self._postings: Dict[str, Dict[DocKey, float]] = {}
+        self._terms: List[str] = []  # отсортированный словарь для поиска по префиксу
+        self._doc_terms: Dict[DocKey, Dict[str, float]] = {}
+        self._doc_fields: Dict[DocKey, Dict[str, Optional[str]]] = {}
+        self._docs: Dict[DocKey, Dict[str, Any]] = {}
+        self._lock = threading.RLock()
+        self._executor: Optional[ThreadPoolExecutor] = None
+
+    def __len__(self):
+        return len(self._docs)
+
+    # --- Обновление индекса ---
+
+    def attach(self, catalog_cache: 'catalog.CatalogCache'):
+        """Подписывает индекс на изменения кэша и индексирует уже загруженные данные"""
+        catalog_cache.subscribe(self._on_catalog_change)
+        self._on_catalog_change(catalog.COURSES, list(catalog_cache.courses.values()))
+        self._on_catalog_change(catalog.CHAPTERS, list(catalog_cache.chapters.values()))
+        self._on_catalog_change(catalog.CHAPTER_DETAIL, list(catalog_cache.chapter_details.values()))
+
+    def _on_catalog_change(self, kind: str, items: List[Any]):
+        handlers = {
+            catalog.COURSES: self.index_courses,
+            catalog.COURSES_REMOVED: self.remove_courses,
+            catalog.CHAPTERS: self.index_chapters,
+            catalog.CHAPTER_DETAIL: self.index_chapter_details,
+        }
+        handler = handlers.get(kind)
+        if handler and items:
+            self.submit(handler, items)
+
+    def submit(self, fn, *args) -> Future:
+        """Выполняет обновление в потоке индекса (обновления применяются по порядку)"""
+        if self._executor is None:
+            self._executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix='search-index')
+        return self._executor.submit(fn, *args)
+
+    def flush(self, timeout: Optional[float] = None):
+        """Дожидается применения всех отправленных обновлений"""
+        if self._executor is not None:
+            self._executor.submit(lambda: None).result(timeout)
+
+    def close(self):
+        if self._executor is not None:
+            self._executor.shutdown(wait=False)
+            self._executor = None
+
+    def index_courses(self, courses: Iterable[Dict[str, Any]]):
+        for course in courses:
+            self._update_doc(('course', course['id']),
+                             {'title': course.get('title'), 'description': course.get('description')},
+                             {'kind': 'course', 'id': course['id'], 'course_id': course['id'],
+                              'title': course.get('title', '')})
+
+    def index_chapters(self, chapters: Iterable[Dict[str, Any]]):
+        for chapter in chapters:
+            key = ('chapter', chapter['id'])
+            self._update_doc(key, {'title': chapter.get('title')},
+                             {'kind': 'chapter', 'id': chapter['id'], 'course_id': chapter.get('course_id'),
+                              'title': chapter.get('title', '')})
+
+    def index_chapter_details(self, details: Iterable[Dict[str, Any]]):
+        for detail in details:
+            content = detail.get('content') or {}
+            key = ('chapter', detail['id'])
+            meta = {'kind': 'chapter', 'id': detail['id'], 'title': detail.get('title', '')}
+            if detail.get('course_id') is not None:
+                meta['course_id'] = detail['course_id']
+            self._update_doc(key, {'title': detail.get('title'), 'content': content.get('text')}, meta)
+
+    def remove_courses(self, course_ids: Iterable[int]):
+        """Удаляет курсы вместе с их главами"""
+        course_ids = set(course_ids)
+        with self._lock:
+            keys = [key for key, meta in self._docs.items() if meta.get('course_id') in course_ids]
+            for key in keys:
+                self._remove_doc(key)
+
+    def _update_doc(self, key: DocKey, fields: Dict[str, Optional[str]], meta: Dict[str, Any]):
+        # Разбор текста выполняется без блокировки, под ней только замена постингов
+        merged = {**self._doc_fields.get(key, {}), **{k: v for k, v in fields.items() if v is not None}}
+        weights = _term_weights(merged)
+        with self._lock:
+            old_weights = self._doc_terms.get(key, {})
+            for term in old_weights.keys() - weights.keys():
+                self._remove_posting(term, key)
+            for term, weight in weights.items():
+                postings = self._postings.get(term)
+                if postings is None:
+                    postings = self._postings[term] = {}
+                    bisect.insort(self._terms, term)
+                postings[key] = weight
+            self._doc_terms[key] = weights
+            self._doc_fields[key] = merged
+            self._docs[key] = {**self._docs.get(key, {}), **meta}
+
+    def _remove_doc(self, key: DocKey):
+        for term in self._doc_terms.pop(key, {}):
+            self._remove_posting(term, key)
+        self._doc_fields.pop(key, None)
+        self._docs.pop(key, None)
+
+    def _remove_posting(self, term: str, key: DocKey):
+        postings = self._postings.get(term)
+        if postings is None:
+            return
+        postings.pop(key, None)
+        if not postings:
+            del self._postings[term]
+            index = bisect.bisect_left(self._terms, term)
+            if index < len(self._terms) and self._terms[index] == term:
+                del self._terms[index]
+
+    # --- Поиск ---
+
+    def _expand(self, token: str, prefix: bool) -> List[str]:
+        if not prefix:
+            return [token] if token in self._postings else []
+        start = bisect.bisect_left(self._terms, token)
+        terms = []
+        for term in self._terms[start:start + MAX_PREFIX_TERMS]:
+            if not term.startswith(token):
+                break
+            terms.append(term)
+        return terms
+
+    def search(self, query: str, limit: int = 20, kinds: Optional[Iterable[str]] = None) -> List[Dict[str, Any]]:
+        """Документы, содержащие все слова запроса; последнее слово ищется по префиксу"""
+        tokens = tokenize(query)
+        if not tokens:
+            return []
+        kinds = set(kinds) if kinds else None
+        with self._lock:
+            total = len(self._docs) or 1
+            scores: Optional[Dict[DocKey, float]] = None
+            for position, token in enumerate(tokens):
+                token_scores: Dict[DocKey, float] = {}
+                for term in self._expand(token, prefix=position == len(tokens) - 1):
+                    postings = self._postings[term]
+                    idf = math.log(1 + total / len(postings))
+                    for key, weight in postings.items():
+                        if scores is not None and key not in scores:
+                            continue
+                        score = weight * idf
+                        if score > token_scores.get(key, 0.0):
+                            token_scores[key] = score
+                if scores is None:
+                    scores = token_scores
+                else:
+                    scores = {key: scores[key] + score for key, score in token_scores.items()}
+                if not scores:
+                    return []
+            if kinds is not None:
+                scores = {key: score for key, score in scores.items() if key[0] in kinds}
+            best = heapq.nlargest(limit, scores.items(), key=lambda item: item[1])
+            return [{**self._docs[key], 'score': round(score, 3)} for key, score in best]
+
+    def stats(self) -> Dict[str, int]:
+        with self._lock:
+            return {'documents': len(self._docs), 'terms': len(self._terms)}
@@ -0,0 +1,71 @@
+# snapshot.py - снимок данных главного экрана для мгновенной отрисовки при запуске
+import json
+import os
+import time
+from typing import Optional, Dict, Any, List
+from kivy.logger import Logger
+
+SNAPSHOT_VERSION = 1
+
+# Поля, которые нужны для отрисовки списков и перехода к курсу/тесту
+COURSE_FIELDS = ('id', 'title', 'description', 'category_id', 'is_subscribed', 'progress_percentage')
+TEST_FIELDS = ('id', 'title', 'is_completed', 'result')
+
+def compact_items(items: List[Dict[str, Any]], fields: tuple) -> List[Dict[str, Any]]:
+    """Оставляет только поля, используемые при отрисовке"""
+    return [{key: item[key] for key in fields if key in item} for item in items]
+
+class UISnapshotStore:
+    """Компактный снимок последних успешно загруженных курсов и тестов"""
+
+    def __init__(self, path: str):
+        self.path = path
+
+    @staticmethod
+    def _user_key(user: Optional[Dict[str, Any]]) -> Optional[str]:
+        if not user:
+            return None
+        return str(user.get('id') or user.get('username'))
+
+    def save(self, user: Optional[Dict[str, Any]], courses: Optional[List[Dict[str, Any]]],
+             tests: Optional[List[Dict[str, Any]]]):
+        """Сохраняет снимок атомарной заменой файла"""
+        user_key = self._user_key(user)
+        if user_key is None or (courses is None and tests is None):
+            return
+        data = {
+            "version": SNAPSHOT_VERSION,
+            "user": user_key,
+            "saved_at": time.time(),
+            "courses": compact_items(courses or [], COURSE_FIELDS),
+            "tests": compact_items(tests or [], TEST_FIELDS),
+        }
+        try:
+            tmp_path = f"{self.path}.tmp"
+            with open(tmp_path, 'w', encoding='utf-8') as f:
+                json.dump(data, f, ensure_ascii=False, separators=(',', ':'))
+            os.replace(tmp_path, self.path)
+        except Exception as e:
+            Logger.warning(f"UISnapshot: не удалось сохранить снимок: {e}")
+
+    def load(self, user: Optional[Dict[str, Any]]) -> Optional[Dict[str, Any]]:
+        """Загружает снимок текущего пользователя (None, если его нет или он чужой)"""
+        user_key = self._user_key(user)
+        if user_key is None or not os.path.exists(self.path):
+            return None
+        try:
+            with open(self.path, encoding='utf-8') as f:
+                data = json.load(f)
+        except Exception as e:
+            Logger.warning(f"UISnapshot: снимок поврежден: {e}")
+            return None
+        if data.get("version") != SNAPSHOT_VERSION or data.get("user") != user_key:
+            return None
+        return data
+
+    def clear(self):
+        try:
+            if os.path.exists(self.path):
+                os.remove(self.path)
+        except OSError as e:
+            Logger.warning(f"UISnapshot: не удалось удалить снимок: {e}")
@@ -0,0 +1,85 @@
+# startup.py - замер времени запуска: разбивка импортов и контрольные точки до первого кадра
+import builtins
+import json
+import os
+import sys
+import time
+from collections import defaultdict
+from typing import Dict, Any, List, Optional
+
+_process_start = time.perf_counter()
+_enabled = False
+_original_import = None
+_stack: List[List[Any]] = []
+_import_self: Dict[str, float] = defaultdict(float)
+_import_total: Dict[str, float] = {}
+_marks: List[tuple] = []
+
+def is_enabled() -> bool:
+    return _enabled
+
+def begin():
+    """Включает замер, если задана переменная окружения EDUAPP_STARTUP_PROFILE"""
+    global _enabled, _original_import
+    if _enabled or not os.environ.get('EDUAPP_STARTUP_PROFILE'):
+        return
+    _enabled = True
+    _original_import = builtins.__import__
+    builtins.__import__ = _timed_import
+    mark("profile_begin")
+
+def _timed_import(name, globals=None, locals=None, fromlist=(), level=0):
+    # Замеряем только первую загрузку модуля, повторные импорты берутся из sys.modules
+    if level != 0 or name in sys.modules:
+        return _original_import(name, globals, locals, fromlist, level)
+
+    _stack.append([name, time.perf_counter(), 0.0])
+    try:
+        return _original_import(name, globals, locals, fromlist, level)
+    finally:
+        entry_name, started, children = _stack.pop()
+        elapsed = time.perf_counter() - started
+        _import_total[entry_name] = elapsed
+        _import_self[entry_name] += max(elapsed - children, 0)
+        if _stack:
+            _stack[-1][2] += elapsed
+
+def mark(name: str):
+    """Контрольная точка запуска (время отсчитывается от импорта этого модуля)"""
+    if _enabled:
+        _marks.append((name, time.perf_counter()))
+
+def finish():
+    """Снимает перехват импортов"""
+    global _enabled
+    if _enabled and _original_import is not None:
+        builtins.__import__ = _original_import
+    _enabled = False
+
+def report(top: int = 25) -> Dict[str, Any]:
+    """Разбивка времени запуска: контрольные точки, пакеты и самые медленные модули"""
+    packages: Dict[str, float] = defaultdict(float)
+    for name, elapsed in _import_self.items():
+        packages[name.split('.', 1)[0]] += elapsed
+
+    slowest = sorted(_import_self.items(), key=lambda item: -item[1])[:top]
+    return {
+        "marks_ms": {name: round((at - _process_start) * 1000, 1) for name, at in _marks},
+        "imports_total_ms": round(sum(_import_self.values()) * 1000, 1),
+        "packages_ms": {name: round(elapsed * 1000, 1)
+                        for name, elapsed in sorted(packages.items(), key=lambda item: -item[1])[:top]},
+        "modules": [
+            {"module": name, "self_ms": round(elapsed * 1000, 2),
+             "total_ms": round(_import_total.get(name, 0) * 1000, 2)}
+            for name, elapsed in slowest
+        ],
+    }
+
+def save_report(path: Optional[str] = None):
+    """Сохраняет отчет в JSON (путь из EDUAPP_STARTUP_PROFILE, если это не '1')"""
+    if path is None:
+        value = os.environ.get('EDUAPP_STARTUP_PROFILE', '')
+        path = value if value not in ('', '1') else 'startup_profile.json'
+    with open(path, 'w', encoding='utf-8') as f:
+        json.dump(report(), f, ensure_ascii=False, indent=2)
+    return path
@@ -0,0 +1,497 @@
+# stub_server.py - локальная заглушка Django Ninja API для бенчмарков и нагрузочных прогонов
+import hashlib
+import json
+import math
+import random
+import re
+import threading
+import time
+import struct
+import zlib
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from typing import Callable, Dict, Any, List, Optional, Tuple
+from urllib.parse import urlsplit
+
+API_PREFIX = "/api/v1"
+
+class StubConfig:
+    """Параметры поведения заглушки"""
+
+    def __init__(self, latency: float = 0.0, jitter: float = 0.0, error_rate: float = 0.0,
+                 courses: int = 20, chapters_per_course: int = 10, tasks_per_test: int = 5,
+                 content_size: int = 2000, media_size: int = 64 * 1024, seed: int = 42,
+                 event_history: int = 1000, event_keepalive: float = 15.0,
+                 rate_limit: Optional[int] = None, rate_window: float = 1.0, etags: bool = True,
+                 course_images: bool = False):
+        self.latency = latency
+        self.jitter = jitter
+        self.error_rate = error_rate
+        self.courses = courses
+        self.chapters_per_course = chapters_per_course
+        self.tasks_per_test = tasks_per_test
+        self.content_size = content_size
+        self.media_size = media_size
+        self.seed = seed
+        self.event_history = event_history
+        self.event_keepalive = event_keepalive
+        # Квота запросов пользователя на окно rate_window секунд (None - без ограничений)
+        self.rate_limit = rate_limit
+        self.rate_window = rate_window
+        # ETag и ответ 304 на If-None-Match для GET (как ConditionalGetMiddleware в Django)
+        self.etags = etags
+        # Поле image в курсах; в моделях Django обложек нет, поэтому по умолчанию выключено
+        self.course_images = course_images
+
+class StubResponse:
+    """Ответ обработчика заглушки"""
+
+    def __init__(self, status: int = 200, body: Any = None, headers: Optional[Dict[str, str]] = None,
+                 raw: Optional[bytes] = None, content_type: str = 'application/json'):
+        self.status = status
+        self.body = body
+        self.headers = headers or {}
+        self.raw = raw
+        self.content_type = content_type
+
+    def encode(self) -> bytes:
+        if self.raw is not None:
+            return self.raw
+        if self.body is None:
+            return b''
+        return json.dumps(self.body, ensure_ascii=False).encode('utf-8')
+
+Handler = Callable[['StubAPIServer', re.Match, Dict[str, Any]], StubResponse]
+
+class StubAPIServer:
+    """Многопоточный HTTP сервер, имитирующий /auth, /courses, /chapters, /tests, /progress, /media, /events, /batch"""
+
+    def __init__(self, config: Optional[StubConfig] = None, host: str = '127.0.0.1', port: int = 0):
+        self.config = config or StubConfig()
+        self.host = host
+        self.port = port
+        self.requests_served = 0
+        self.batched_requests = 0
+        self.throttled = 0
+        self.not_modified = 0
+        self._rate_windows: Dict[str, List[float]] = {}
+        self._routes: List[Tuple[str, re.Pattern, Handler]] = []
+        self._random = random.Random(self.config.seed)
+        self._lock = threading.Lock()
+        self._httpd: Optional[ThreadingHTTPServer] = None
+        self._thread: Optional[threading.Thread] = None
+        self._completed_chapters: Dict[str, set] = {}
+        # Журнал событий для потока /events/: (id, событие, данные, пользователь или None)
+        self._events: List[Tuple[int, str, Any, Optional[str]]] = []
+        self._event_id = 0
+        self._events_changed = threading.Condition()
+        self._stopping = False
+        self._register_default_routes()
+
+    @property
+    def base_url(self) -> str:
+        return f"http://{self.host}:{self.port}"
+
+    def route(self, method: str, pattern: str):
+        """Декоратор для регистрации обработчика (pattern - regex пути без /api/v1)"""
+        def decorator(handler: Handler) -> Handler:
+            self._routes.append((method, re.compile(f"^{pattern}$"), handler))
+            return handler
+        return decorator
+
+    def start(self) -> 'StubAPIServer':
+        """Запуск сервера в фоновом потоке"""
+        server = self
+        self._stopping = False
+
+        class RequestHandler(BaseHTTPRequestHandler):
+            protocol_version = 'HTTP/1.1'
+
+            def log_message(self, format, *args):
+                pass
+
+            def do_GET(self):
+                server._handle(self, 'GET')
+
+            def do_POST(self):
+                server._handle(self, 'POST')
+
+        self._httpd = ThreadingHTTPServer((self.host, self.port), RequestHandler)
+        self._httpd.daemon_threads = True
+        self.port = self._httpd.server_address[1]
+        self._thread = threading.Thread(target=self._httpd.serve_forever, name="stub-api", daemon=True)
+        self._thread.start()
+        return self
+
+    def stop(self):
+        """Остановка сервера"""
+        with self._events_changed:
+            self._stopping = True
+            self._events_changed.notify_all()
+        if self._httpd is not None:
+            self._httpd.shutdown()
+            self._httpd.server_close()
+            self._httpd = None
+
+    def __enter__(self):
+        return self.start()
+
+    def __exit__(self, *exc):
+        self.stop()
+
+    # Поток событий
+    def publish(self, event: str, data: Any, user: Optional[str] = None) -> int:
+        """Публикация события в поток /events/ (user - значение Authorization получателя)"""
+        with self._events_changed:
+            self._event_id += 1
+            self._events.append((self._event_id, event, data, user))
+            del self._events[:-self.config.event_history]
+            self._events_changed.notify_all()
+            return self._event_id
+
+    def _stream_events(self, request: Dict[str, Any]):
+        """Отдает события с id больше Last-Event-ID, пока клиент или сервер не закроет соединение"""
+        handler = request["handler"]
+        user = self._user_key(request)
+        last_id = request["headers"].get('Last-Event-ID')
+        last_id = int(last_id) if last_id and last_id.isdigit() else None
+        handler.send_response(200)
+        handler.send_header('Content-Type', 'text/event-stream')
+        handler.send_header('Cache-Control', 'no-cache')
+        handler.send_header('Connection', 'close')
+        handler.end_headers()
+        handler.close_connection = True
+        try:
+            with self._events_changed:
+                if last_id is None:
+                    last_id = self._event_id
+                elif self._events and last_id < self._events[0][0] - 1:
+                    # Пропущенные события уже вытеснены из журнала
+                    handler.wfile.write(f"id: {self._event_id}\nevent: reset\ndata: {{}}\n\n".encode())
+                    last_id = self._event_id
+            handler.wfile.write(b"retry: 1000\n\n")
+            handler.wfile.flush()
+            while True:
+                with self._events_changed:
+                    pending = [item for item in self._events if item[0] > last_id]
+                    if not pending and not self._stopping:
+                        self._events_changed.wait(self.config.event_keepalive)
+                        pending = [item for item in self._events if item[0] > last_id]
+                    if self._stopping:
+                        return
+                if not pending:
+                    handler.wfile.write(b": ping\n\n")
+                for event_id, event, data, recipient in pending:
+                    last_id = event_id
+                    if recipient is None or recipient == user:
+                        payload = json.dumps(data, ensure_ascii=False)
+                        handler.wfile.write(f"id: {event_id}\nevent: {event}\ndata: {payload}\n\n".encode('utf-8'))
+                handler.wfile.flush()
+        except (BrokenPipeError, ConnectionResetError):
+            pass
+
+    # Обработка запросов
+    def _handle(self, handler: BaseHTTPRequestHandler, method: str):
+        url = urlsplit(handler.path)
+        path = url.path
+        length = int(handler.headers.get('Content-Length') or 0)
+        raw_body = handler.rfile.read(length) if length else b''
+        request = {
+            "headers": handler.headers,
+            "query": url.query,
+            "json": json.loads(raw_body) if raw_body else None,
+            "handler": handler,
+        }
+
+        with self._lock:
+            self.requests_served += 1
+            delay = max(self.config.latency + self._random.uniform(-self.config.jitter, self.config.jitter), 0)
+            fail = self._random.random() < self.config.error_rate
+        if delay:
+            time.sleep(delay)
+
+        limit_headers = self._rate_limit(request) if self.config.rate_limit else None
+        if fail:
+            response = StubResponse(500, {"detail": "Injected error"})
+        elif limit_headers and 'Retry-After' in limit_headers:
+            response = StubResponse(429, {"detail": "Too many requests"}, headers=limit_headers)
+        else:
+            response = self._dispatch(method, path, request)
+            if response is not None and limit_headers:
+                response.headers = {**limit_headers, **response.headers}
+        if response is None:
+            # Обработчик сам записал ответ (например, потоковый)
+            return
+
+        payload = response.encode()
+        if method == 'GET' and response.status == 200 and self.config.etags:
+            etag = f'"{hashlib.blake2b(payload, digest_size=16).hexdigest()}"'
+            response.headers = {**response.headers, 'ETag': etag}
+            if request["headers"].get('If-None-Match') == etag:
+                with self._lock:
+                    self.not_modified += 1
+                response.status, payload = 304, b''
+        handler.send_response(response.status)
+        handler.send_header('Content-Type', response.content_type)
+        handler.send_header('Content-Length', str(len(payload)))
+        for name, value in response.headers.items():
+            handler.send_header(name, value)
+        handler.end_headers()
+        handler.wfile.write(payload)
+
+    def _rate_limit(self, request: Dict[str, Any]) -> Dict[str, str]:
+        """Квота на пользователя в фиксированном окне: заголовки X-RateLimit-* и Retry-After при превышении"""
+        limit, window = self.config.rate_limit, self.config.rate_window
+        now = time.monotonic()
+        with self._lock:
+            state = self._rate_windows.get(self._user_key(request))
+            if state is None or now >= state[0]:
+                state = self._rate_windows[self._user_key(request)] = [now + window, 0]
+            allowed = state[1] < limit
+            if allowed:
+                state[1] += 1
+            else:
+                self.throttled += 1
+            remaining, reset = limit - state[1], state[0] - now
+        headers = {
+            'X-RateLimit-Limit': str(limit),
+            'X-RateLimit-Remaining': str(remaining),
+            'X-RateLimit-Reset': f"{reset:.3f}",
+        }
+        if not allowed:
+            headers['Retry-After'] = str(max(math.ceil(reset), 1))
+        return headers
+
+    def _dispatch(self, method: str, path: str, request: Dict[str, Any]) -> Optional[StubResponse]:
+        if not path.startswith(API_PREFIX):
+            return StubResponse(404, {"detail": "Not found"})
+        path = path[len(API_PREFIX):]
+        for route_method, pattern, route_handler in reversed(self._routes):
+            if route_method != method:
+                continue
+            match = pattern.match(path)
+            if match:
+                return route_handler(self, match, request)
+        return StubResponse(404, {"detail": "Not found"})
+
+    # Генерация данных
+    def _text(self, size: int, seed: int) -> str:
+        words = ["курс", "глава", "python", "функция", "переменная", "цикл", "класс", "объект",
+                 "модуль", "тест", "данные", "алгоритм", "список", "словарь", "строка"]
+        rnd = random.Random(seed)
+        parts: List[str] = []
+        total = 0
+        while total < size:
+            sentence = " ".join(rnd.choice(words) for _ in range(rnd.randint(6, 14))).capitalize() + "."
+            parts.append(sentence)
+            total += len(sentence) + 1
+            if rnd.random() < 0.2:
+                parts.append("\n\n")
+        return " ".join(parts)[:size]
+
+    def _user_key(self, request: Dict[str, Any]) -> str:
+        return request["headers"].get('Authorization', 'anonymous')
+
+    def course(self, course_id: int, request: Dict[str, Any]) -> Dict[str, Any]:
+        completed = self._completed_chapters.get(self._user_key(request), set())
+        chapter_ids = self.chapter_ids(course_id)
+        done = sum(1 for chapter_id in chapter_ids if chapter_id in completed)
+        data = {
+            "id": course_id,
+            "title": f"Курс {course_id}",
+            "description": self._text(300, course_id),
+            "status": "published",
+            "category_id": course_id % 5 + 1,
+            "is_subscribed": course_id % 2 == 0,
+            "progress_percentage": 100.0 * done / len(chapter_ids) if chapter_ids else 0.0,
+        }
+        if self.config.course_images:
+            data["image"] = f"{API_PREFIX}/media/course/{course_id}/image/"
+        return data
+
+    def chapter_ids(self, course_id: int) -> List[int]:
+        per_course = self.config.chapters_per_course
+        return [course_id * 1000 + index for index in range(1, per_course + 1)]
+
+    def chapter(self, chapter_id: int, request: Dict[str, Any], detail: bool = False) -> Dict[str, Any]:
+        completed = self._completed_chapters.get(self._user_key(request), set())
+        data = {
+            "id": chapter_id,
+            "title": f"Глава {chapter_id % 1000}",
+            "course_id": chapter_id // 1000,
+            "is_completed": chapter_id in completed,
+            "has_test": chapter_id % 2 == 1,
+        }
+        if detail:
+            data["content"] = {
+                "id": chapter_id,
+                "text": self._text(self.config.content_size, chapter_id),
+                "video": "video.mp4" if chapter_id % 3 == 0 else None,
+                "files": None,
+            }
+        return data
+
+    def course_image(self, course_id: int, width: int = 320, height: int = 240) -> bytes:
+        """Однотонная PNG обложка курса"""
+        rnd = random.Random(course_id)
+        pixel = bytes(rnd.randrange(256) for _ in range(3))
+        rows = b''.join(b'\0' + pixel * width for _ in range(height))
+
+        def chunk(kind: bytes, data: bytes) -> bytes:
+            return struct.pack('>I', len(data)) + kind + data + struct.pack('>I', zlib.crc32(kind + data))
+
+        return (b'\x89PNG\r\n\x1a\n'
+                + chunk(b'IHDR', struct.pack('>IIBBBBB', width, height, 8, 2, 0, 0, 0))
+                + chunk(b'IDAT', zlib.compress(rows))
+                + chunk(b'IEND', b''))
+
+    def test(self, test_id: int, title: str) -> Dict[str, Any]:
+        return {
+            "id": test_id,
+            "title": title,
+            "tasks": [
+                {
+                    "id": test_id * 100 + index,
+                    "question": self._text(120, test_id * 100 + index),
+                    "is_multiple_choice": index % 2 == 0,
+                    "answers": [{"id": (test_id * 100 + index) * 10 + a, "text": f"Ответ {a}"} for a in range(4)],
+                }
+                for index in range(self.config.tasks_per_test)
+            ],
+        }
+
+    def _register_default_routes(self):
+        route = self.route
+
+        @route('POST', r'/batch/')
+        def batch(server, match, request):
+            # Вложенные запросы выполняются обработчиками заглушки с заголовками пакета
+            responses = []
+            for item in (request["json"] or {}).get("requests", []):
+                sub_request = {**request, "json": item.get("body"), "query": ""}
+                path = urlsplit(item.get("path", "")).path
+                response = server._dispatch(item.get("method", "GET"), f"{API_PREFIX}{path}", sub_request)
+                responses.append({"id": item.get("id"), "status": response.status if response else 500,
+                                  "body": response.body if response else None})
+            with server._lock:
+                server.batched_requests += len(responses)
+            return StubResponse(200, {"responses": responses})
+
+        @route('GET', r'/health/')
+        def health(server, match, request):
+            return StubResponse(200, {"status": "ok"})
+
+        @route('POST', r'/auth/login/')
+        def login(server, match, request):
+            username = (request["json"] or {}).get("username", "student")
+            return StubResponse(200, {
+                "access": f"access-{username}",
+                "refresh": f"refresh-{username}",
+                "user": {"id": abs(hash(username)) % 100000, "username": username,
+                         "first_name": username, "last_name": "", "role": "student"},
+            })
+
+        @route('POST', r'/auth/register/')
+        def register(server, match, request):
+            return StubResponse(201, {"message": "ok"})
+
+        @route('POST', r'/auth/refresh/')
+        def refresh(server, match, request):
+            token = (request["json"] or {}).get("refresh", "")
+            return StubResponse(200, {"access": token.replace("refresh-", "access-", 1)})
+
+        @route('POST', r'/auth/logout/')
+        def logout(server, match, request):
+            return StubResponse(200, {"success": True})
+
+        @route('GET', r'/auth/me/')
+        def me(server, match, request):
+            if 'Authorization' not in request["headers"]:
+                return StubResponse(401, {"detail": "Unauthorized"})
+            username = request["headers"]['Authorization'].split('access-', 1)[-1]
+            return StubResponse(200, {"id": 1, "username": username, "first_name": username})
+
+        @route('GET', r'/courses/')
+        def courses(server, match, request):
+            return StubResponse(200, [server.course(course_id, request)
+                                      for course_id in range(1, server.config.courses + 1)])
+
+        @route('GET', r'/courses/(\d+)/')
+        def course_detail(server, match, request):
+            return StubResponse(200, server.course(int(match.group(1)), request))
+
+        @route('POST', r'/courses/(\d+)/subscribe/')
+        def subscribe(server, match, request):
+            return StubResponse(200, {"success": True})
+
+        @route('GET', r'/chapters/course/(\d+)/')
+        def chapters(server, match, request):
+            course_id = int(match.group(1))
+            return StubResponse(200, [server.chapter(chapter_id, request)
+                                      for chapter_id in server.chapter_ids(course_id)])
+
+        @route('GET', r'/chapters/(\d+)/')
+        def chapter_detail(server, match, request):
+            return StubResponse(200, server.chapter(int(match.group(1)), request, detail=True))
+
+        @route('POST', r'/chapters/(\d+)/complete/')
+        def complete(server, match, request):
+            chapter_id = int(match.group(1))
+            user = server._user_key(request)
+            with server._lock:
+                server._completed_chapters.setdefault(user, set()).add(chapter_id)
+            # Другие устройства пользователя узнают о завершении из потока событий
+            server.publish('chapter_completed', {"chapter_id": chapter_id, "course_id": chapter_id // 1000}, user)
+            return StubResponse(200, {"success": True})
+
+        @route('GET', r'/tests/chapter/(\d+)/')
+        def chapter_test(server, match, request):
+            return StubResponse(200, server.test(int(match.group(1)), "Тест для самопроверки"))
+
+        @route('POST', r'/tests/chapter/(\d+)/submit/')
+        def submit_chapter_test(server, match, request):
+            answers = (request["json"] or {}).get("answers", {})
+            return StubResponse(200, {"score": len(answers), "max_score": server.config.tasks_per_test})
+
+        @route('GET', r'/tests/control/')
+        def control_tests(server, match, request):
+            return StubResponse(200, [{"id": test_id, "title": f"Контрольный тест {test_id}",
+                                       "is_completed": False, "result": None} for test_id in range(1, 6)])
+
+        @route('GET', r'/tests/control/(\d+)/')
+        def control_test(server, match, request):
+            return StubResponse(200, server.test(int(match.group(1)), "Контрольный тест"))
+
+        @route('POST', r'/tests/control/(\d+)/submit/')
+        def submit_control_test(server, match, request):
+            test_id = int(match.group(1))
+            answers = (request["json"] or {}).get("answers", {})
+            server.publish('control_test', {"id": test_id, "title": f"Контрольный тест {test_id}",
+                                            "is_completed": True, "result": len(answers),
+                                            "max_score": server.config.tasks_per_test},
+                           server._user_key(request))
+            return StubResponse(200, {"result": len(answers), "max_score": server.config.tasks_per_test})
+
+        @route('GET', r'/progress/courses/')
+        def course_progress(server, match, request):
+            return StubResponse(200, [{"course_id": course_id,
+                                       "progress_percentage": server.course(course_id, request)["progress_percentage"]}
+                                      for course_id in range(1, server.config.courses + 1)])
+
+        @route('GET', r'/progress/statistics/')
+        def statistics(server, match, request):
+            completed = server._completed_chapters.get(server._user_key(request), set())
+            return StubResponse(200, {"completed_chapters": len(completed), "courses": server.config.courses})
+
+        @route('GET', r'/events/')
+        def events(server, match, request):
+            server._stream_events(request)
+            return None
+
+        @route('GET', r'/media/course/(\d+)/image/')
+        def course_image(server, match, request):
+            return StubResponse(200, raw=server.course_image(int(match.group(1))), content_type='image/png')
+
+        @route('GET', r'/media/(video|file)/(\d+)/')
+        def media(server, match, request):
+            return StubResponse(200, raw=b'\0' * server.config.media_size,
+                                content_type='application/octet-stream')
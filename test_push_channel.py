@@ -0,0 +1,161 @@
+# test_push_channel.py - PushChannel против локальной заглушки API (поток /events/)
+import asyncio
+import time
+
+import pytest
+
+import push_channel
+from api_client import APIClient, MemoryTokenStore
+from catalog import CatalogCache
+from progress import ProgressEngine
+from push_channel import PushChannel
+from stub_server import StubAPIServer, StubConfig
+
+class RecordingClock:
+    """Вместо главного цикла Kivy: колбэки копятся и выполняются тестом"""
+
+    def __init__(self):
+        self.callbacks = []
+
+    def schedule_once(self, callback, timeout=0):
+        self.callbacks.append(callback)
+
+    def run_pending(self):
+        callbacks, self.callbacks = self.callbacks, []
+        for callback in callbacks:
+            callback(0)
+
+@pytest.fixture
+def clock(monkeypatch):
+    recording = RecordingClock()
+    monkeypatch.setattr(push_channel, 'Clock', recording)
+    return recording
+
+@pytest.fixture
+def server():
+    with StubAPIServer(StubConfig(event_history=5, event_keepalive=0.2)) as stub:
+        yield stub
+
+class Recorder:
+    def __init__(self):
+        self.events = []
+
+    def on_event(self, event, data):
+        self.events.append((event, data))
+
+async def wait_for(condition, timeout=5.0):
+    deadline = time.monotonic() + timeout
+    while not condition():
+        if time.monotonic() > deadline:
+            raise AssertionError("условие не выполнилось за отведенное время")
+        await asyncio.sleep(0.01)
+
+async def connect(channel):
+    task = asyncio.ensure_future(channel._run())
+    await wait_for(lambda: channel.connected)
+    return task
+
+async def disconnect(task):
+    task.cancel()
+    with pytest.raises(asyncio.CancelledError):
+        await task
+
+def make_channel(server, catalog=None, progress=None):
+    api = APIClient(server.base_url, token_store=MemoryTokenStore())
+    channel = PushChannel(api, catalog, progress, min_backoff=0.05, max_backoff=0.1)
+    return api, channel
+
+def test_reconnect_resumes_from_last_event_id(server, clock):
+    catalog = CatalogCache()
+    recorder = Recorder()
+
+    async def scenario():
+        api, channel = make_channel(server, catalog)
+        channel.subscribe(recorder.on_event)
+        await api.login('student', 'password')
+        task = await connect(channel)
+        server.publish('course', {"id": 1, "title": "Первый"})
+        server.publish('course', {"id": 2, "title": "Второй"})
+        await wait_for(lambda: channel.events_received == 2)
+        await disconnect(task)
+        assert channel.last_event_id == '2'
+
+        # Событие, пропущенное без соединения, сервер досылает по Last-Event-ID
+        server.publish('course', {"id": 3, "title": "Третий"})
+        task = await connect(channel)
+        await wait_for(lambda: channel.events_received == 3)
+        await disconnect(task)
+        await api.close()
+        return channel
+
+    channel = asyncio.run(scenario())
+    clock.run_pending()
+    assert channel.last_event_id == '3'
+    assert [data['id'] for event, data in recorder.events] == [1, 2, 3]
+    assert sorted(catalog.courses) == [1, 2, 3]
+
+def test_reset_after_event_log_overflow(server, clock):
+    recorder = Recorder()
+
+    async def scenario():
+        api, channel = make_channel(server)
+        channel.subscribe(recorder.on_event)
+        await api.login('student', 'password')
+        task = await connect(channel)
+        server.publish('course_removed', {"id": 1})
+        await wait_for(lambda: channel.events_received == 1)
+        await disconnect(task)
+
+        # Журнал заглушки хранит 5 событий - пропущенные 10 уже вытеснены
+        for course_id in range(2, 12):
+            server.publish('course_removed', {"id": course_id})
+        task = await connect(channel)
+        await wait_for(lambda: channel.events_received == 2)
+        await disconnect(task)
+        await api.close()
+        return channel
+
+    channel = asyncio.run(scenario())
+    clock.run_pending()
+    assert [event for event, data in recorder.events] == ['course_removed', 'reset']
+    assert channel.last_event_id == '11'
+
+def test_apply_patches_catalog_and_progress(clock):
+    catalog = CatalogCache()
+    progress = ProgressEngine(catalog)
+    recorder = Recorder()
+    channel = PushChannel(None, catalog, progress)
+    channel.subscribe(recorder.on_event)
+
+    catalog.put_courses([{"id": 1, "title": "Курс", "progress_percentage": 0.0},
+                         {"id": 2, "title": "Удаляемый"}])
+    channel._apply('course', {"id": 1, "title": "Курс (обновлен)", "progress_percentage": 0.0})
+    channel._apply('chapters', {"course_id": 1, "chapters": [{"id": 1001, "title": "Глава 1"},
+                                                            {"id": 1002, "title": "Глава 2"}]})
+    channel._apply('chapter_completed', {"chapter_id": 1001, "course_id": 1})
+    channel._apply('progress', {"course_id": 3, "progress_percentage": 40})
+    channel._apply('course_removed', {"id": 2})
+
+    assert catalog.get_course(1)['title'] == "Курс (обновлен)"
+    assert [chapter['id'] for chapter in catalog.get_chapters(1)] == [1001, 1002]
+    assert progress.is_chapter_completed(1001)
+    assert not progress.is_chapter_completed(1002)
+    assert progress.percentage(1) == 50.0
+    assert progress.percentage(3) == 40.0
+    assert catalog.get_course(2) is None
+    assert [event for event, data in recorder.events] == [
+        'course', 'chapters', 'chapter_completed', 'progress', 'course_removed']
+
+def test_apply_skips_malformed_events(clock):
+    catalog = CatalogCache()
+    recorder = Recorder()
+    channel = PushChannel(None, catalog, ProgressEngine(catalog))
+    channel.subscribe(recorder.on_event)
+
+    channel._apply('course', {"title": "без id"})
+    channel._apply('chapters', {"course_id": 1})
+    channel._apply('progress', {"course_id": 1, "progress_percentage": "много"})
+    channel._apply('course_removed', [1])
+
+    assert catalog.courses == {}
+    assert recorder.events == []
@@ -0,0 +1,75 @@
+# text_cache.py - кэш растеризованных абзацев текста глав
+import hashlib
+from collections import OrderedDict
+from typing import Dict, Any, Tuple
+
+# Параметры шрифта, от которых зависит результат растеризации
+FontSpec = Tuple[str, float, Tuple[float, ...], str, bool]
+
+def font_spec(font_name: str = 'Roboto', font_size: float = 16, color=(0, 0, 0, 1),
+              halign: str = 'left', markup: bool = False) -> FontSpec:
+    return font_name, float(font_size), tuple(color), halign, markup
+
+class TextTextureCache:
+    """LRU текстур абзацев с ключом (хэш текста, ширина, параметры шрифта).
+
+    Повторное открытие главы или возврат к прежней ширине экрана берет готовые
+    текстуры без повторной раскладки текста. Работает только в главном потоке.
+    """
+
+    def __init__(self, memory_limit_mb: float = 48):
+        self.memory_limit = int(memory_limit_mb * 1024 * 1024)
+        self.memory_used = 0
+        self.hits = 0
+        self.misses = 0
+        self._textures: 'OrderedDict[tuple, Any]' = OrderedDict()
+
+    @staticmethod
+    def make_key(text: str, width: int, font: FontSpec) -> tuple:
+        digest = hashlib.blake2b(text.encode('utf-8'), digest_size=16).digest()
+        return digest, int(width), font
+
+    def get(self, text: str, width: int, font: FontSpec):
+        """Текстура абзаца заданной ширины (растеризуется при первом обращении)"""
+        key = self.make_key(text, width, font)
+        texture = self._textures.get(key)
+        if texture is not None:
+            self._textures.move_to_end(key)
+            self.hits += 1
+            return texture
+        self.misses += 1
+        texture = self._render(text, width, font)
+        if texture is not None:
+            self._store(key, texture)
+        return texture
+
+    def _render(self, text: str, width: int, font: FontSpec):
+        font_name, font_size, color, halign, markup = font
+        # Как и виджет Label: разметку ([b], [color=...], &bl;) разбирает только MarkupLabel
+        if markup:
+            from kivy.core.text.markup import MarkupLabel as CoreLabel
+        else:
+            from kivy.core.text import Label as CoreLabel
+        label = CoreLabel(text=text, font_name=font_name, font_size=font_size, color=color,
+                          halign=halign, text_size=(width, None))
+        label.refresh()
+        return label.texture
+
+    def _store(self, key: tuple, texture):
+        self._textures[key] = texture
+        self.memory_used += texture.width * texture.height * 4
+        while self.memory_used > self.memory_limit and len(self._textures) > 1:
+            _, evicted = self._textures.popitem(last=False)
+            self.memory_used -= evicted.width * evicted.height * 4
+
+    def clear(self):
+        self._textures.clear()
+        self.memory_used = 0
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            "textures": len(self._textures),
+            "memory_mb": round(self.memory_used / (1024 * 1024), 2),
+            "hits": self.hits,
+            "misses": self.misses,
+        }
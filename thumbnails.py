@@ -0,0 +1,194 @@
+# thumbnails.py - обложки курсов: загрузка, декодирование в пуле потоков, кэш текстур и диска
+import asyncio
+import hashlib
+import io
+import os
+import struct
+import time
+import weakref
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
+from typing import Callable, Dict, Any, List, Optional, Tuple
+from kivy.clock import Clock
+from kivy.logger import Logger
+from async_helper import submit_to_loop
+from scheduler import Lane, in_lane
+
+# Заголовок файла дискового кэша: ширина и высота уменьшенного RGBA изображения
+_HEADER = struct.Struct('<II')
+
+def _decode_and_resize(data: bytes, size: Tuple[int, int]) -> Optional[Tuple[int, int, bytes]]:
+    """Декодирование и уменьшение изображения в рабочем потоке (нужен Pillow)"""
+    try:
+        from PIL import Image
+    except ImportError:
+        return None
+    with Image.open(io.BytesIO(data)) as image:
+        image.draft('RGB', size)  # JPEG декодируется сразу в уменьшенном масштабе
+        image = image.convert('RGBA')
+        image.thumbnail(size)
+        # Текстуры Kivy хранятся снизу вверх
+        image = image.transpose(Image.FLIP_TOP_BOTTOM)
+        return image.width, image.height, image.tobytes()
+
+class ThumbnailCache:
+    """Обложки курсов для карточек каталога.
+
+    Цепочка: LRU текстур в памяти -> дисковый кэш уменьшенных RGBA -> сеть.
+    Сетевая загрузка идет через общий API клиент по фоновой полосе, декодирование
+    и уменьшение - в пуле потоков, текстуры создаются в главном потоке. Одинаковые
+    запросы объединяются, а пересозданные карточки получают готовую текстуру сразу.
+    """
+
+    def __init__(self, api_client, cache_dir: str, size: Tuple[int, int] = (192, 144),
+                 memory_limit_mb: float = 24, workers: int = 2, retry_after: float = 60.0):
+        self.api_client = api_client
+        self.cache_dir = cache_dir
+        self.size = size
+        self.memory_limit = int(memory_limit_mb * 1024 * 1024)
+        # Через сколько секунд снова пробовать обложку, которую не удалось загрузить
+        self.retry_after = retry_after
+        self.memory_used = 0
+        self.hits = 0
+        self.misses = 0
+        self._textures: 'OrderedDict[str, Any]' = OrderedDict()
+        self._pending: Dict[str, List[Callable[[Any], None]]] = {}
+        self._failed: Dict[str, float] = {}
+        self._executor = ThreadPoolExecutor(max_workers=workers, thread_name_prefix='thumbnails')
+        os.makedirs(cache_dir, exist_ok=True)
+
+    def _disk_path(self, url: str) -> str:
+        key = hashlib.sha1(f"{url}|{self.size[0]}x{self.size[1]}".encode()).hexdigest()
+        return os.path.join(self.cache_dir, f"{key}.rgba")
+
+    # --- Главный поток ---
+
+    def bind_image(self, image_widget, url: str):
+        """Назначает виджету обложку; поздний результат для переиспользованного виджета отбрасывается"""
+        image_widget.thumbnail_url = url
+        widget_ref = weakref.ref(image_widget)
+
+        def apply(texture):
+            widget = widget_ref()
+            if widget is not None and texture is not None and getattr(widget, 'thumbnail_url', None) == url:
+                widget.texture = texture
+
+        self.request(url, apply)
+
+    def request(self, url: str, callback: Callable[[Any], None]):
+        """Текстура обложки: сразу из памяти или в callback после загрузки"""
+        texture = self._textures.get(url)
+        if texture is not None:
+            self._textures.move_to_end(url)
+            self.hits += 1
+            callback(texture)
+            return
+        failed_at = self._failed.get(url)
+        if failed_at is not None:
+            if time.monotonic() - failed_at < self.retry_after:
+                return
+            del self._failed[url]
+        self.misses += 1
+        waiting = self._pending.get(url)
+        if waiting is not None:
+            waiting.append(callback)
+            return
+        self._pending[url] = [callback]
+        future = submit_to_loop(in_lane(Lane.BACKGROUND, self._load(url)))
+        future.add_done_callback(lambda f: Clock.schedule_once(lambda dt: self._on_loaded(url, f), 0))
+
+    def _on_loaded(self, url: str, future):
+        callbacks = self._pending.pop(url, [])
+        try:
+            result = future.result()
+        except Exception as e:
+            Logger.warning(f"Thumbnails: не удалось загрузить {url}: {e}")
+            result = None
+        texture = self._make_texture(result) if result else None
+        if texture is None:
+            self._failed[url] = time.monotonic()
+            return
+        self._store(url, texture)
+        for callback in callbacks:
+            callback(texture)
+
+    def on_connection_changed(self, is_online: bool):
+        """После восстановления связи обложки, не загрузившиеся без сети, запрашиваются снова"""
+        if is_online:
+            self._failed.clear()
+
+    def _make_texture(self, result):
+        kind, payload = result
+        if kind == 'rgba':
+            from kivy.graphics.texture import Texture
+            width, height, pixels = payload
+            texture = Texture.create(size=(width, height), colorfmt='rgba')
+            texture.blit_buffer(pixels, colorfmt='rgba', bufferfmt='ubyte')
+            return texture
+        # Без Pillow изображение декодирует Kivy в главном потоке (без уменьшения)
+        from kivy.core.image import Image as CoreImage
+        ext = 'jpg' if payload[:2] == b'\xff\xd8' else 'png'
+        try:
+            return CoreImage(io.BytesIO(payload), ext=ext).texture
+        except Exception as e:
+            Logger.warning(f"Thumbnails: не удалось декодировать изображение: {e}")
+            return None
+
+    def _store(self, url: str, texture):
+        self._textures[url] = texture
+        self.memory_used += texture.width * texture.height * 4
+        while self.memory_used > self.memory_limit and len(self._textures) > 1:
+            _, evicted = self._textures.popitem(last=False)
+            self.memory_used -= evicted.width * evicted.height * 4
+
+    # --- Фоновая загрузка ---
+
+    async def _load(self, url: str):
+        loop = asyncio.get_running_loop()
+        path = self._disk_path(url)
+        cached = await loop.run_in_executor(self._executor, self._read_disk, path)
+        if cached is not None:
+            return 'rgba', cached
+        data = await self.api_client.get_media(url)
+        if not data:
+            return None
+        decoded = await loop.run_in_executor(self._executor, _decode_and_resize, data, self.size)
+        if decoded is None:
+            return 'encoded', data
+        await loop.run_in_executor(self._executor, self._write_disk, path, decoded)
+        return 'rgba', decoded
+
+    def _read_disk(self, path: str) -> Optional[Tuple[int, int, bytes]]:
+        try:
+            with open(path, 'rb') as f:
+                width, height = _HEADER.unpack(f.read(_HEADER.size))
+                pixels = f.read()
+        except (OSError, struct.error):
+            return None
+        if len(pixels) != width * height * 4:
+            return None
+        return width, height, pixels
+
+    def _write_disk(self, path: str, decoded: Tuple[int, int, bytes]):
+        width, height, pixels = decoded
+        try:
+            tmp_path = f"{path}.tmp"
+            with open(tmp_path, 'wb') as f:
+                f.write(_HEADER.pack(width, height))
+                f.write(pixels)
+            os.replace(tmp_path, path)
+        except OSError as e:
+            Logger.warning(f"Thumbnails: не удалось сохранить обложку на диск: {e}")
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            "textures": len(self._textures),
+            "memory_mb": round(self.memory_used / (1024 * 1024), 2),
+            "hits": self.hits,
+            "misses": self.misses,
+            "pending": len(self._pending),
+            "failed": len(self._failed),
+        }
+
+    def close(self):
+        self._executor.shutdown(wait=False)
@@ -0,0 +1,195 @@
+# tracing.py
+import json
+import re
+import time
+import threading
+from bisect import bisect_left
+from collections import deque
+from typing import Optional, Dict, Any, List
+
+# Границы корзин гистограммы в миллисекундах: от 1 мс до ~2 минут с шагом 25%
+_BUCKET_BOUNDS: List[float] = []
+_bound = 1.0
+while _bound < 120000:
+    _BUCKET_BOUNDS.append(round(_bound, 3))
+    _bound *= 1.25
+
+_ID_SEGMENT = re.compile(r'/\d+(?=/|$)')
+
+def normalize_endpoint(endpoint: str) -> str:
+    """Заменяет числовые идентификаторы в пути на {id} для группировки"""
+    return _ID_SEGMENT.sub('/{id}', endpoint.split('?', 1)[0])
+
+class LatencyHistogram:
+    """Гистограмма задержек с логарифмическими корзинами"""
+
+    def __init__(self):
+        self.counts = [0] * (len(_BUCKET_BOUNDS) + 1)
+        self.count = 0
+        self.total = 0.0
+        self.min: Optional[float] = None
+        self.max: Optional[float] = None
+
+    def record(self, value_ms: float):
+        """Добавляет измерение в миллисекундах"""
+        self.counts[bisect_left(_BUCKET_BOUNDS, value_ms)] += 1
+        self.count += 1
+        self.total += value_ms
+        self.min = value_ms if self.min is None else min(self.min, value_ms)
+        self.max = value_ms if self.max is None else max(self.max, value_ms)
+
+    def percentile(self, p: float) -> Optional[float]:
+        """Оценка перцентиля (0-100) с интерполяцией внутри корзины"""
+        if not self.count:
+            return None
+        rank = p / 100.0 * self.count
+        seen = 0
+        for index, bucket_count in enumerate(self.counts):
+            if not bucket_count:
+                continue
+            if seen + bucket_count >= rank:
+                lower = _BUCKET_BOUNDS[index - 1] if index > 0 else 0.0
+                upper = _BUCKET_BOUNDS[index] if index < len(_BUCKET_BOUNDS) else self.max
+                value = lower + (upper - lower) * (rank - seen) / bucket_count
+                return round(min(max(value, self.min), self.max), 3)
+            seen += bucket_count
+        return self.max
+
+    def to_dict(self) -> Dict[str, Any]:
+        return {
+            "count": self.count,
+            "mean": round(self.total / self.count, 3) if self.count else None,
+            "min": self.min,
+            "max": self.max,
+            "p50": self.percentile(50),
+            "p95": self.percentile(95),
+            "p99": self.percentile(99),
+        }
+
+class RequestTrace:
+    """Тайминги одного HTTP запроса, собираемые из событий httpcore"""
+
+    def __init__(self, method: str, endpoint: str):
+        self.method = method
+        self.endpoint = normalize_endpoint(endpoint)
+        self.status: Optional[int] = None
+        self.error: Optional[str] = None
+        self.cache_hit = False
+        self.bytes_sent = 0
+        self.bytes_received = 0
+        self.started_at = time.time()
+        self._t0 = time.perf_counter()
+        self._marks: Dict[str, float] = {}
+
+    async def on_event(self, name: str, info: Dict[str, Any]):
+        """Обработчик trace-расширения httpx (вызывается httpcore)"""
+        self._marks[name] = time.perf_counter()
+
+    def _span(self, prefix: str) -> Optional[float]:
+        started = self._marks.get(f"{prefix}.started")
+        completed = self._marks.get(f"{prefix}.complete")
+        if started is None or completed is None:
+            return None
+        return round((completed - started) * 1000, 3)
+
+    def finish(self, response=None, error: Optional[BaseException] = None) -> Dict[str, Any]:
+        """Завершает трассировку и возвращает запись"""
+        total = (time.perf_counter() - self._t0) * 1000
+        if response is not None:
+            self.status = response.status_code
+            self.bytes_received = len(response.content)
+            request = response.request
+            self.bytes_sent = len(request.content) if request is not None else 0
+        if error is not None:
+            self.error = type(error).__name__
+
+        ttfb = None
+        for name in ("http11.receive_response_headers.complete",
+                     "http2.receive_response_headers.complete"):
+            if name in self._marks:
+                ttfb = round((self._marks[name] - self._t0) * 1000, 3)
+                break
+
+        return {
+            "method": self.method,
+            "endpoint": self.endpoint,
+            "status": self.status,
+            "error": self.error,
+            "cache_hit": self.cache_hit,
+            "started_at": self.started_at,
+            # httpcore не разделяет DNS и TCP: connect включает разрешение имени
+            "connect_ms": self._span("connection.connect_tcp"),
+            "tls_ms": self._span("connection.start_tls"),
+            "ttfb_ms": ttfb,
+            "total_ms": round(total, 3),
+            "bytes_sent": self.bytes_sent,
+            "bytes_received": self.bytes_received,
+        }
+
+class RequestTracer:
+    """Сбор трассировок запросов и гистограмм задержек по эндпоинтам"""
+
+    def __init__(self, max_traces: int = 500):
+        self.traces: deque = deque(maxlen=max_traces)
+        self.histograms: Dict[str, LatencyHistogram] = {}
+        self.overall = LatencyHistogram()
+        self.requests = 0
+        self.errors = 0
+        self._lock = threading.Lock()
+
+    def start(self, method: str, endpoint: str) -> RequestTrace:
+        """Создает трассировку для нового запроса"""
+        return RequestTrace(method, endpoint)
+
+    def finish(self, trace: RequestTrace, response=None, error: Optional[BaseException] = None):
+        """Фиксирует результат запроса"""
+        self._store(trace.finish(response, error))
+
+    def record_cache_hit(self, method: str, endpoint: str, size: int = 0):
+        """Фиксирует ответ, полученный из локального кэша без обращения к сети"""
+        trace = RequestTrace(method, endpoint)
+        trace.cache_hit = True
+        record = trace.finish()
+        record["bytes_received"] = size
+        self._store(record)
+
+    def _store(self, record: Dict[str, Any]):
+        key = f"{record['method']} {record['endpoint']}"
+        if record["cache_hit"]:
+            key += " [cache]"
+        with self._lock:
+            self.requests += 1
+            if record["error"] or (record["status"] or 0) >= 400:
+                self.errors += 1
+            self.traces.append(record)
+            histogram = self.histograms.get(key)
+            if histogram is None:
+                histogram = self.histograms[key] = LatencyHistogram()
+            histogram.record(record["total_ms"])
+            self.overall.record(record["total_ms"])
+
+    def summary(self) -> Dict[str, Dict[str, Any]]:
+        """Сводка перцентилей по эндпоинтам"""
+        with self._lock:
+            return {key: histogram.to_dict() for key, histogram in sorted(self.histograms.items())}
+
+    def export_json(self, include_traces: bool = False) -> str:
+        """Экспорт статистики в JSON"""
+        data: Dict[str, Any] = {"endpoints": self.summary()}
+        if include_traces:
+            with self._lock:
+                data["traces"] = list(self.traces)
+        return json.dumps(data, ensure_ascii=False, indent=2)
+
+    def save(self, path: str, include_traces: bool = False):
+        """Сохраняет статистику в файл"""
+        with open(path, 'w', encoding='utf-8') as f:
+            f.write(self.export_json(include_traces))
+
+    def reset(self):
+        with self._lock:
+            self.traces.clear()
+            self.histograms.clear()
+            self.overall = LatencyHistogram()
+            self.requests = 0
+            self.errors = 0